@@ -0,0 +1,57 @@
+"""
+Measure batch generation throughput (posts/min) at several concurrency limits with a fake LLM.
+
+Run from agents/post-agent:
+    python -m benchmarks.batch_throughput --latency 0.5 --posts 16 --concurrency 1 2 4 8
+"""
+
+from typing import Dict, List
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.fakes import FakeChatModel, install_fake_identity_db
+from src.checkpoints import NullCheckpointStore, set_checkpoint_store
+from src.orchestrator import create_workflow, generate_posts_batch
+
+async def measure(workflow, topics: List[str], concurrency: int) -> Dict[str, float]:
+    start = time.perf_counter()
+    first = None
+    failed = 0
+    async for item in generate_posts_batch(topics, max_concurrency=concurrency, workflow=workflow):
+        if first is None:
+            first = time.perf_counter() - start
+        failed += item["status"] != "success"
+    elapsed = time.perf_counter() - start
+    assert not failed, f"{failed} posts failed at concurrency {concurrency}"
+    return {
+        "concurrency": concurrency,
+        "total_s": round(elapsed, 3),
+        "first_post_s": round(first, 3),
+        "posts_per_min": round(len(topics) * 60 / elapsed, 1)
+    }
+
+async def main_async(args: argparse.Namespace) -> Dict[str, object]:
+    install_fake_identity_db()
+    set_checkpoint_store(NullCheckpointStore())
+    llm = FakeChatModel(latency=args.latency, jitter=args.jitter, seed=args.seed)
+    workflow = create_workflow(llm=llm, mode=args.mode)
+    topics = [f"{args.topic} #{i}" for i in range(args.posts)]
+    runs = [await measure(workflow, topics, concurrency) for concurrency in args.concurrency]
+    return {"llm_latency_s": args.latency, "posts": args.posts, "mode": args.mode, "runs": runs}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM latency per call (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Uniform +/- jitter on the latency (seconds)")
+    parser.add_argument("--posts", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--mode", choices=["linear", "parallel"], default="linear")
+    parser.add_argument("--topic", default="bootstrapping")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
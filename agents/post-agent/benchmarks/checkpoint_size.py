@@ -0,0 +1,115 @@
+"""
+Compare bytes written per run by the legacy checkpoint file and the delta-encoded JSONL store.
+
+Run from agents/post-agent:
+    python -m benchmarks.checkpoint_size --runs 20 --snapshot-interval 8
+"""
+
+from typing import Any, Dict, List, Tuple
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from src.checkpoints import CheckpointWriter, JsonlCheckpointStore, iter_states
+
+AGENTS = ["topic_selector", "research_agent", "hook_generator", "body_generator", "cta_generator", "qa_agent"]
+
+def _text(words: int, seed: str) -> str:
+    return " ".join(f"{seed}{i % 37}" for i in range(words))
+
+def simulate_run() -> List[Tuple[str, str, Dict[str, Any]]]:
+    """Return the (agent, phase, state) sequence a typical run checkpoints."""
+    state: Dict[str, Any] = {
+        "current_topic": "Bootstrapping an AI startup", "hook_text": None, "body_text": None,
+        "cta_text": None, "research_data": [], "messages": [{"role": "system", "content": "Identity loaded"}],
+        "qa_feedback": None, "qa_suggestions": [], "qa_score": None, "qa_issues": [],
+        "post_payload": None, "image_url": None
+    }
+    updates = {
+        "topic_selector": {"messages": {"role": "assistant", "content": _text(250, "brief")}},
+        "research_agent": {
+            "research_data": [{"source": f"https://example.com/{i}", "snippet": _text(60, "fact")} for i in range(6)],
+            "messages": {"role": "assistant", "content": "Research completed. Found 6 items."}
+        },
+        "hook_generator": {"hook_text": _text(20, "hook"), "messages": {"role": "assistant", "content": _text(40, "hook")}},
+        "body_generator": {"body_text": _text(280, "body"), "messages": {"role": "assistant", "content": _text(280, "body")}},
+        "cta_generator": {"cta_text": _text(25, "cta"), "messages": {"role": "assistant", "content": _text(40, "cta")}},
+        "qa_agent": {
+            "qa_feedback": _text(60, "qa"), "qa_suggestions": [_text(15, "s")] * 3, "qa_score": 8,
+            "qa_issues": [_text(12, "i")] * 2, "messages": {"role": "assistant", "content": _text(120, "qa")}
+        }
+    }
+    sequence = []
+    for agent in AGENTS:
+        sequence.append((agent, "input", json.loads(json.dumps(state))))
+        for key, value in updates[agent].items():
+            if key == "messages":
+                state["messages"] = state["messages"] + [value]
+            elif key == "research_data":
+                state["research_data"] = state["research_data"] + value
+            else:
+                state[key] = value
+        sequence.append((agent, "output", json.loads(json.dumps(state))))
+    return sequence
+
+def legacy_bytes(sequence: List[Tuple[str, str, Dict[str, Any]]]) -> int:
+    """Bytes written by the old read-modify-write history file for one run."""
+    checkpoints, total = [], 0
+    for agent, _, state in sequence:
+        checkpoints.append({
+            "timestamp": "20250101_000000", "agent_name": agent, "topic": state["current_topic"],
+            "state": state,
+            "input": {key: state[key] for key in ("current_topic", "hook_text", "body_text", "cta_text", "research_data")},
+            "output": {key: state[key] for key in ("hook_text", "body_text", "cta_text", "research_data", "qa_feedback", "qa_suggestions", "qa_score", "qa_issues")}
+        })
+        # Every save rewrote the whole file
+        total += len(json.dumps({"run_timestamp": "20250101_000000", "checkpoints": checkpoints}, indent=2))
+    return total
+
+def delta_bytes(sequence: List[Tuple[str, str, Dict[str, Any]]], snapshot_interval: int, directory: str, run_id: str) -> int:
+    """Bytes appended by the delta-encoded JSONL store for one run, verifying the round trip."""
+    store = JsonlCheckpointStore(directory)
+    writer = CheckpointWriter(store, snapshot_interval=snapshot_interval)
+    for agent, phase, state in sequence:
+        writer.submit(run_id, {"timestamp": "20250101_000000", "agent_name": agent, "phase": phase, "state": state})
+    writer.end_run(run_id)
+    writer.close()
+    for (record, rebuilt), (_, _, original) in zip(iter_states(store.read(run_id)), sequence):
+        assert rebuilt == original, f"Materialized state differs at step {record['step']}"
+    return os.path.getsize(store.path_for(run_id))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--snapshot-interval", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    sequence = simulate_run()
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        legacy = [legacy_bytes(sequence) for _ in range(args.runs)]
+        legacy_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        delta = [delta_bytes(sequence, args.snapshot_interval, directory, f"run{i}") for i in range(args.runs)]
+        delta_seconds = time.perf_counter() - start
+
+    results = {
+        "checkpoints_per_run": len(sequence),
+        "snapshot_interval": args.snapshot_interval,
+        "legacy_bytes_per_run": sum(legacy) // args.runs,
+        "delta_bytes_per_run": sum(delta) // args.runs,
+        "reduction": round(1 - sum(delta) / sum(legacy), 4),
+        "legacy_encode_ms_per_run": round(legacy_seconds * 1000 / args.runs, 3),
+        "delta_write_ms_per_run": round(delta_seconds * 1000 / args.runs, 3)
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for key, value in results.items():
+            print(f"{key:>26}: {value}")
+
+if __name__ == "__main__":
+    main()
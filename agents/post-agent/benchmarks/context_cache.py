@@ -0,0 +1,74 @@
+"""
+Compare the prompt tokens the generators send per post with the identity block inline vs referenced from a context cache.
+
+Runs the whole workflow with a fake LLM and the in-memory stand-in for
+Gemini's context cache (LocalContextCacheBackend), so the identity block is
+"uploaded" once and left out of every later generator prompt. Token counts
+are the fake LLM's characters / 4 of what is actually sent. Run from
+agents/post-agent:
+    python -m benchmarks.context_cache --posts 5 --section-mode separate
+"""
+
+from typing import Dict
+import argparse
+import asyncio
+import json
+import statistics
+import uuid
+
+from benchmarks.fakes import FakeChatModel, install_fake_identity_db
+from src.checkpoints import NullCheckpointStore, set_checkpoint_store
+from src.context_cache import ContextCache, LocalContextCacheBackend, set_context_cache
+from src.metrics import MetricsCallbackHandler, RunMetrics
+from src.orchestrator import create_workflow
+
+GENERATOR_NODES = ("generate_hook", "generate_body", "generate_cta", "generate_sections")
+
+async def measure(llm: FakeChatModel, section_mode: str, posts: int, topic: str) -> Dict[str, float]:
+    workflow = create_workflow(llm=llm, mode="linear", section_mode=section_mode)
+    prompt_tokens, llm_calls = [], []
+    for _ in range(posts):
+        run = RunMetrics(uuid.uuid4().hex)
+        result = await workflow.ainvoke(
+            {"run_id": run.run_id, "current_topic": topic},
+            config={"callbacks": [MetricsCallbackHandler(run)]}
+        )
+        assert dict(result).get("post_payload"), "workflow produced no post"
+        nodes = [run.node(node) for node in GENERATOR_NODES]
+        prompt_tokens.append(sum(stats["prompt_tokens"] for stats in nodes))
+        llm_calls.append(sum(stats["llm_calls"] for stats in nodes))
+    return {
+        "generator_prompt_tokens": round(statistics.mean(prompt_tokens), 1),
+        "generator_llm_calls": round(statistics.mean(llm_calls), 1)
+    }
+
+async def main_async(args: argparse.Namespace) -> Dict[str, object]:
+    install_fake_identity_db()
+    set_checkpoint_store(NullCheckpointStore())
+    llm = FakeChatModel(seed=args.seed)
+    results: Dict[str, object] = {"posts": args.posts, "section_mode": args.section_mode}
+
+    set_context_cache(None)
+    results["inline"] = await measure(llm, args.section_mode, args.posts, args.topic)
+
+    cache = ContextCache(LocalContextCacheBackend(), min_chars=0)
+    set_context_cache(cache)
+    results["context_cache"] = await measure(llm, args.section_mode, args.posts, args.topic)
+    results["context_cache"]["stats"] = cache.stats()
+    set_context_cache(None)
+
+    inline, cached = results["inline"]["generator_prompt_tokens"], results["context_cache"]["generator_prompt_tokens"]
+    results["prompt_token_reduction"] = round(1 - cached / inline, 4) if inline else None
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=5)
+    parser.add_argument("--section-mode", choices=["separate", "fused"], default="separate")
+    parser.add_argument("--topic", default="bootstrapping")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
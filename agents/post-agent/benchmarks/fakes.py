@@ -0,0 +1,278 @@
+"""
+Offline stand-ins for Gemini and Postgres used by the benchmarks.
+
+FakeChatModel answers every agent's prompt with a canned, valid JSON reply
+after a configurable delay; FakeConnection is a DB-API connection that
+serves a fixed identity spec; FixtureSearchServer is a local web server
+answering SearXNG-style searches and serving the result pages.
+"""
+
+from typing import Any, AsyncIterator, Callable, ClassVar, List, Optional
+from pydantic import PrivateAttr
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import threading
+import asyncio
+import random
+import json
+import time
+import os
+
+# Measure the pipeline itself: opted-in agents would otherwise answer repeated runs from the response cache
+os.environ.setdefault("LLM_CACHE", "false")
+# Research comes from the fake LLM unless a benchmark installs its own research engine
+os.environ.setdefault("SEARCH_PROVIDER", "none")
+
+SAMPLE_IDENTITY_SPEC = {
+    "creator": "Sample Creator",
+    "promise": "Practical lessons for bootstrapped founders",
+    "voice": {"tone": ["conversational", "direct"], "person": "first", "avoid": ["jargon"]},
+    "visual": {"primary_color": "#1a73e8", "background": "white", "font_family": "Inter", "icon": None},
+    "pillars_ranked": ["Bootstrapping Business", "Founder Mindset & Leadership", "AI/Automation for Scale"],
+    "signature_stories": ["Shipping the first product in 30 days", "Firing our biggest client"],
+    "hook_templates": ["Nobody tells you this about {topic}:", "{n} lessons I learned about {topic}"],
+    "cta_style": "Ask one specific question"
+}
+
+def _reply_topic(topic: str) -> dict:
+    return {
+        "current_topic": topic,
+        "brief": {
+            "title": f"What {topic} taught me",
+            "target_audience": "Early-stage founders",
+            "key_points": [
+                {"heading": "Start small", "content": "Pick one painful problem.", "optional_visual": None, "call_to_action": None},
+                {"heading": "Ship weekly", "content": "Speed beats polish early on.", "optional_visual": None, "call_to_action": None}
+            ],
+            "tone": "conversational",
+            "hashtags": ["#startups", "#bootstrapping", "#founders"]
+        }
+    }
+
+def _reply_research(topic: str) -> dict:
+    return {"items": [{"source": f"https://example.com/{i}", "snippet": f"Fact {i} about {topic}."} for i in range(3)]}
+
+def _reply_hook(topic: str) -> dict:
+    return {"hook_text": f"Nobody tells you this about {topic}:", "tone": "conversational", "target_audience": "Founders"}
+
+def _reply_body(topic: str) -> dict:
+    return {
+        "body_text": "Most founders wait too long. Start small. Ship every week. Talk to users every day. Keep what works.",
+        "key_points": ["Start small", "Ship weekly", "Talk to users"],
+        "tone": "conversational"
+    }
+
+def _reply_cta(topic: str) -> dict:
+    return {"cta_text": "What is the one thing you would ship this week?", "action_type": "comment", "urgency_level": "medium"}
+
+def _reply_sections(topic: str) -> dict:
+    return {
+        "hook_text": _reply_hook(topic)["hook_text"],
+        "body_text": _reply_body(topic)["body_text"],
+        "cta_text": _reply_cta(topic)["cta_text"],
+        "tone": "conversational"
+    }
+
+def _reply_rewrite(topic: str) -> dict:
+    return {"text": _reply_body(topic)["body_text"]}
+
+def _reply_qa(topic: str) -> dict:
+    return {"feedback": "Clear and concise.", "suggestions": ["Add a number"], "score": 8, "issues": []}
+
+def _reply_post(topic: str) -> dict:
+    return {"text": f"Nobody tells you this about {topic}:\n\nStart small.\n\nWhat will you ship?\n\n#startups", "image_url": ""}
+
+# (marker found in the prompt, reply builder); first match wins, so the combined
+# section prompts, which mention every section, come before the single-section ones
+SCRIPT: List[tuple] = [
+    ("Rewrite only the", _reply_rewrite),
+    ("all three sections", _reply_sections),
+    ("content strategist", _reply_topic),
+    ("research assistant", _reply_research),
+    ("engaging hook", _reply_hook),
+    ("engaging body content", _reply_body),
+    ("call-to-action (CTA)", _reply_cta),
+    ("quality assurance expert", _reply_qa),
+    ("content editor", _reply_post)
+]
+
+class FakeChatModel(BaseChatModel):
+    """Scripted chat model with configurable latency and jitter (seconds).
+    
+    When streamed, the first chunk arrives after half the delay and the rest
+    of the reply is spread over the other half, `chunk_chars` at a time.
+    """
+    latency: float = 0.0
+    jitter: float = 0.0
+    seed: Optional[int] = None
+    topic: str = "bootstrapping"
+    chunk_chars: int = 16
+    # Lets the in-memory context cache stand-in leave the identity block out of prompts
+    local_context_cache: ClassVar[bool] = True
+
+    _rng: random.Random = PrivateAttr(default=None)
+    _calls: int = PrivateAttr(default=0)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-scripted"
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        self._calls += 1
+        prompt = "\n".join(str(message.content) for message in messages)
+        reply = next((build(self.topic) for marker, build in SCRIPT if marker in prompt), {})
+        content = json.dumps(reply)
+        input_tokens, output_tokens = len(prompt) // 4, len(content) // 4
+        message = AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._delay())
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        return self._result(messages)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        delay = self._delay()
+        message = self._result(messages).generations[0].message
+        content = message.content
+        pieces = [content[i:i + self.chunk_chars] for i in range(0, len(content), self.chunk_chars)]
+        await asyncio.sleep(delay / 2)
+        for i, piece in enumerate(pieces):
+            # Usage is reported once, on the last chunk, as streaming providers do
+            usage = message.usage_metadata if i == len(pieces) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+            await asyncio.sleep(delay / 2 / len(pieces))
+
+class FakeCursor:
+    """DB-API cursor answering the identity query and health checks."""
+
+    def __init__(self, connection: "FakeConnection"):
+        self._connection = connection
+        self._row = None
+
+    def execute(self, sql: str, params: Any = None) -> None:
+        if self._connection.query_latency:
+            time.sleep(self._connection.query_latency)
+        self._row = (1, SAMPLE_IDENTITY_SPEC) if "identity_spec" in sql else (1,)
+
+    def fetchone(self) -> Any:
+        return self._row
+
+    def close(self) -> None:
+        pass
+
+class FakeConnection:
+    """DB-API connection stub with an optional per-query delay (seconds)."""
+
+    def __init__(self, query_latency: float = 0.0):
+        self.query_latency = query_latency
+        self.closed = 0
+        self.autocommit = False
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self)
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = 1
+
+def install_fake_identity_db(query_latency: float = 0.0) -> Callable[[], FakeConnection]:
+    """Point the process-wide pool at FakeConnection and clear cached identities."""
+    from src.db import ConnectionPool, set_pool
+    from src.identity_cache import identity_cache
+
+    connect = lambda: FakeConnection(query_latency)
+    set_pool(ConnectionPool(connect, min_size=1, max_size=4))
+    identity_cache.invalidate()
+    return connect
+
+def _fixture_page(i: int, query: str) -> str:
+    navigation = "".join(f"<li><a href='/page/{j}'>Related article {j}</a></li>" for j in range(30))
+    paragraphs = "".join(
+        f"<p>Paragraph {k} of article {i}: founders who write about {query} share what worked, what failed and "
+        f"what they would do differently when starting again with no outside funding.</p>"
+        for k in range(40)
+    )
+    return (
+        f"<html><head><title>Article {i}</title><style>body {{ font-family: sans-serif; }}</style>"
+        f"<script>var tracking = {{id: {i}}};</script></head><body>"
+        f"<header><nav><ul>{navigation}</ul></nav></header>"
+        f"<main><article><h2>Article {i} about {query}</h2>{paragraphs}</article></main>"
+        f"<aside><p>Subscribe to our newsletter for weekly stories about growing a business.</p></aside>"
+        f"<footer><p>Copyright notice and links to the privacy policy of this fixture site.</p></footer></body></html>"
+    )
+
+class FixtureSearchServer:
+    """Local stand-in for a search engine and the sites it links to.
+
+    `GET /search?q=...&format=json` answers in SearXNG's JSON format with
+    `results` result pages, alternately on 127.0.0.1 and localhost so they
+    count as two hosts; `GET /page/<i>` serves an article padded with
+    navigation, scripts and footers. Every request waits `latency` seconds.
+    """
+
+    def __init__(self, results: int = 8, latency: float = 0.2):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(server.latency)
+                url = urlsplit(self.path)
+                query = parse_qs(url.query).get("q", ["research"])[0]
+                if url.path == "/search":
+                    body, content_type = json.dumps({"results": [
+                        {"url": f"http://{('127.0.0.1', 'localhost')[i % 2]}:{server.port}/page/{i}?q={query}", "title": f"Article {i}", "content": f"Search snippet {i} about {query}."}
+                        for i in range(server.results)
+                    ]}), "application/json"
+                elif url.path.startswith("/page/"):
+                    body, content_type = _fixture_page(int(url.path.rsplit("/", 1)[1]), query), "text/html; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.results = results
+        self.latency = latency
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def __enter__(self) -> "FixtureSearchServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,96 @@
+"""
+Compare hook validation against the legacy per-call regex rewriting and the precompiled matcher.
+
+Run from agents/post-agent:
+    python -m benchmarks.hook_matcher --templates 300 --hooks 5000
+"""
+
+from typing import List, Optional
+import argparse
+import json
+import random
+import re
+import time
+
+from src.agents.hook_matcher import HookTemplateMatcher
+
+WORDS = ["growth", "founders", "hiring", "pricing", "churn", "sales", "focus", "remote", "AI", "bootstrapping"]
+SHAPES = [
+    "{n} lessons I learned about {topic} the hard way",
+    "Stop {doing} if you want {outcome}",
+    "I was wrong about {topic}.",
+    "Nobody tells you this about {topic}:",
+    "Here is how we {achieved} in {period}",
+    "The {adjective} truth about {topic}",
+    "{topic} is not a {thing} problem. It is a {other} problem."
+]
+
+def legacy_validate(hook: str, hook_templates: List[str]) -> Optional[int]:
+    """The original IdentityAgent._validate_hook loop, returning the matched index."""
+    for i, tmpl in enumerate(hook_templates):
+        pattern = re.escape(tmpl).replace(r"\{", "{").replace(r"\}", "}")
+        pattern = re.sub(r"\{[^}]+\}", ".+", pattern)
+        if re.fullmatch(pattern, hook):
+            return i
+    return None
+
+def make_templates(count: int, rng: random.Random) -> List[str]:
+    return [f"{rng.choice(SHAPES)} #{i}" if i >= len(SHAPES) else SHAPES[i] for i in range(count)]
+
+def make_hooks(templates: List[str], count: int, rng: random.Random) -> List[str]:
+    hooks = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            template = rng.choice(templates)
+            hooks.append(re.sub(r"\{[^}]+\}", lambda _: " ".join(rng.sample(WORDS, 2)), template))
+        else:
+            hooks.append(" ".join(rng.choice(WORDS) for _ in range(8)))
+    return hooks
+
+def timed(fn, hooks: List[str]) -> tuple:
+    start = time.perf_counter()
+    results = [fn(hook) for hook in hooks]
+    return time.perf_counter() - start, results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--templates", type=int, default=300)
+    parser.add_argument("--hooks", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    templates = make_templates(args.templates, rng)
+    hooks = make_hooks(templates, args.hooks, rng)
+
+    legacy_seconds, legacy_results = timed(lambda h: legacy_validate(h, templates), hooks)
+
+    start = time.perf_counter()
+    matcher = HookTemplateMatcher(templates)
+    compile_seconds = time.perf_counter() - start
+
+    def matched_index(hook: str) -> Optional[int]:
+        match = matcher.match(hook)
+        return None if match is None else match.template_index
+
+    matcher_seconds, matcher_results = timed(matched_index, hooks)
+    assert matcher_results == legacy_results, "Matcher disagrees with the legacy validator"
+
+    results = {
+        "templates": args.templates,
+        "hooks": args.hooks,
+        "matched": sum(r is not None for r in legacy_results),
+        "legacy_us_per_hook": round(legacy_seconds * 1e6 / args.hooks, 2),
+        "matcher_us_per_hook": round(matcher_seconds * 1e6 / args.hooks, 2),
+        "matcher_compile_ms": round(compile_seconds * 1000, 3),
+        "speedup": round(legacy_seconds / matcher_seconds, 1)
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for key, value in results.items():
+            print(f"{key:>20}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure the CPU spent on agents' state debug logs: eager f-strings vs lazy, truncated, sampled logging.
+
+Each simulated node logs its state on input and output plus one LLM result, as
+the agents do. Run from agents/post-agent:
+    python -m benchmarks.logging_overhead --requests 200
+"""
+
+from typing import Callable, Dict
+import argparse
+import io
+import json
+import logging
+import time
+
+from benchmarks.fakes import SAMPLE_IDENTITY_SPEC
+from src.agents.base import AgentState
+from src.agents.identity_agent import IdentitySpec
+from src.logging_utils import lazy
+
+NODES = 8
+
+def make_state(messages: int, research_items: int) -> AgentState:
+    return AgentState(
+        run_id="bench",
+        current_topic="bootstrapping",
+        hook_text="Nobody tells you this about bootstrapping:",
+        body_text="Start small. Ship weekly. " * 40,
+        research_data=[{"source": f"https://example.com/{i}", "snippet": "A relevant fact. " * 30} for i in range(research_items)],
+        messages=[{"role": "assistant", "content": "Generated content. " * 25} for _ in range(messages)],
+        identity_spec=IdentitySpec.model_validate(SAMPLE_IDENTITY_SPEC),
+        validators={"hook": lambda h: (True, None), "tone": lambda t: 1.0, "body": lambda b: (True, None)}
+    )
+
+def eager(logger: logging.Logger, state: AgentState, result: Dict) -> None:
+    logger.debug(f"Input State Type: {type(state)}")
+    logger.debug(f"Input State Content: {state}")
+    logger.debug(f"Result: {result}")
+    logger.debug(f"Output State Type: {type(state)}")
+    logger.debug(f"Output State Content: {state}")
+
+def deferred(logger: logging.Logger, state: AgentState, result: Dict) -> None:
+    logger.debug("Input State Type: %s", type(state))
+    logger.debug("Input State Content: %s", lazy(state))
+    logger.debug("Result: %s", lazy(result))
+    logger.debug("Output State Type: %s", type(state))
+    logger.debug("Output State Content: %s", lazy(state))
+
+def time_requests(log: Callable, logger: logging.Logger, state: AgentState, result: Dict, requests: int) -> float:
+    """CPU seconds per request for NODES nodes' worth of logging."""
+    start = time.process_time()
+    for _ in range(requests):
+        for _ in range(NODES):
+            log(logger, state, result)
+    return (time.process_time() - start) / requests
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--research-items", type=int, default=10)
+    parser.add_argument("--sample-rate", type=float, default=0.1, help="LOG_DEBUG_SAMPLE_RATE for the sampled DEBUG case")
+    parser.add_argument("--requests-per-day", type=int, default=100000, help="Volume used to extrapolate CPU saved")
+    args = parser.parse_args()
+
+    state = make_state(args.messages, args.research_items)
+    result = {"body_text": "Start small. " * 50, "key_points": ["a", "b", "c"], "tone": "conversational"}
+
+    logger = logging.getLogger("benchmarks.logging_overhead")
+    logger.propagate = False
+    logger.addHandler(logging.StreamHandler(io.StringIO()))
+
+    results = {}
+    logger.setLevel(logging.INFO)
+    results["info_eager_ms"] = time_requests(eager, logger, state, result, args.requests) * 1000
+    results["info_lazy_ms"] = time_requests(deferred, logger, state, result, args.requests) * 1000
+
+    logger.setLevel(logging.DEBUG)
+    results["debug_eager_ms"] = time_requests(eager, logger, state, result, args.requests) * 1000
+    results["debug_lazy_ms"] = time_requests(deferred, logger, state, result, args.requests) * 1000
+
+    def sampled(logger: logging.Logger, state: AgentState, result: Dict) -> None:
+        logger.debug("Input State Content: %s", lazy(state, sample_rate=args.sample_rate))
+        logger.debug("Result: %s", lazy(result, sample_rate=args.sample_rate))
+        logger.debug("Output State Content: %s", lazy(state, sample_rate=args.sample_rate))
+    results["debug_lazy_sampled_ms"] = time_requests(sampled, logger, state, result, args.requests) * 1000
+
+    results = {key: round(value, 4) for key, value in results.items()}
+    saved_ms = results["info_eager_ms"] - results["info_lazy_ms"]
+    results["cpu_s_saved_per_day_at_info"] = round(saved_ms * args.requests_per_day / 1000, 1)
+    results["requests_per_day"] = args.requests_per_day
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
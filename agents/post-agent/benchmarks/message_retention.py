@@ -0,0 +1,70 @@
+"""
+Measure how the message channel grows with run length: unbounded appends vs the bounded reducer with spilling.
+
+Each iteration appends one message per node, with contents as long as the
+agents' (full body text, full post, QA dump). Spilled payloads go to a store
+that accepts and discards them, so only the state itself is measured. Retention follows the
+MESSAGE_RETENTION* / MESSAGE_SPILL_CHARS environment variables. Run from
+agents/post-agent:
+    python -m benchmarks.message_retention --iterations 1 10 50
+"""
+
+from typing import Callable, Dict, List
+import argparse
+import json
+import operator
+import tracemalloc
+
+from src.checkpoints import NullCheckpointStore, set_checkpoint_store
+from src.message_log import append_messages, spill_message
+
+class DiscardingStore(NullCheckpointStore):
+    """Null store that still takes spilled payloads (NullCheckpointStore keeps them inline)."""
+
+    persistent = True
+
+NODE_CONTENT_CHARS = {
+    "identity": 40,
+    "select_topic": 600,
+    "research": 80,
+    "generate_hook": 150,
+    "generate_body": 1500,
+    "generate_cta": 150,
+    "qa_check": 700,
+    "assemble_post": 2000
+}
+
+def run(iterations: int, reducer: Callable, spill: bool) -> Dict[str, int]:
+    tracemalloc.start()
+    messages: List[Dict[str, str]] = []
+    for i in range(iterations):
+        for node, chars in NODE_CONTENT_CHARS.items():
+            message = {"role": "assistant", "content": f"{node} {i}: " + "x" * chars}
+            if spill:
+                message = spill_message("bench", message)
+            messages = reducer(messages, [message])
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "messages": len(messages),
+        "state_bytes": len(json.dumps(messages)),
+        "traced_kb": current // 1024
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, nargs="+", default=[1, 10, 50])
+    args = parser.parse_args()
+
+    writer = set_checkpoint_store(DiscardingStore())
+    results = {}
+    for iterations in args.iterations:
+        results[iterations] = {
+            "unbounded": run(iterations, operator.add, spill=False),
+            "bounded": run(iterations, append_messages, spill=True)
+        }
+    writer.close()
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Measure per-request CPU spent building the hook, body and CTA prompts: rebuilt every run vs cached per identity version.
+
+Each request builds the three generators' prompt templates and renders them
+with the run's inputs, as the agents do before calling the LLM. Rendering is
+the same in both cases; only building is cached. Run from agents/post-agent:
+    python -m benchmarks.prompt_build --requests 2000
+"""
+
+from typing import Callable, Dict
+import argparse
+import json
+import time
+
+from benchmarks.fakes import FakeChatModel, SAMPLE_IDENTITY_SPEC
+from src.agents.identity_agent import IdentitySpec
+from src.agents.hook_generator import HookGeneratorAgent
+from src.agents.body_generator import BodyGeneratorAgent
+from src.agents.cta_generator import CTAGeneratorAgent
+from src.prompt_cache import identity_version, prompt_cache
+
+INPUTS = {"topic": "bootstrapping", "feedback": "", "hook": "Nobody tells you this about bootstrapping:",
+          "research": "https://example.com/0: Fact 0.", "content": "Start small. Ship weekly."}
+
+def cpu_per_request(requests: int, build_all: Callable[[], list]) -> Dict[str, float]:
+    build_s = render_s = 0.0
+    for _ in range(requests):
+        start = time.process_time()
+        prompts = build_all()
+        built = time.process_time()
+        for prompt in prompts:
+            prompt.format_messages(**{key: INPUTS[key] for key in prompt.input_variables})
+        build_s += built - start
+        render_s += time.process_time() - built
+    return {
+        "build_us": round(build_s / requests * 1e6, 1),
+        "render_us": round(render_s / requests * 1e6, 1)
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    llm = FakeChatModel()
+    agents = [HookGeneratorAgent(llm=llm), BodyGeneratorAgent(llm=llm), CTAGeneratorAgent(llm=llm)]
+    spec = IdentitySpec.model_validate(SAMPLE_IDENTITY_SPEC)
+    state = {"identity_spec": spec, "identity_id": 1, "identity_version": identity_version(1, spec)}
+
+    uncached = cpu_per_request(args.requests, lambda: [agent.create_prompt(spec) for agent in agents])
+    prompt_cache.invalidate()
+    cached = cpu_per_request(args.requests, lambda: [agent.cached_prompt(state, lambda agent=agent: agent.create_prompt(spec)) for agent in agents])
+    print(json.dumps({
+        "requests": args.requests,
+        "uncached": uncached,
+        "cached": cached,
+        "build_cpu_reduction": round(1 - cached["build_us"] / uncached["build_us"], 4) if uncached["build_us"] else None,
+        "prompt_cache": prompt_cache.stats()
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Compare research for one topic done the old way (sequential requests + BeautifulSoup on the whole page) against the async research engine.
+
+Both search a local FixtureSearchServer and fetch its result pages; each
+request takes --latency seconds. The engine fetches the pages concurrently
+over a pooled httpx client, within its per-host limits, and extracts only
+the main text. Reported per query: wall time, and the characters of text
+each approach would hand to the generators. Run from agents/post-agent:
+    python -m benchmarks.research_fetch --pages 8 --latency 0.2
+"""
+
+from typing import Dict, List, Tuple
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import requests
+from bs4 import BeautifulSoup
+
+from benchmarks.fakes import FixtureSearchServer
+from src.research_engine import ResearchEngine, SearxngSearchProvider, html_extractor
+
+def sequential_research(base_url: str, topic: str, pages: int) -> List[Dict[str, str]]:
+    results = requests.get(f"{base_url}/search", params={"q": topic, "format": "json"}).json()["results"][:pages]
+    items = []
+    for result in results:
+        page = requests.get(result["url"]).text
+        items.append({"source": result["url"], "snippet": BeautifulSoup(page, "html.parser").get_text()})
+    return items
+
+async def engine_research(engine: ResearchEngine, topic: str, queries: int) -> Tuple[List[float], List[Dict[str, str]]]:
+    times = []
+    for _ in range(queries):
+        start = time.perf_counter()
+        items = await engine.research(topic)
+        times.append(time.perf_counter() - start)
+        assert len(items) == engine.max_pages, "engine dropped pages"
+    await engine.close()
+    return times, items
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fixture server latency per request (seconds)")
+    parser.add_argument("--queries", type=int, default=3)
+    parser.add_argument("--per-host-concurrency", type=int, default=4)
+    parser.add_argument("--per-host-interval", type=float, default=0.0)
+    parser.add_argument("--topic", default="bootstrapping")
+    args = parser.parse_args()
+
+    with FixtureSearchServer(results=args.pages, latency=args.latency) as server:
+        sequential_s = []
+        for _ in range(args.queries):
+            start = time.perf_counter()
+            sequential_items = sequential_research(server.base_url, args.topic, args.pages)
+            sequential_s.append(time.perf_counter() - start)
+
+        engine = ResearchEngine(
+            SearxngSearchProvider(server.base_url),
+            max_pages=args.pages,
+            per_host_concurrency=args.per_host_concurrency,
+            per_host_interval=args.per_host_interval
+        )
+        engine_s, engine_items = asyncio.run(engine_research(engine, args.topic, args.queries))
+
+    sequential_mean, engine_mean = statistics.mean(sequential_s), statistics.mean(engine_s)
+    print(json.dumps({
+        "pages": args.pages,
+        "latency_s": args.latency,
+        "extractor": html_extractor()[0],
+        "sequential": {"query_s": round(sequential_mean, 3), "text_chars": sum(len(item["snippet"]) for item in sequential_items)},
+        "engine": {"query_s": round(engine_mean, 3), "text_chars": sum(len(item["snippet"]) for item in engine_items)},
+        "speedup": round(sequential_mean / engine_mean, 2) if engine_mean else None
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
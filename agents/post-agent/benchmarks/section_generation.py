@@ -0,0 +1,73 @@
+"""
+Compare writing hook, body and CTA with three LLM calls (SECTION_MODE=separate) against one combined call (fused).
+
+Runs the whole workflow with a fake LLM and reports, for the section
+generation nodes only, LLM calls, prompt and completion tokens and wall time
+per post, from the same per-node metrics as GET /metrics/runs. The fake
+LLM's token counts are characters / 4 of the rendered prompt and reply.
+Run from agents/post-agent:
+    python -m benchmarks.section_generation --latency 0.5 --posts 5
+"""
+
+from typing import Dict
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+from benchmarks.fakes import FakeChatModel, install_fake_identity_db
+from src.checkpoints import NullCheckpointStore, set_checkpoint_store
+from src.metrics import MetricsCallbackHandler, RunMetrics
+from src.orchestrator import create_workflow
+
+SECTION_NODES = {
+    "separate": ("generate_hook", "generate_body", "generate_cta"),
+    "fused": ("generate_sections",)
+}
+STATS = ("llm_calls", "prompt_tokens", "completion_tokens", "duration_s")
+
+async def measure(section_mode: str, llm: FakeChatModel, mode: str, posts: int, topic: str) -> Dict[str, float]:
+    workflow = create_workflow(llm=llm, mode=mode, section_mode=section_mode)
+    totals = {stat: [] for stat in STATS + ("run_s",)}
+    for _ in range(posts):
+        run = RunMetrics(uuid.uuid4().hex)
+        start = time.perf_counter()
+        result = await workflow.ainvoke(
+            {"run_id": run.run_id, "current_topic": topic},
+            config={"callbacks": [MetricsCallbackHandler(run)]}
+        )
+        totals["run_s"].append(time.perf_counter() - start)
+        assert dict(result).get("post_payload"), f"{section_mode} workflow produced no post"
+        for stat in STATS:
+            totals[stat].append(sum(run.node(node)[stat] for node in SECTION_NODES[section_mode]))
+    return {stat: round(statistics.mean(values), 3) for stat, values in totals.items()}
+
+async def main_async(args: argparse.Namespace) -> Dict[str, object]:
+    install_fake_identity_db()
+    set_checkpoint_store(NullCheckpointStore())
+    llm = FakeChatModel(latency=args.latency, jitter=args.jitter, seed=args.seed)
+    results: Dict[str, object] = {"llm_latency_s": args.latency, "mode": args.mode, "posts": args.posts}
+    for section_mode in SECTION_NODES:
+        results[section_mode] = await measure(section_mode, llm, args.mode, args.posts, args.topic)
+    separate, fused = results["separate"], results["fused"]
+    results["reduction"] = {
+        stat: round(1 - fused[stat] / separate[stat], 4) if separate[stat] else None
+        for stat in ("prompt_tokens", "duration_s", "run_s")
+    }
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM latency per call (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Uniform +/- jitter on the latency (seconds)")
+    parser.add_argument("--mode", choices=["linear", "parallel"], default="linear")
+    parser.add_argument("--posts", type=int, default=5)
+    parser.add_argument("--topic", default="bootstrapping")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compare the per-node cost of the legacy pydantic state against partial dict updates.
+
+The legacy emulation does what the graph did before: every node rebuilt (and
+re-validated) the whole pydantic state from the channel values, mutated it and
+returned the full copy, which was written back field by field. The current path
+has each node return only the fields it changed, merged with the same reducers
+as AgentState. LLM calls and checkpoint writes are left out; only state
+handling is measured. Run from agents/post-agent:
+    python -m benchmarks.state_allocations --runs 500
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import json
+import time
+import tracemalloc
+
+from pydantic import BaseModel, Field
+
+from benchmarks.fakes import SAMPLE_IDENTITY_SPEC
+from src.agents.base import APPEND_FIELDS
+from src.agents.identity_agent import IdentitySpec
+
+class LegacyAgentState(BaseModel):
+    """The pydantic state model the workflow used to rebuild at every node."""
+    run_id: Optional[str] = None
+    current_topic: Optional[str] = None
+    hook_text: Optional[str] = None
+    body_text: Optional[str] = None
+    cta_text: Optional[str] = None
+    research_data: List[Dict[str, str]] = Field(default_factory=list)
+    messages: List[Dict[str, str]] = Field(default_factory=list)
+    qa_feedback: Optional[str] = None
+    qa_suggestions: List[str] = Field(default_factory=list)
+    qa_score: Optional[int] = None
+    qa_issues: List[str] = Field(default_factory=list)
+    post_payload: Optional[Dict[str, Any]] = None
+    image_url: Optional[str] = None
+    hashtags: List[str] = Field(default_factory=list)
+    identity_spec: Optional[IdentitySpec] = None
+    validators: Optional[Dict[str, Any]] = None
+    checkpoint_history: List[Dict[str, Any]] = Field(default_factory=list)
+
+def node_outputs(research_items: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """The fields each workflow node sets, in linear-mode order."""
+    return [
+        ("identity", {
+            "identity_spec": IdentitySpec.model_validate(SAMPLE_IDENTITY_SPEC),
+            "validators": {"hook": lambda h: (True, None), "tone": lambda t: 1.0, "body": lambda b: (True, None)}
+        }),
+        ("select_topic", {"current_topic": "bootstrapping", "hashtags": ["Bootstrapping", "Startups", "Founders"]}),
+        ("research", {"research_data": [
+            {"source": f"https://example.com/{i}", "snippet": "A relevant fact. " * 30} for i in range(research_items)
+        ]}),
+        ("generate_hook", {"hook_text": "Nobody tells you this about bootstrapping:"}),
+        ("generate_body", {"body_text": "Start small. Ship weekly. " * 40}),
+        ("generate_cta", {"cta_text": "What would you add? Tell me in the comments."}),
+        ("qa_check", {"qa_feedback": "Clear and direct.", "qa_suggestions": ["Add a number"], "qa_score": 8, "qa_issues": []}),
+        ("assemble_post", {"post_payload": {"text": "Start small. Ship weekly. " * 45, "image_url": ""}})
+    ]
+
+def message(node: str) -> Dict[str, str]:
+    return {"role": "assistant", "content": f"{node} finished. " + "Generated content. " * 25}
+
+def legacy_run(outputs: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    channels: Dict[str, Any] = {"run_id": "bench"}
+    for node, fields in outputs:
+        state = LegacyAgentState(**channels)
+        for name, value in fields.items():
+            setattr(state, name, value)
+        state.messages.append(message(node))
+        channels = {name: getattr(state, name) for name in type(state).model_fields}
+    return channels
+
+def partial_run(outputs: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    channels: Dict[str, Any] = {"run_id": "bench"}
+    for node, fields in outputs:
+        update = {**fields, "messages": [message(node)]}
+        for name, value in update.items():
+            channels[name] = (channels.get(name) or []) + value if name in APPEND_FIELDS else value
+    return channels
+
+def measure(run: Callable, outputs: List[Tuple[str, Dict[str, Any]]], runs: int) -> Dict[str, float]:
+    start = time.perf_counter()
+    for _ in range(runs):
+        run(outputs)
+    elapsed = time.perf_counter() - start
+
+    # Allocations are traced separately, as tracemalloc slows everything down
+    tracemalloc.start()
+    run(outputs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "us_per_run": round(elapsed * 1e6 / runs, 1),
+        "peak_kb_per_run": round(peak / 1024, 1)
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=500)
+    parser.add_argument("--research-items", type=int, default=10)
+    args = parser.parse_args()
+
+    outputs = node_outputs(args.research_items)
+    legacy = measure(legacy_run, outputs, args.runs)
+    partial = measure(partial_run, outputs, args.runs)
+    print(json.dumps({
+        "nodes": len(outputs),
+        "legacy": legacy,
+        "partial": partial,
+        "speedup": round(legacy["us_per_run"] / partial["us_per_run"], 1),
+        "peak_kb_saved_per_run": round(legacy["peak_kb_per_run"] - partial["peak_kb_per_run"], 1)
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compare time to first byte of the blocking and the streamed (SSE) post generation with a fake LLM.
+
+Run from agents/post-agent:
+    python -m benchmarks.stream_latency --latency 1.0 --posts 5
+"""
+
+from typing import Dict, List
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+from benchmarks.fakes import FakeChatModel, install_fake_identity_db
+from src.checkpoints import NullCheckpointStore, set_checkpoint_store
+from src.orchestrator import create_workflow, stream_post_events
+
+def mean(values: List[float]) -> float:
+    return round(statistics.mean(values), 3)
+
+async def blocking(workflow, topic: str) -> float:
+    start = time.perf_counter()
+    await workflow.ainvoke({"run_id": uuid.uuid4().hex, "current_topic": topic})
+    return time.perf_counter() - start
+
+async def streamed(workflow, topic: str) -> Dict[str, float]:
+    start = time.perf_counter()
+    timings: Dict[str, float] = {}
+    async for item in stream_post_events(topic=topic, workflow=workflow):
+        elapsed = time.perf_counter() - start
+        timings.setdefault("first_event_s", elapsed)
+        if item["event"] == "node_end":
+            timings.setdefault("first_node_end_s", elapsed)
+        elif item["event"] == "token":
+            timings.setdefault("first_token_s", elapsed)
+        elif item["event"] == "error":
+            raise RuntimeError(item["error"])
+    timings["total_s"] = time.perf_counter() - start
+    return timings
+
+async def main_async(args: argparse.Namespace) -> Dict[str, object]:
+    install_fake_identity_db()
+    set_checkpoint_store(NullCheckpointStore())
+    llm = FakeChatModel(latency=args.latency, jitter=args.jitter, seed=args.seed)
+    workflow = create_workflow(llm=llm, mode=args.mode)
+    blocking_runs = [await blocking(workflow, args.topic) for _ in range(args.posts)]
+    stream_runs = [await streamed(workflow, args.topic) for _ in range(args.posts)]
+    return {
+        "llm_latency_s": args.latency,
+        "posts": args.posts,
+        "blocking_first_byte_s": mean(blocking_runs),
+        "stream": {key: mean([run[key] for run in stream_runs]) for key in stream_runs[0]}
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=1.0, help="Fake LLM latency per call (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Uniform +/- jitter on the latency (seconds)")
+    parser.add_argument("--posts", type=int, default=5)
+    parser.add_argument("--mode", choices=["linear", "parallel"], default="linear")
+    parser.add_argument("--topic", default="bootstrapping")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
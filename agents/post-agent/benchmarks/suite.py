@@ -0,0 +1,201 @@
+"""
+Offline benchmark suite: per-node overhead, checkpoint I/O, validation cost and throughput.
+
+Every run uses the scripted FakeChatModel and the fake identity DB, so only the
+pipeline's own work is measured. Results are written as JSON; pass a previous
+result file with --baseline to flag regressions.
+
+Run from agents/post-agent:
+    python -m benchmarks.suite --output benchmarks/results/latest.json
+    python -m benchmarks.suite --baseline benchmarks/results/latest.json
+"""
+
+from typing import Any, Dict, List
+from datetime import datetime
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import uuid
+
+from benchmarks.fakes import FakeChatModel, SAMPLE_IDENTITY_SPEC, install_fake_identity_db
+from src.agents.identity_agent import IdentityAgent
+from src.checkpoints import JsonlCheckpointStore, NullCheckpointStore, set_checkpoint_store
+from src.metrics import MetricsCallbackHandler, RunMetrics
+from src.orchestrator import create_workflow, generate_posts_batch
+
+HOOKS = ["Nobody tells you this about pricing:", "7 lessons I learned about hiring", "Some hook matching no template at all"]
+BODY = "Most founders wait too long. Start small. Ship every week. Talk to users every day. Keep what works. " * 4
+
+def mean_ms(values: List[float]) -> float:
+    return round(statistics.mean(values) * 1000, 3)
+
+async def run_once(workflow, topic: str) -> RunMetrics:
+    run_id = uuid.uuid4().hex
+    metrics = RunMetrics(run_id)
+    await workflow.ainvoke(
+        {"run_id": run_id, "current_topic": topic},
+        config={"callbacks": [MetricsCallbackHandler(metrics)]}
+    )
+    return metrics
+
+async def bench_node_overhead(runs: int, mode: str) -> Dict[str, Any]:
+    """Node wall time minus the time spent inside the (zero-latency) LLM, per node."""
+    set_checkpoint_store(NullCheckpointStore())
+    workflow = create_workflow(llm=FakeChatModel(), mode=mode)
+    await run_once(workflow, "warmup")
+    samples: Dict[str, List[tuple]] = {}
+    for _ in range(runs):
+        metrics = await run_once(workflow, "bootstrapping")
+        for node, stats in metrics.nodes.items():
+            samples.setdefault(node, []).append((stats["duration_s"], stats["llm_duration_s"]))
+    return {
+        node: {
+            "node_ms": mean_ms([total for total, _ in values]),
+            "llm_ms": mean_ms([llm for _, llm in values]),
+            "overhead_ms": mean_ms([total - llm for total, llm in values])
+        }
+        for node, values in samples.items()
+    }
+
+async def bench_checkpoint_io(runs: int) -> Dict[str, Any]:
+    """End-to-end cost of JSONL checkpoints over no checkpoints, and what they write."""
+    workflow = create_workflow(llm=FakeChatModel(), mode="linear")
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, store in (("none", NullCheckpointStore()), ("jsonl", JsonlCheckpointStore(directory))):
+            writer = set_checkpoint_store(store)
+            await run_once(workflow, "warmup")
+            writer.flush()
+            written, bytes_written = writer.written, writer.bytes_written
+            durations = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                await run_once(workflow, "bootstrapping")
+                durations.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            writer.flush()
+            results[name] = {
+                "run_ms": mean_ms(durations),
+                "flush_ms": round((time.perf_counter() - start) * 1000, 3),
+                "records_per_run": (writer.written - written) / runs,
+                "bytes_per_run": round((writer.bytes_written - bytes_written) / runs)
+            }
+        set_checkpoint_store(NullCheckpointStore())
+    results["overhead_ms_per_run"] = round(results["jsonl"]["run_ms"] - results["none"]["run_ms"], 3)
+    return results
+
+def bench_validation(iterations: int) -> Dict[str, Any]:
+    """Microseconds per call of each identity validator."""
+    agent = IdentityAgent(llm=FakeChatModel())
+    templates = SAMPLE_IDENTITY_SPEC["hook_templates"]
+    cases = {
+        "hook": lambda: [agent._validate_hook(hook, templates) for hook in HOOKS],
+        "body": lambda: agent._validate_body(BODY),
+        "tone": lambda: agent._score_tone(BODY)
+    }
+    results = {}
+    for name, case in cases.items():
+        calls = len(HOOKS) if name == "hook" else 1
+        case()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            case()
+        results[f"{name}_us"] = round((time.perf_counter() - start) * 1e6 / (iterations * calls), 2)
+    return results
+
+async def bench_throughput(posts: int, latency: float, levels: List[int], mode: str) -> List[Dict[str, Any]]:
+    """Posts per minute through generate_posts_batch at each concurrency level."""
+    set_checkpoint_store(NullCheckpointStore())
+    workflow = create_workflow(llm=FakeChatModel(latency=latency, jitter=latency / 5, seed=7), mode=mode)
+    topics = [f"topic {i}" for i in range(posts)]
+    results = []
+    for level in levels:
+        start = time.perf_counter()
+        failed = 0
+        async for item in generate_posts_batch(topics, max_concurrency=level, workflow=workflow):
+            failed += item["status"] != "success"
+        elapsed = time.perf_counter() - start
+        results.append({
+            "concurrency": level,
+            "posts_per_min": round(posts * 60 / elapsed, 1),
+            "total_s": round(elapsed, 3),
+            "failed": failed
+        })
+    return results
+
+def flatten(data: Any, prefix: str = "") -> Dict[str, float]:
+    """Flatten nested results to {"a.b.c": number}; list items are keyed by their concurrency."""
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, list):
+        items = ((str(item.get("concurrency", i)), item) for i, item in enumerate(data))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        return {prefix: float(data)}
+    else:
+        return {}
+    flat: Dict[str, float] = {}
+    for key, value in items:
+        flat.update(flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """List metrics that got worse than the baseline by more than `threshold` (a fraction)."""
+    current, previous = flatten(results["benchmarks"]), flatten(baseline["benchmarks"])
+    regressions = []
+    for key, value in current.items():
+        old = previous.get(key)
+        if not old:
+            continue
+        # Throughput is better when higher; everything else is a cost
+        change = (old - value) / old if key.endswith("posts_per_min") else (value - old) / old
+        if change > threshold:
+            regressions.append({"metric": key, "baseline": old, "current": value, "worse_by": round(change, 3)})
+    return regressions
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    install_fake_identity_db()
+    benchmarks: Dict[str, Any] = {
+        "node_overhead": await bench_node_overhead(args.runs, args.mode),
+        "checkpoint_io": await bench_checkpoint_io(args.runs),
+        "validation": bench_validation(args.iterations),
+        "throughput": await bench_throughput(args.posts, args.latency, args.concurrency, args.mode)
+    }
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "benchmarks": benchmarks
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20, help="Workflow runs for node overhead and checkpoint I/O")
+    parser.add_argument("--iterations", type=int, default=2000, help="Calls per validator")
+    parser.add_argument("--posts", type=int, default=32, help="Posts per throughput measurement")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake LLM latency for throughput (seconds)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--mode", choices=["linear", "parallel"], default="linear")
+    parser.add_argument("--output", default=None, help="Write results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="Previous results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change reported as a regression")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            results["regressions"] = compare(results, json.load(f), args.threshold)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    if results.get("regressions"):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compare end-to-end latency of the linear and parallel workflow modes with a fake LLM.
+
+Run from agents/post-agent:
+    python -m benchmarks.workflow_latency --latency 0.5 --jitter 0.1 --posts 10
+"""
+
+from typing import Dict, List
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+from benchmarks.fakes import FakeChatModel, install_fake_identity_db
+from src.checkpoints import NullCheckpointStore, set_checkpoint_store
+from src.orchestrator import create_workflow
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    ordered = sorted(durations)
+    return {
+        "mean_s": round(statistics.mean(ordered), 3),
+        "p50_s": round(ordered[len(ordered) // 2], 3),
+        "p95_s": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3)
+    }
+
+async def measure(mode: str, llm: FakeChatModel, posts: int, topic: str) -> List[float]:
+    workflow = create_workflow(llm=llm, mode=mode)
+    durations = []
+    for _ in range(posts):
+        start = time.perf_counter()
+        result = await workflow.ainvoke({"run_id": uuid.uuid4().hex, "current_topic": topic})
+        durations.append(time.perf_counter() - start)
+        assert dict(result).get("post_payload"), f"{mode} workflow produced no post"
+    return durations
+
+async def main_async(args: argparse.Namespace) -> Dict[str, object]:
+    install_fake_identity_db()
+    set_checkpoint_store(NullCheckpointStore())
+    llm = FakeChatModel(latency=args.latency, jitter=args.jitter, seed=args.seed)
+    results: Dict[str, object] = {"llm_latency_s": args.latency, "jitter_s": args.jitter, "posts": args.posts}
+    for mode in ("linear", "parallel"):
+        results[mode] = summarize(await measure(mode, llm, args.posts, args.topic))
+    results["mean_reduction"] = round(1 - results["parallel"]["mean_s"] / results["linear"]["mean_s"], 4)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM latency per call (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Uniform +/- jitter on the latency (seconds)")
+    parser.add_argument("--posts", type=int, default=10)
+    parser.add_argument("--topic", default="bootstrapping")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,23 @@
-from typing import Any, Dict, List, Optional
-from pydantic import BaseModel, Field
-from langchain_core.messages import HumanMessage, AIMessage
+from typing import Any, Annotated, Awaitable, Callable, Dict, List, Optional, Tuple, Type, TypedDict, TypeVar
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import Graph, StateGraph
+from langchain_core.runnables import Runnable, RunnableLambda
+from langgraph.graph import Graph
 from langgraph.prebuilt import ToolNode
 import os
 from dotenv import load_dotenv
 from langchain_core.language_models import BaseChatModel
 from langchain_core.tools import BaseTool
+from ..llm_factory import get_shared_llm
+from ..checkpoints import get_checkpoint_writer
+from ..llm_cache import get_response_cache, is_cache_enabled_for
+from ..message_log import append_messages, spill_message
+from ..metrics import record_retry, record_retry_outcome
+from ..structured_output import STRUCTURED_OUTPUT, STRUCTURED_OUTPUT_METHOD, parse_output
+from ..prompt_cache import prompt_cache
+from ..context_cache import get_context_cache
+from pydantic import BaseModel
 import logging
-import json
+import operator
 from datetime import datetime
 
 # Load environment variables
@@ -18,42 +25,142 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-class AgentState(BaseModel):
-    """State model for agent workflow."""
-    current_topic: Optional[str] = Field(default=None, description="Current topic being processed")
-    hook_text: Optional[str] = Field(default=None, description="Generated hook text")
-    body_text: Optional[str] = Field(default=None, description="Generated body text")
-    cta_text: Optional[str] = Field(default=None, description="Generated call-to-action text")
-    research_data: List[Dict[str, str]] = Field(default_factory=list, description="Research data collected")
-    messages: List[Dict[str, str]] = Field(default_factory=list, description="Chat messages")
-    qa_feedback: Optional[str] = Field(default=None, description="QA feedback on the post")
-    qa_suggestions: List[str] = Field(default_factory=list, description="QA suggestions for improvement")
-    qa_score: Optional[int] = Field(default=None, description="QA score from 1-10")
-    qa_issues: List[str] = Field(default_factory=list, description="QA identified issues")
-    post_payload: Optional[Dict[str, Any]] = Field(default=None, description="Final assembled post payload")
-    image_url: Optional[str] = Field(default=None, description="URL for post image")
-    checkpoint_history: List[Dict[str, Any]] = Field(default_factory=list, description="History of checkpoints")
+class AgentState(TypedDict, total=False):
+    """State shared by every node of the workflow.
+    
+    Nodes read the fields they need and return a dict with only the fields
+    they changed; LangGraph merges it into the state. `messages` and
+    `checkpoint_history` are append-reduced, so nodes return just their new
+    entries and parallel branches can add to them in the same step.
+    `messages` is also bounded by the retention policy in `message_log`.
+    """
+    run_id: Optional[str]  # Identifier of the workflow run
+    current_topic: Optional[str]  # Current topic being processed
+    hook_text: Optional[str]  # Generated hook text
+    body_text: Optional[str]  # Generated body text
+    cta_text: Optional[str]  # Generated call-to-action text
+    research_data: List[Dict[str, str]]  # Research data collected
+    messages: Annotated[List[Dict[str, str]], append_messages]  # Chat messages, oldest dropped or summarized
+    qa_feedback: Optional[str]  # QA feedback on the post
+    qa_suggestions: List[str]  # QA suggestions for improvement
+    qa_score: Optional[int]  # QA score from 1-10
+    qa_issues: List[str]  # QA identified issues
+    post_payload: Optional[Dict[str, Any]]  # Final assembled post payload
+    image_url: Optional[str]  # URL for post image
+    hashtags: List[str]  # Hashtags recommended in the topic brief
+    identity_spec: Optional[Any]  # Current IdentitySpec, set by the identity agent
+    identity_id: Optional[Any]  # Row id of the identity spec
+    identity_version: Optional[str]  # Id plus spec hash; keys the compiled prompt templates
+    validators: Optional[Dict[str, Any]]  # Validation functions, set by the identity agent
+    checkpoint_history: Annotated[List[Dict[str, Any]], operator.add]  # Index of saved checkpoints
+    refine_section: Optional[str]  # Section the QA check sent back for regeneration, None once accepted
+    refinement_iterations: int  # Sections regenerated so far after a low QA score
+    refinement_log: Annotated[List[Dict[str, Any]], operator.add]  # One entry per QA check: score, decision, tokens, elapsed
+
+# Reducers of the append-merged fields; updates carry only the new items
+REDUCERS = {"messages": append_messages, "checkpoint_history": operator.add, "refinement_log": operator.add}
+APPEND_FIELDS = tuple(REDUCERS)
+
+# State fields recorded in checkpoints
+CHECKPOINT_FIELDS = {
+    "current_topic", "hook_text", "body_text", "cta_text", "research_data", "messages",
+    "qa_feedback", "qa_suggestions", "qa_score", "qa_issues", "post_payload", "image_url", "hashtags",
+    "refine_section", "refinement_log", "identity_version"
+}
+
+# Outputs scoring lower on the identity's tone scorer are regenerated
+MIN_TONE_SCORE = 0.6
+
+T = TypeVar("T")
+
+def identity_block(identity_spec: Any) -> str:
+    """The creator's identity as one text block, shared verbatim by every generator prompt.
+    
+    Being identical across generators and posts, it is what gets uploaded to
+    the provider's context cache (see BaseAgent.context_llm).
+    """
+    return f"""You are a professional LinkedIn content creator for {identity_spec.creator}.
+
+Creator identity:
+- Promise: {identity_spec.promise}
+- Voice: {identity_spec.voice}
+- Brand pillars, most important first: {identity_spec.pillars_ranked}
+- Signature stories: {identity_spec.signature_stories}
+- Hook templates: {identity_spec.hook_templates}
+- CTA style: {identity_spec.cta_style}"""
+
+# A named check on generated text, returning why it failed or None if it passed
+OutputCheck = Tuple[str, Callable[[str], Optional[str]]]
+
+class RetryPolicy:
+    """Regenerates output that fails its checks, telling the model what was wrong.
+    
+    Up to `max_attempts` generations are made (default: VALIDATION_MAX_ATTEMPTS
+    env var, else 3); the loop stops at the first output that passes every
+    check. Each retry is counted with `record_retry`, and each retried
+    generation as recovered or exhausted with `record_retry_outcome`. If no
+    attempt passes, the last output is kept.
+    """
+    
+    def __init__(self, max_attempts: Optional[int] = None):
+        self.max_attempts = max(1, max_attempts or int(os.getenv("VALIDATION_MAX_ATTEMPTS", "3")))
+        
+    @staticmethod
+    def first_failure(checks: List[OutputCheck], text: str) -> Optional[Tuple[str, str]]:
+        """Return (check name, reason) of the first check `text` fails, or None."""
+        for name, check in checks:
+            reason = check(text)
+            if reason is not None:
+                return name, reason
+        return None
+        
+    @staticmethod
+    def feedback_for(reason: str, text: str) -> str:
+        """Prompt text describing why the previous output was rejected."""
+        return f"\n\nYour previous answer was rejected: {reason}\nPrevious answer: {text}\nWrite a new one that fixes this."
+        
+    async def run(
+        self,
+        agent_name: str,
+        generate: Callable[[str, int], Awaitable[T]],
+        text_of: Callable[[T], str],
+        checks: List[OutputCheck],
+        feedback: str = ""
+    ) -> T:
+        """Call `generate(feedback, attempt)` until its output passes `checks` or attempts run out."""
+        attempt = 1
+        result = await generate(feedback, attempt)
+        failure = self.first_failure(checks, text_of(result))
+        while failure is not None and attempt < self.max_attempts:
+            name, reason = failure
+            logger.warning("%s attempt %d failed the %s check: %s", agent_name, attempt, name, reason)
+            record_retry(agent_name, name)
+            attempt += 1
+            result = await generate(feedback + self.feedback_for(reason, text_of(result)), attempt)
+            failure = self.first_failure(checks, text_of(result))
+        if attempt > 1:
+            record_retry_outcome(agent_name, failure is None)
+        if failure is not None:
+            logger.warning("%s output still fails the %s check after %d attempts; keeping it", agent_name, failure[0], attempt)
+        return result
 
 class BaseAgent:
     """Base class for all agents in the system."""
     
-    def __init__(self, name: str, tools: Optional[List[BaseTool]] = None):
+    # Whether identical prompts may be answered from the shared response cache
+    cache_responses: bool = False
+    
+    def __init__(self, name: str, tools: Optional[List[BaseTool]] = None, llm: Optional[BaseChatModel] = None):
         self.name = name
         self.tools = tools or []
         self.tool_node = ToolNode(self.tools) if self.tools else None
+        self.retry_policy = RetryPolicy()
         
-        # Initialize LLM with default configuration
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY not found in environment variables")
-            
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-lite",
-            google_api_key=api_key,
-            temperature=0.7,
-            top_p=0.8,
-            top_k=40
-        )
+        # Use the provided LLM, otherwise the shared client for the default configuration
+        if llm is not None:
+            self.set_llm(llm)
+        else:
+            self._attach_llm(get_shared_llm())
         
         logger.info(f"Initialized {self.name} agent with {len(self.tools)} tools and LLM configured")
         
@@ -61,8 +168,18 @@ class BaseAgent:
         """Set the language model for the agent."""
         if not isinstance(llm, BaseChatModel):
             raise ValueError("LLM must be an instance of BaseChatModel")
-        self.llm = llm
-        logger.debug(f"Set custom LLM for {self.name} agent")
+        self._attach_llm(llm)
+        logger.debug("Set custom LLM for %s agent", self.name)
+        
+    def _attach_llm(self, llm: BaseChatModel):
+        """Keep the raw LLM and, if this agent caches responses, a copy bound to the response cache."""
+        self.uncached_llm = llm
+        if is_cache_enabled_for(self.name, self.cache_responses):
+            # The copy shares the underlying client; only its cache differs
+            self.llm = llm.model_copy(update={"cache": get_response_cache().for_agent(self.name)})
+            logger.debug("Response cache enabled for %s agent", self.name)
+        else:
+            self.llm = llm
         
     def add_tool(self, tool: BaseTool):
         """Add a tool to the agent's toolkit."""
@@ -70,7 +187,7 @@ class BaseAgent:
             raise ValueError("Tool must be an instance of BaseTool")
         self.tools.append(tool)
         self.tool_node = ToolNode(self.tools)
-        logger.debug(f"Added tool {tool.name} to {self.name} agent")
+        logger.debug("Added tool %s to %s agent", tool.name, self.name)
         
     def create_chain(self, prompt: ChatPromptTemplate) -> Any:
         """Create a chain with the LLM and parser."""
@@ -78,8 +195,26 @@ class BaseAgent:
             raise ValueError("LLM not initialized. Call set_llm() first.")
         return prompt | self.llm
         
-    async def run(self, state: AgentState) -> AgentState:
-        """Run the agent's main logic."""
+    def structured_chain(self, prompt: ChatPromptTemplate, schema: Type[BaseModel], llm: Optional[BaseChatModel] = None) -> Runnable:
+        """Chain `prompt` to the LLM (default: `self.llm`) with output parsed into `schema`.
+        
+        With STRUCTURED_OUTPUT=native the model is asked for schema-constrained
+        JSON via `with_structured_output`; whatever fails validation, and every
+        output when the model doesn't support it, goes through the tolerant
+        parser instead, which repairs the JSON rather than regenerating it.
+        """
+        llm = llm or self.llm
+        parse = RunnableLambda(lambda output: parse_output(output, schema, self.name), name=f"parse_{schema.__name__}")
+        if STRUCTURED_OUTPUT == "native":
+            try:
+                structured = llm.with_structured_output(schema, method=STRUCTURED_OUTPUT_METHOD, include_raw=True)
+                return prompt | structured | parse
+            except (NotImplementedError, TypeError, ValueError) as e:
+                logger.warning(f"{self.name}: native structured output unavailable ({e}); parsing text output")
+        return prompt | llm | parse
+        
+    async def run(self, state: AgentState) -> Dict[str, Any]:
+        """Run the agent's main logic and return the state fields it changed."""
         raise NotImplementedError("Subclasses must implement run method")
         
     def create_prompt(self, system_prompt: str) -> ChatPromptTemplate:
@@ -89,79 +224,123 @@ class BaseAgent:
             ("human", "{input}")
         ])
         
+    def cached_prompt(self, state: AgentState, build: Callable[[], ChatPromptTemplate], variant: str = "") -> ChatPromptTemplate:
+        """Return this agent's prompt for the state's identity version, calling `build` only the first time.
+        
+        Use `variant` to tell apart several prompts of one agent.
+        """
+        name = f"{self.name}:{variant}" if variant else self.name
+        return prompt_cache.get_or_build(name, state.get("identity_id"), state.get("identity_version"), build)
+        
+    def identity_prompt(self, identity_spec: Any, task: str, human_message: str, cached_context: bool = False) -> ChatPromptTemplate:
+        """Generator prompt: the identity block and `task` as the system message, then `human_message`.
+        
+        With `cached_context` the identity block lives in the provider's context
+        cache, which also holds the system instruction, so the prompt is just
+        `task` ahead of `human_message`.
+        """
+        if cached_context:
+            return ChatPromptTemplate.from_messages([("human", f"{task}\n\n{human_message}")])
+        # Escape the identity block; only the human message has template variables
+        block = identity_block(identity_spec).replace("{", "{{").replace("}", "}}")
+        return ChatPromptTemplate.from_messages([
+            ("system", f"{block}\n\n{task}"),
+            ("human", human_message)
+        ])
+        
+    async def context_llm(self, state: AgentState) -> Tuple[BaseChatModel, bool]:
+        """Return the LLM to call and whether it references the identity block in the context cache.
+        
+        When it does, build the prompt with `cached_context=True`. Without a
+        context cache (CONTEXT_CACHE=off) this is `self.llm` and False.
+        """
+        cache = get_context_cache()
+        if cache is None:
+            return self.llm, False
+        identity_spec = state.get("identity_spec")
+        handle = await cache.handle_for(
+            self.name,
+            self.llm,
+            state.get("identity_id"),
+            state.get("identity_version"),
+            lambda: identity_block(identity_spec)
+        )
+        if handle is None:
+            return self.llm, False
+        return cache.bind(self.llm, handle), True
+        
+    def message(self, state: AgentState, content: str, role: str = "assistant") -> Dict[str, str]:
+        """Build a message for the agent's update; large contents are spilled to the checkpoint store."""
+        return spill_message(state.get("run_id"), {"role": role, "content": content})
+        
+    def refinement_feedback(self, state: AgentState, section: str) -> str:
+        """Prompt text asking to address the QA review, if the QA check sent `section` back; else ""."""
+        if state.get("refine_section") != section:
+            return ""
+        points = (state.get("qa_issues") or []) + (state.get("qa_suggestions") or [])
+        lines = [
+            f"A reviewer scored the previous draft {state.get('qa_score')}/10 and found this {section} the weakest part.",
+            f"Previous {section}: {state.get(f'{section}_text')}",
+            f"Reviewer feedback: {state.get('qa_feedback')}"
+        ]
+        lines += [f"- {point}" for point in points]
+        lines.append(f"Write an improved {section} that addresses this feedback.")
+        return "\n\n" + "\n".join(lines)
+        
+    def output_checks(self, validators: Optional[Dict[str, Any]], validator: str, tone: bool = True) -> List[OutputCheck]:
+        """Checks for generated text: the identity's `validator` rule, then (if `tone`) its tone score."""
+        validators = validators or {}
+        checks: List[OutputCheck] = []
+        if validator in validators:
+            def validate(text: str) -> Optional[str]:
+                is_valid, error_msg = validators[validator](text)
+                return None if is_valid else error_msg
+            checks.append(("validation", validate))
+        if tone and "tone" in validators:
+            def score_tone(text: str) -> Optional[str]:
+                score = validators["tone"](text)
+                logger.info(f"{self.name} tone score: {score}")
+                if score < MIN_TONE_SCORE:
+                    return f"tone score {score:.2f} is below {MIN_TONE_SCORE}; improve readability and engagement"
+                return None
+            checks.append(("tone", score_tone))
+        return checks
+        
     def get_graph(self) -> Graph:
         """Get the agent's workflow graph."""
         raise NotImplementedError("Subclasses must implement get_graph method") 
         
-    def save_checkpoint(self, state: AgentState) -> None:
-        """Save a checkpoint of the current state."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        checkpoint = {
-            "timestamp": timestamp,
-            "agent_name": self.name,
-            "topic": state.current_topic,
-            "state": {
-                "current_topic": state.current_topic,
-                "hook_text": state.hook_text,
-                "body_text": state.body_text,
-                "cta_text": state.cta_text,
-                "research_data": state.research_data,
-                "messages": state.messages,
-                "qa_feedback": state.qa_feedback,
-                "qa_suggestions": state.qa_suggestions,
-                "qa_score": state.qa_score,
-                "qa_issues": state.qa_issues,
-                "post_payload": state.post_payload,
-                "image_url": state.image_url
-            },
-            "input": {
-                "topic": state.current_topic,
-                "hook_text": state.hook_text,
-                "body_text": state.body_text,
-                "cta_text": state.cta_text,
-                "research_data": state.research_data
-            },
-            "output": {
-                "hook_text": state.hook_text,
-                "body_text": state.body_text,
-                "cta_text": state.cta_text,
-                "research_data": state.research_data,
-                "qa_feedback": state.qa_feedback,
-                "qa_suggestions": state.qa_suggestions,
-                "qa_score": state.qa_score,
-                "qa_issues": state.qa_issues
-            }
-        }
+    def save_checkpoint(self, state: AgentState, phase: str = "output", update: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Save a checkpoint of the state before ("input") or after ("output") the agent ran.
         
-        # Get the run timestamp from the first checkpoint if it exists
-        run_timestamp = state.checkpoint_history[0]["timestamp"] if state.checkpoint_history else timestamp
+        For the output checkpoint, pass the agent's update so the snapshot shows
+        the state as it will be after the node. Returns the lightweight index
+        entry, which the agent adds to its update's `checkpoint_history`.
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        # Create directory if it doesn't exist
-        os.makedirs("testresult", exist_ok=True)
+        # Fall back to the run timestamp from the first checkpoint if no run ID was assigned
+        history = state.get("checkpoint_history") or []
+        run_id = state.get("run_id") or (history[0]["timestamp"] if history else timestamp)
         
-        # Update the state's checkpoint history
-        state.checkpoint_history.append(checkpoint)
+        # Copy the containers, so the writer can delta-encode the snapshot off-thread
+        snapshot = {}
+        for field in CHECKPOINT_FIELDS:
+            value = state.get(field)
+            if update is not None and field in update:
+                value = REDUCERS[field](value or [], update[field]) if field in REDUCERS else update[field]
+            snapshot[field] = list(value) if isinstance(value, list) else dict(value) if isinstance(value, dict) else value
         
-        # Save all checkpoints to a single file
-        filename = f"testresult/history_{run_timestamp}.json"
+        get_checkpoint_writer().submit(run_id, {
+            "timestamp": timestamp,
+            "agent_name": self.name,
+            "phase": phase,
+            "state": snapshot
+        })
         
-        # Read existing checkpoints if file exists
-        existing_checkpoints = []
-        if os.path.exists(filename):
-            try:
-                with open(filename, 'r') as f:
-                    data = json.load(f)
-                    existing_checkpoints = data.get("checkpoints", [])
-            except json.JSONDecodeError:
-                logger.warning(f"Failed to read existing checkpoints from {filename}")
-                existing_checkpoints = []
-        
-        # Combine existing and new checkpoints
-        all_checkpoints = existing_checkpoints + [checkpoint]
-        
-        # Save all checkpoints to the file
-        with open(filename, 'w') as f:
-            json.dump({
-                "run_timestamp": run_timestamp,
-                "checkpoints": all_checkpoints
-            }, f, indent=2)
\ No newline at end of file
+        # Keep only a lightweight index in the state; the data itself lives in the checkpoint store
+        return {
+            "timestamp": timestamp,
+            "agent_name": self.name,
+            "phase": phase
+        }
@@ -1,13 +1,67 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 from .base import BaseAgent, AgentState
+from ..logging_utils import lazy
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
+from langchain_core.language_models import BaseChatModel
 from langgraph.graph import Graph, StateGraph
 import logging
+import time
+import re
+import os
 
 logger = logging.getLogger(__name__)
 
+# LinkedIn rejects posts longer than this
+LINKEDIN_MAX_CHARS = 3000
+MAX_HASHTAGS = 5
+
+def _paragraphs(text: str) -> List[str]:
+    """Split text into trimmed, non-empty paragraphs."""
+    return [p.strip() for p in re.split(r"\n\s*\n", text.strip()) if p.strip()]
+
+def format_hashtags(hashtags: List[str], limit: int = MAX_HASHTAGS) -> str:
+    """Normalize hashtags to '#Word' form, dropping duplicates, and join them on one line."""
+    seen, tags = set(), []
+    for tag in hashtags:
+        tag = "#" + re.sub(r"[^\w]", "", tag.lstrip("#"))
+        if len(tag) > 1 and tag.lower() not in seen:
+            seen.add(tag.lower())
+            tags.append(tag)
+    return " ".join(tags[:limit])
+
+def _truncate(text: str, budget: int) -> str:
+    """Cut text to at most `budget` characters, preferring a sentence boundary."""
+    if len(text) <= budget:
+        return text
+    cut = text[:max(0, budget - 1)]
+    boundary = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "), cut.rfind("\n"))
+    if boundary > budget // 2:
+        return cut[:boundary + 1].rstrip()
+    return cut.rstrip() + "…"
+
+def format_post(hook: str, body: str, cta: str, hashtags: List[str], max_chars: int = LINKEDIN_MAX_CHARS) -> str:
+    """Assemble hook, body, CTA and hashtags into a post within LinkedIn's limit.
+    
+    Sections are separated by one blank line. If the post is too long the
+    body is shortened first, then the hashtags dropped, then the whole text cut.
+    """
+    separator = "\n\n"
+    head, tail = _paragraphs(hook), _paragraphs(cta)
+    tags = format_hashtags(hashtags)
+    if tags:
+        tail.append(tags)
+    body_text = separator.join(_paragraphs(body))
+    
+    fixed = separator.join(head + tail)
+    budget = max_chars - len(fixed) - 2 * len(separator)
+    if budget > 0:
+        return separator.join(head + [_truncate(body_text, budget)] + tail)
+    
+    # Hook and CTA alone are over the limit
+    logger.warning("Hook and CTA exceed the LinkedIn character limit; dropping body and hashtags")
+    return _truncate(separator.join(head + tail[:-1] if tags else head + tail), max_chars)
+
 class PostPayload(BaseModel):
     text: str = Field(description="The complete LinkedIn post text")
     image_url: str = Field(description="URL of the post image")
@@ -15,23 +69,26 @@ class PostPayload(BaseModel):
 class FinalAssemblerAgent(BaseAgent):
     """Agent responsible for assembling the final LinkedIn post."""
     
-    def __init__(self):
-        super().__init__("final_assembler")
-        self.parser = JsonOutputParser(pydantic_object=PostPayload)
+    def __init__(self, llm: Optional[BaseChatModel] = None, polish: Optional[bool] = None):
+        super().__init__("final_assembler", llm=llm)
+        # Posts are assembled locally; the LLM is only used for an optional polish pass
+        if polish is None:
+            polish = os.getenv("ASSEMBLER_LLM_POLISH", "false").lower() == "true"
+        self.polish = polish
         
     def create_prompt(self) -> ChatPromptTemplate:
         return ChatPromptTemplate.from_messages([
             ("system", """You are a professional LinkedIn content editor. Your task is to:
-            1. Combine the hook, body, and CTA into a cohesive post
+            1. Polish the assembled draft into a cohesive post
             2. Ensure proper formatting and spacing
-            3. Add relevant hashtags
+            3. Keep the hashtags on the last line
             4. Optimize for LinkedIn's algorithm
             
             Guidelines:
             - Maintain a professional tone
             - Use proper paragraph breaks
-            - Include relevant hashtags
-            - Keep the post within LinkedIn's character limit
+            - Do not change the meaning of the hook, body or CTA
+            - Keep the post within LinkedIn's character limit of 3000 characters
             - Ensure smooth transitions between sections
             
             Format your response as a JSON object with the following structure:
@@ -39,65 +96,70 @@ class FinalAssemblerAgent(BaseAgent):
                 "text": "The complete LinkedIn post text",
                 "image_url": "URL of the post image or leave empty string if none"
             }}"""),
-            ("human", "Assemble the final LinkedIn post with:\nTopic: {topic}\nHook: {hook}\nBody: {body}\nCTA: {cta}")
+            ("human", "Polish this LinkedIn post about {topic}:\n\n{draft}")
         ])
     
-    async def run(self, state: AgentState) -> AgentState:
-        logger.debug(f"Final Assembler - Input State Type: {type(state)}")
-        logger.debug(f"Final Assembler - Input State Content: {state}")
+    async def run(self, state: AgentState) -> Dict[str, Any]:
+        logger.debug("Final Assembler - Input State Content: %s", lazy(state))
         
-        # Convert state dictionary to AgentState if needed
-        if isinstance(state, dict):
-            logger.info("Converting dictionary state to AgentState")
-            state = AgentState(**state)
-            logger.debug(f"Converted State Type: {type(state)}")
-            logger.debug(f"Converted State Content: {state}")
+        topic = state.get("current_topic")
+        hook_text = state.get("hook_text")
+        body_text = state.get("body_text")
+        cta_text = state.get("cta_text")
             
-        if not state.current_topic:
+        if not topic:
             logger.error("No topic found in state")
             raise ValueError("No topic selected for post assembly")
             
-        if not state.hook_text:
+        if not hook_text:
             logger.error("No hook found in state")
             raise ValueError("No hook generated for post assembly")
             
-        if not state.body_text:
+        if not body_text:
             logger.error("No body content found in state")
             raise ValueError("No body content available for post assembly")
             
-        if not state.cta_text:
+        if not cta_text:
             logger.error("No CTA found in state")
             raise ValueError("No CTA available for post assembly")
             
-        prompt = self.create_prompt()
-        chain = prompt | self.llm | self.parser
-        
-        # Get final post payload
-        result = await chain.ainvoke({
-            "topic": state.current_topic,
-            "hook": state.hook_text,
-            "body": state.body_text,
-            "cta": state.cta_text
-        })
-        logger.debug(f"Post Assembly Result: {result}")
+        # Assemble locally: formatting, hashtags and the length limit need no model call
+        start = time.perf_counter()
+        text = format_post(hook_text, body_text, cta_text, state.get("hashtags") or [])
+        image_url = state.get("image_url") or ""
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        # Rough token estimate (~4 characters per token) of the call this replaces
+        saved_tokens = (len(hook_text) + len(body_text) + len(cta_text) + 2 * len(text)) // 4
+        logger.info(f"Assembled post locally in {elapsed_ms:.2f}ms ({len(text)} chars, ~{saved_tokens} LLM tokens saved)")
         
-        # Convert result to PostPayload if it's a dictionary
-        if isinstance(result, dict):
-            result = PostPayload(**result)
+        if self.polish:
+            prompt = self.create_prompt()
+            chain = self.structured_chain(prompt, PostPayload)
+            
+            # Optional polish pass over the assembled draft
+            start = time.perf_counter()
+            result = await chain.ainvoke({
+                "topic": topic,
+                "draft": text
+            })
+            logger.debug("Post Polish Result: %s", lazy(result))
+            
+            # The model may ignore the limit, so enforce it again
+            text = _truncate(result.text.strip(), LINKEDIN_MAX_CHARS)
+            image_url = result.image_url or image_url
+            logger.info(f"LLM polish took {(time.perf_counter() - start) * 1000:.0f}ms")
         
-        # Update state
-        state.post_payload = {
-            "text": result.text,
-            "image_url": result.image_url or ""
+        # Return only the fields this node changed
+        update = {
+            "post_payload": {
+                "text": text,
+                "image_url": image_url
+            },
+            "messages": [self.message(state, f"Final post assembled successfully ({'LLM polished' if self.polish else 'template'}):\n{text}")]
         }
-        state.messages.append({
-            "role": "assistant",
-            "content": f"Final post assembled successfully:\n{result.text}"
-        })
         
-        logger.debug(f"Final Assembler - Output State Type: {type(state)}")
-        logger.debug(f"Final Assembler - Output State Content: {state}")
-        return state
+        logger.debug("Final Assembler - Output Update: %s", lazy(update))
+        return update
     
     def get_graph(self) -> Graph:
         workflow = StateGraph(AgentState)
@@ -1,11 +1,12 @@
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Union, Optional
 from .base import BaseAgent, AgentState
-from .identity_agent import IdentityAgentState
+from ..logging_utils import lazy
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
+from langchain_core.language_models import BaseChatModel
 from langgraph.graph import Graph, StateGraph
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
@@ -17,32 +18,50 @@ class HookResult(BaseModel):
 class HookGeneratorAgent(BaseAgent):
     """Agent responsible for generating engaging hooks for LinkedIn posts."""
     
-    def __init__(self):
-        super().__init__("hook_generator")
-        self.parser = JsonOutputParser(pydantic_object=HookResult)
+    def __init__(self, llm: Optional[BaseChatModel] = None, num_candidates: Optional[int] = None):
+        super().__init__("hook_generator", llm=llm)
+        # Number of hooks sampled concurrently per run; the best valid one is kept
+        self.num_candidates = max(1, num_candidates or int(os.getenv("HOOK_CANDIDATES", "1")))
         
-    def create_prompt(self, identity_spec: Any) -> ChatPromptTemplate:
-        """Create a simplified prompt with no JSON structure in the system message."""
-        # Escape the hook templates
-        escaped_templates = str(identity_spec.hook_templates).replace("{", "{{").replace("}", "}}")
+    async def _best_of_n(self, chain: Any, inputs: Dict[str, Any], validators: Optional[Dict[str, Any]]) -> HookResult:
+        """Sample `num_candidates` hooks in one concurrent batch and return the best.
         
-        # Convert complex objects to simple strings to avoid formatting issues
-        voice_str = str(identity_spec.voice).replace("{", "{{").replace("}", "}}")
-        pillars_str = str(identity_spec.pillars_ranked).replace("{", "{{").replace("}", "}}")
+        Candidates that pass the hook validator are ranked by tone score. If none
+        pass, the first candidate is returned so the regular retry path handles it.
+        """
+        outputs = await chain.abatch([inputs] * self.num_candidates, return_exceptions=True)
+        candidates = []
+        for output in outputs:
+            if isinstance(output, Exception):
+                logger.warning(f"Hook candidate failed: {str(output)}")
+                continue
+            candidates.append(output)
+        if not candidates:
+            raise ValueError(f"All {self.num_candidates} hook candidates failed")
+            
+        validators = validators or {}
+        if "hook" in validators:
+            valid = [c for c in candidates if validators["hook"](c.hook_text)[0]]
+        else:
+            valid = candidates
+        logger.info(f"{len(valid)} of {len(candidates)} hook candidates passed validation")
+        if not valid:
+            return candidates[0]
+            
+        if "tone" in validators:
+            return max(valid, key=lambda c: validators["tone"](c.hook_text))
+        return valid[0]
         
-        # Create a very simple system message with no JSON example
-        system_message = f"""You are a professional LinkedIn content creator for {identity_spec.creator}. 
-
-Your task is to create an engaging hook for a LinkedIn post that:
+    def create_prompt(self, identity_spec: Any, cached_context: bool = False) -> ChatPromptTemplate:
+        """Create a simplified prompt with no JSON structure in the system message."""
+        task = """Your task is to create an engaging hook for a LinkedIn post that:
 1. Aligns with the creator's brand identity
 2. Captures attention and encourages reading
 3. Matches appropriate tone and target audience
-4. Follows voice guidelines: {voice_str}
-5. Uses one of these templates: {escaped_templates}
+4. Follows the creator's voice guidelines
+5. Uses one of the creator's hook templates
 
-Consider these elements:
-- Creator's brand pillars: {pillars_str}
-- Creator's promise: {identity_spec.promise}
+Consider the creator's brand pillars and promise.
 
 Output a JSON with these fields:
 - hook_text: The engaging hook text as a string
@@ -50,100 +69,79 @@ Output a JSON with these fields:
 - target_audience: The target audience for the hook as a string"""
 
         # Create a completely separate human message template
-        human_message = "Generate a hook for a post about: {topic}"
-        
-        # Create template with simple parts
-        template = ChatPromptTemplate.from_messages([
-            ("system", system_message),
-            ("human", human_message)
-        ])
+        human_message = "Generate a hook for a post about: {topic}{feedback}"
         
-        logger.debug(f"Created prompt template with variables: {template.input_variables}")
+        template = self.identity_prompt(identity_spec, task, human_message, cached_context)
+        logger.debug("Created prompt template with variables: %s", template.input_variables)
         return template
     
-    async def run(self, state: IdentityAgentState) -> IdentityAgentState:
-        logger.debug(f"Hook Generator - Input State Type: {type(state)}")
-        logger.debug(f"Hook Generator - Input State Content: {state}")
-        
-        # Convert state dictionary to IdentityAgentState if needed
-        if isinstance(state, dict):
-            logger.info("Converting dictionary state to IdentityAgentState")
-            state = IdentityAgentState(**state)
-            logger.debug(f"Converted State Type: {type(state)}")
-            logger.debug(f"Converted State Content: {state}")
+    async def run(self, state: AgentState) -> Dict[str, Any]:
+        logger.debug("Hook Generator - Input State Content: %s", lazy(state))
             
         # Save initial checkpoint
-        self.save_checkpoint(state)
+        checkpoints = [self.save_checkpoint(state, "input")]
+        
+        topic = state.get("current_topic")
+        identity_spec = state.get("identity_spec")
+        # Reviewer feedback when the QA check sent this section back, else ""
+        feedback = self.refinement_feedback(state, "hook")
+        validators = state.get("validators") or {}
             
-        if not state.current_topic:
+        if not topic:
             logger.error("No topic found in state")
             raise ValueError("No topic selected for hook generation")
             
-        if not state.identity_spec:
+        if not identity_spec:
             logger.error("No identity spec found in state")
             raise ValueError("Identity specification required for hook generation")
             
-        # Create the prompt and chain
-        prompt = self.create_prompt(state.identity_spec)
-        logger.debug(f"Prompt variables: {prompt.input_variables}")
-        chain = prompt | self.llm | self.parser
+        # Reference the identity block in the context cache if there is one
+        llm, cached_context = await self.context_llm(state)
+        
+        # Create the prompt (built once per identity version and reused across runs) and chain
+        prompt = self.cached_prompt(state, lambda: self.create_prompt(identity_spec, cached_context), "context" if cached_context else "")
+        logger.debug("Prompt variables: %s", prompt.input_variables)
+        chain = self.structured_chain(prompt, HookResult, llm=llm)
+        
+        logger.debug("Invoking chain with topic: %s", topic)
         
-        # Get hook text with only the topic variable
-        logger.debug(f"Invoking chain with topic: {state.current_topic}")
-        logger.debug(f"Input to chain: {{'topic': '{state.current_topic}'}}")
+        async def generate(prompt_feedback: str, attempt: int) -> HookResult:
+            inputs = {"topic": topic, "feedback": prompt_feedback}
+            # Sample candidates on the first attempt; retries are targeted by the validator's feedback
+            if attempt == 1 and self.num_candidates > 1:
+                return await self._best_of_n(chain, inputs, validators)
+            return await chain.ainvoke(inputs)
         
         try:
-            result = await chain.ainvoke({"topic": state.current_topic})
-            logger.debug(f"Hook Generation Result: {result}")
-            
-            # Handle case where tone might be a list instead of a string
-            if isinstance(result, dict) and "tone" in result and isinstance(result["tone"], list):
-                logger.warning(f"Tone returned as a list: {result['tone']}. Converting to string.")
-                result["tone"] = ", ".join(result["tone"])
-            
-            # Convert result to HookResult if it's a dictionary
-            if isinstance(result, dict):
-                result = HookResult(**result)
+            # Regenerate with the validator's feedback until the hook matches a template
+            result = await self.retry_policy.run(
+                self.name,
+                generate,
+                lambda r: r.hook_text,
+                self.output_checks(validators, "hook", tone=False),
+                feedback
+            )
+            logger.debug("Hook Generation Result: %s", lazy(result))
             
         except Exception as e:
             logger.error(f"Error invoking hook generation chain: {str(e)}", exc_info=True)
             raise ValueError(f"Failed to generate hook: {str(e)}")
-            
-        # Validate hook against identity rules
-        if state.validators and "hook" in state.validators:
-            is_valid, error_msg = state.validators["hook"](result.hook_text)
-            if not is_valid:
-                logger.warning(f"Hook validation failed: {error_msg}")
-                # Retry with more specific guidance
-                prompt = self.create_prompt(state.identity_spec)
-                chain = prompt | self.llm | self.parser
-                result = await chain.ainvoke({
-                    "topic": state.current_topic,
-                    "error": f"Previous hook failed validation: {error_msg}. Please try again."
-                })
-                if isinstance(result, dict):
-                    # Handle case where tone might be a list instead of a string
-                    if "tone" in result and isinstance(result["tone"], list):
-                        logger.warning(f"Tone returned as a list: {result['tone']}. Converting to string.")
-                        result["tone"] = ", ".join(result["tone"])
-                    result = HookResult(**result)
         
-        # Update state
-        state.hook_text = result.hook_text
-        state.messages.append({
-            "role": "assistant",
-            "content": f"Generated hook: {result.hook_text}\nTone: {result.tone}\nTarget Audience: {result.target_audience}"
-        })
+        # Return only the fields this node changed
+        update = {
+            "hook_text": result.hook_text,
+            "messages": [self.message(state, f"Generated hook: {result.hook_text}\nTone: {result.tone}\nTarget Audience: {result.target_audience}")]
+        }
         
         # Save final checkpoint
-        self.save_checkpoint(state)
+        checkpoints.append(self.save_checkpoint(state, "output", update))
+        update["checkpoint_history"] = checkpoints
         
-        logger.debug(f"Hook Generator - Output State Type: {type(state)}")
-        logger.debug(f"Hook Generator - Output State Content: {state}")
-        return state
+        logger.debug("Hook Generator - Output Update: %s", lazy(update))
+        return update
     
     def get_graph(self) -> Graph:
-        workflow = StateGraph(IdentityAgentState)
+        workflow = StateGraph(AgentState)
         workflow.add_node("generate_hook", self.run)
         workflow.set_entry_point("generate_hook")
         workflow.add_edge("generate_hook", "end")
@@ -0,0 +1,66 @@
+from typing import NamedTuple, Optional, Sequence, Tuple
+from functools import lru_cache
+import re
+
+# A slot is any non-empty {...} placeholder in a hook template
+SLOT_RE = re.compile(r"\{([^}]+)\}")
+
+class SlotSpan(NamedTuple):
+    """Where a template slot landed in the matched hook."""
+    name: str
+    start: int
+    end: int
+    value: str
+
+class HookMatch(NamedTuple):
+    """The template a hook matched and the text filling each of its slots."""
+    template_index: int
+    template: str
+    slots: Tuple[SlotSpan, ...]
+
+class HookTemplateMatcher:
+    """Matches hooks against all templates with one precompiled regex.
+
+    Every template becomes a named alternative of a single pattern, with a
+    named group per slot, so a validation is one `fullmatch` call instead of
+    escaping, rewriting and matching each template in turn. Alternatives are
+    tried in template order, so the reported template is the same one the
+    one-by-one check would have accepted first.
+    """
+
+    def __init__(self, templates: Sequence[str]):
+        self.templates = tuple(templates)
+        self._slot_groups = []
+        alternatives = []
+        for i, template in enumerate(self.templates):
+            pieces, slots, pos = [], [], 0
+            for j, slot in enumerate(SLOT_RE.finditer(template)):
+                pieces.append(re.escape(template[pos:slot.start()]))
+                group = f"t{i}s{j}"
+                pieces.append(f"(?P<{group}>.+)")
+                slots.append((group, slot.group(1)))
+                pos = slot.end()
+            pieces.append(re.escape(template[pos:]))
+            alternatives.append(f"(?P<t{i}>{''.join(pieces)})")
+            self._slot_groups.append(tuple(slots))
+        self._pattern = re.compile("|".join(alternatives)) if alternatives else None
+
+    def match(self, hook: str) -> Optional[HookMatch]:
+        """Return the first template the whole hook matches, or None."""
+        if self._pattern is None:
+            return None
+        m = self._pattern.fullmatch(hook)
+        if m is None:
+            return None
+        # The template group encloses its slot groups, so it is always the last one closed
+        index = int(m.lastgroup[1:])
+        slots = tuple(
+            SlotSpan(name, m.start(group), m.end(group), m.group(group))
+            for group, name in self._slot_groups[index]
+        )
+        return HookMatch(index, self.templates[index], slots)
+
+@lru_cache(maxsize=32)
+def get_hook_matcher(templates: Tuple[str, ...]) -> HookTemplateMatcher:
+    """Return the compiled matcher for a set of templates, compiling it once per identity version."""
+    return HookTemplateMatcher(templates)
@@ -1,25 +1,65 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 from .base import BaseAgent, AgentState
+from ..metrics import current_run, record_qa_round
+from ..logging_utils import lazy
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
+from langchain_core.language_models import BaseChatModel
 from langgraph.graph import Graph, StateGraph
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# Sections a refinement can regenerate, and words that point an issue at each of them
+SECTION_KEYWORDS = {
+    "hook": ("hook", "opening", "first line", "headline"),
+    "body": ("body", "content", "paragraph", "story", "example"),
+    "cta": ("cta", "call-to-action", "call to action", "closing")
+}
+
 class QAResult(BaseModel):
     feedback: str = Field(description="The feedback on the post's quality and effectiveness")
     suggestions: List[str] = Field(description="List of suggestions for improvement")
     score: int = Field(description="Quality score from 1-10")
     issues: List[str] = Field(description="List of identified issues or concerns")
+    weakest_section: Optional[str] = Field(default=None, description="The section most in need of improvement: hook, body or cta")
+
+def weakest_section(result: QAResult) -> str:
+    """Return the section to regenerate: the reviewer's pick, else the one its issues mention most."""
+    if result.weakest_section and result.weakest_section.lower() in SECTION_KEYWORDS:
+        return result.weakest_section.lower()
+    text = " ".join(result.issues + result.suggestions).lower()
+    counts = {section: sum(text.count(word) for word in words) for section, words in SECTION_KEYWORDS.items()}
+    best = max(counts, key=counts.get)
+    return best if counts[best] else "body"
 
 class QAAgent(BaseAgent):
     """Agent responsible for quality assurance and feedback on LinkedIn posts."""
     
-    def __init__(self):
-        super().__init__("qa_agent")
-        self.parser = JsonOutputParser(pydantic_object=QAResult)
+    def __init__(
+        self,
+        llm: Optional[BaseChatModel] = None,
+        min_score: Optional[int] = None,
+        max_refinements: Optional[int] = None,
+        token_budget: Optional[int] = None
+    ):
+        super().__init__("qa_agent", llm=llm)
+        # Drafts scoring below min_score are sent back to their weakest section's generator,
+        # at most max_refinements times and only while the run has used fewer than token_budget tokens
+        self.min_score = min_score if min_score is not None else int(os.getenv("QA_MIN_SCORE", "7"))
+        self.max_refinements = max_refinements if max_refinements is not None else int(os.getenv("QA_MAX_REFINEMENTS", "2"))
+        self.token_budget = token_budget if token_budget is not None else int(os.getenv("QA_TOKEN_BUDGET", "40000"))
+        
+    def decide(self, score: int, refinements: int, tokens_used: Optional[int]) -> str:
+        """Return "accept", "refine", or why refining stopped ("max_refinements", "token_budget")."""
+        if score >= self.min_score:
+            return "accept"
+        if refinements >= self.max_refinements:
+            return "max_refinements"
+        if self.token_budget > 0 and tokens_used is not None and tokens_used >= self.token_budget:
+            return "token_budget"
+        return "refine"
         
     def create_prompt(self) -> ChatPromptTemplate:
         return ChatPromptTemplate.from_messages([
@@ -41,7 +81,8 @@ class QAAgent(BaseAgent):
                 "feedback": "Overall feedback on the post",
                 "suggestions": ["Suggestion 1", "Suggestion 2", ...],
                 "score": 7,
-                "issues": ["Issue 1", "Issue 2", ...]
+                "issues": ["Issue 1", "Issue 2", ...],
+                "weakest_section": "hook, body or cta, whichever most needs improvement"
             }}"""),
             ("human", """Review the following LinkedIn post:
             Topic: {topic}
@@ -50,69 +91,80 @@ class QAAgent(BaseAgent):
             CTA: {cta}""")
         ])
     
-    async def run(self, state: AgentState) -> AgentState:
-        logger.debug(f"QA Agent - Input State Type: {type(state)}")
-        logger.debug(f"QA Agent - Input State Content: {state}")
-        
-        # Convert state dictionary to AgentState if needed
-        if isinstance(state, dict):
-            logger.info("Converting dictionary state to AgentState")
-            state = AgentState(**state)
-            logger.debug(f"Converted State Type: {type(state)}")
-            logger.debug(f"Converted State Content: {state}")
+    async def run(self, state: AgentState) -> Dict[str, Any]:
+        logger.debug("QA Agent - Input State Content: %s", lazy(state))
             
         # Save initial checkpoint
-        self.save_checkpoint(state)
+        checkpoints = [self.save_checkpoint(state, "input")]
+        
+        topic = state.get("current_topic")
+        hook_text = state.get("hook_text")
+        body_text = state.get("body_text")
+        cta_text = state.get("cta_text")
             
-        if not state.current_topic:
+        if not topic:
             logger.error("No topic found in state")
             raise ValueError("No topic available for QA review")
             
-        if not state.hook_text:
+        if not hook_text:
             logger.error("No hook found in state")
             raise ValueError("No hook available for QA review")
             
-        if not state.body_text:
+        if not body_text:
             logger.error("No body content found in state")
             raise ValueError("No body content available for QA review")
             
-        if not state.cta_text:
+        if not cta_text:
             logger.error("No CTA found in state")
             raise ValueError("No CTA available for QA review")
             
         prompt = self.create_prompt()
-        chain = prompt | self.llm | self.parser
+        chain = self.structured_chain(prompt, QAResult)
         
         # Get QA feedback
         result = await chain.ainvoke({
-            "topic": state.current_topic,
-            "hook": state.hook_text,
-            "body": state.body_text,
-            "cta": state.cta_text
+            "topic": topic,
+            "hook": hook_text,
+            "body": body_text,
+            "cta": cta_text
         })
-        logger.debug(f"QA Review Result: {result}")
-        
-        # Convert result to QAResult if it's a dictionary
-        if isinstance(result, dict):
-            result = QAResult(**result)
+        logger.debug("QA Review Result: %s", lazy(result))
         
-        # Update state
-        state.qa_feedback = result.feedback
-        state.qa_suggestions = result.suggestions
-        state.qa_score = result.score
-        state.qa_issues = result.issues
+        # Decide whether to send the weakest section back for another pass
+        run = current_run()
+        refinements = state.get("refinement_iterations") or 0
+        section = weakest_section(result)
+        tokens_used = run.total_tokens() if run is not None else None
+        action = self.decide(result.score, refinements, tokens_used)
+        qa_round = {
+            "round": refinements,
+            "score": result.score,
+            "weakest_section": section,
+            "action": action,
+            "tokens_used": tokens_used,
+            "elapsed_s": round(run.elapsed(), 3) if run is not None else None
+        }
+        record_qa_round(qa_round)
+        logger.info(f"QA round {refinements}: score {result.score}/10, weakest section {section}, {action}")
         
-        state.messages.append({
-            "role": "assistant",
-            "content": f"QA Review:\nScore: {result.score}/10\nFeedback: {result.feedback}\nSuggestions: {', '.join(result.suggestions)}\nIssues: {', '.join(result.issues)}"
-        })
+        # Return only the fields this node changed
+        update = {
+            "refine_section": section if action == "refine" else None,
+            "refinement_iterations": refinements + 1 if action == "refine" else refinements,
+            "refinement_log": [qa_round],
+            "qa_feedback": result.feedback,
+            "qa_suggestions": result.suggestions,
+            "qa_score": result.score,
+            "qa_issues": result.issues,
+            "messages": [self.message(state, f"QA Review:\nScore: {result.score}/10\nFeedback: {result.feedback}\nSuggestions: {', '.join(result.suggestions)}\nIssues: {', '.join(result.issues)}")]
+        }
         
         # Save final checkpoint
-        self.save_checkpoint(state)
+        checkpoints.append(self.save_checkpoint(state, "output", update))
+        update["checkpoint_history"] = checkpoints
         
-        logger.debug(f"QA Agent - Output State Type: {type(state)}")
-        logger.debug(f"QA Agent - Output State Content: {state}")
-        return state
+        logger.debug("QA Agent - Output Update: %s", lazy(update))
+        return update
     
     def get_graph(self) -> Graph:
         workflow = StateGraph(AgentState)
@@ -1,12 +1,11 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 from .base import BaseAgent, AgentState
+from ..logging_utils import lazy
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
-from langchain.tools import Tool
+from langchain_core.language_models import BaseChatModel
 from langgraph.graph import Graph, StateGraph
-import requests
-from bs4 import BeautifulSoup
+from ..research_engine import get_research_engine
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,29 +18,18 @@ class ResearchResult(BaseModel):
     items: List[ResearchItem] = Field(description="List of research items found")
 
 class ResearchAgent(BaseAgent):
-    """Agent responsible for gathering research and supporting content."""
+    """Agent responsible for gathering research and supporting content.
     
-    def __init__(self):
-        tools = [
-            Tool(
-                name="web_search",
-                func=self._web_search,
-                description="Search the web for relevant information"
-            )
-        ]
-        super().__init__("research_agent", tools)
-        self.parser = JsonOutputParser(pydantic_object=ResearchResult)
-        
-    def _web_search(self, query: str) -> str:
-        """Perform a web search and extract relevant information."""
-        # This is a simplified version. In production, you'd want to use a proper search API
-        try:
-            response = requests.get(f"https://www.google.com/search?q={query}")
-            soup = BeautifulSoup(response.text, 'html.parser')
-            results = soup.find_all('div', class_='g')
-            return "\n".join([result.get_text() for result in results[:3]])
-        except Exception as e:
-            return f"Error performing web search: {str(e)}"
+    With a search provider configured (SEARCH_PROVIDER), research comes from
+    the web: the result pages are fetched and extracted by the research
+    engine. Without one, the LLM is asked for research instead.
+    """
+    
+    # Research for popular topics is served from the response cache
+    cache_responses = True
+    
+    def __init__(self, llm: Optional[BaseChatModel] = None):
+        super().__init__("research_agent", llm=llm)
     
     def create_prompt(self) -> ChatPromptTemplate:
         return ChatPromptTemplate.from_messages([
@@ -62,53 +50,45 @@ class ResearchAgent(BaseAgent):
             ("human", "Research information about: {topic}")
         ])
     
-    async def run(self, state: AgentState) -> AgentState:
-        logger.debug(f"Research Agent - Input State Type: {type(state)}")
-        logger.debug(f"Research Agent - Input State Content: {state}")
-        
-        # Convert state dictionary to AgentState if needed
-        if isinstance(state, dict):
-            logger.info("Converting dictionary state to AgentState")
-            state = AgentState(**state)
-            logger.debug(f"Converted State Type: {type(state)}")
-            logger.debug(f"Converted State Content: {state}")
+    async def run(self, state: AgentState) -> Dict[str, Any]:
+        logger.debug("Research Agent - Input State Content: %s", lazy(state))
             
         # Save initial checkpoint
-        self.save_checkpoint(state)
+        checkpoints = [self.save_checkpoint(state, "input")]
+        
+        topic = state.get("current_topic")
             
-        if not state.current_topic:
+        if not topic:
             logger.error("No topic found in state")
             raise ValueError("No topic selected for research")
             
-        prompt = self.create_prompt()
-        chain = prompt | self.llm | self.parser
-        
-        # Get research data
-        result = await chain.ainvoke({"topic": state.current_topic})
-        logger.debug(f"Research Result: {result}")
-        
-        # Convert result to ResearchResult if it's a dictionary
-        if isinstance(result, dict):
-            result = ResearchResult(**result)
-        
-        # Update state with all research items
-        for item in result.items:
-            state.research_data.append({
-                "source": item.source,
-                "snippet": item.snippet
-            })
+        engine = get_research_engine()
+        if engine is not None:
+            # Snippets extracted from the search results' pages
+            items = await engine.research(topic)
+            source = "web"
+            if not items:
+                logger.warning(f"Web research found nothing for topic: {topic}")
+        else:
+            prompt = self.create_prompt()
+            chain = self.structured_chain(prompt, ResearchResult)
+            result = await chain.ainvoke({"topic": topic})
+            items = [{"source": item.source, "snippet": item.snippet} for item in result.items]
+            source = "LLM"
+        logger.debug("Research Result: %s", lazy(items))
         
-        state.messages.append({
-            "role": "assistant",
-            "content": f"Research completed for topic: {state.current_topic}. Found {len(result.items)} items."
-        })
+        # Return only the fields this node changed, with all research items
+        update = {
+            "research_data": (state.get("research_data") or []) + items,
+            "messages": [self.message(state, f"Research completed for topic: {topic}. Found {len(items)} items ({source}).")]
+        }
         
         # Save final checkpoint
-        self.save_checkpoint(state)
+        checkpoints.append(self.save_checkpoint(state, "output", update))
+        update["checkpoint_history"] = checkpoints
         
-        logger.debug(f"Research Agent - Output State Type: {type(state)}")
-        logger.debug(f"Research Agent - Output State Content: {state}")
-        return state
+        logger.debug("Research Agent - Output Update: %s", lazy(update))
+        return update
     
     def get_graph(self) -> Graph:
         workflow = StateGraph(AgentState)
@@ -0,0 +1,160 @@
+from typing import Any, Dict, List, Optional
+from .base import BaseAgent, AgentState
+from ..logging_utils import lazy
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel, Field
+from langchain_core.language_models import BaseChatModel
+from langgraph.graph import Graph, StateGraph
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SectionsResult(BaseModel):
+    hook_text: str = Field(description="The generated hook text for the LinkedIn post")
+    body_text: str = Field(description="The generated body text for the LinkedIn post")
+    cta_text: str = Field(description="The generated call-to-action text")
+    tone: str = Field(description="The tone used in the post")
+
+class SectionRewrite(BaseModel):
+    text: str = Field(description="The rewritten section text")
+
+# Section name -> (state field, validator name, whether the tone score applies), as in the separate generators
+SECTIONS = {
+    "hook": ("hook_text", "hook", False),
+    "body": ("body_text", "body", True),
+    "cta": ("cta_text", "body", True)
+}
+
+class SectionGeneratorAgent(BaseAgent):
+    """Agent generating the hook, body and CTA of a post in one LLM call.
+    
+    Replaces the three separate generators when SECTION_MODE=fused: the
+    identity block is sent once instead of three times.
+    Each section then goes through the same checks as in the separate
+    generators, and only a section that fails is regenerated.
+    """
+    
+    def __init__(self, llm: Optional[BaseChatModel] = None):
+        super().__init__("section_generator", llm=llm)
+    
+    def create_prompt(self, identity_spec: Any, cached_context: bool = False) -> ChatPromptTemplate:
+        task = """Your task is to write all three sections of a LinkedIn post in one go:
+1. Hook: captures attention and uses one of the creator's hook templates
+2. Body: flows naturally from the hook, includes relevant research and insights, and may draw on the creator's signature stories
+3. CTA: a clear, actionable call-to-action following the creator's CTA style
+
+Every section must align with the creator's brand identity, follow the creator's voice, and reflect the creator's brand pillars and promise.
+
+Output a JSON with these fields:
+- hook_text: The hook as a string
+- body_text: The main content as a string
+- cta_text: The call-to-action as a string
+- tone: A SINGLE word or phrase describing the tone (e.g. "professional" or "conversational"), not a list"""
+        
+        human_message = "Write a post about: {topic}\nResearch Context:\n{research}"
+        
+        return self.identity_prompt(identity_spec, task, human_message, cached_context)
+    
+    def create_rewrite_prompt(self, identity_spec: Any, cached_context: bool = False) -> ChatPromptTemplate:
+        """Prompt regenerating one section of a draft; it shares the identity block with the combined prompt."""
+        task = """Your task is to rewrite one section of a LinkedIn post draft so that it fits the creator's identity and the rest of the post.
+
+Output a JSON with one field:
+- text: The rewritten section as a string"""
+        
+        human_message = "Draft post about: {topic}\nHook: {hook}\nBody: {body}\nCTA: {cta}\n\nRewrite only the {section}.{feedback}"
+        
+        return self.identity_prompt(identity_spec, task, human_message, cached_context)
+    
+    async def run(self, state: AgentState) -> Dict[str, Any]:
+        logger.debug("Section Generator - Input State Content: %s", lazy(state))
+        
+        # Save initial checkpoint
+        checkpoints = [self.save_checkpoint(state, "input")]
+        
+        topic = state.get("current_topic")
+        identity_spec = state.get("identity_spec")
+        validators = state.get("validators") or {}
+        research_data = state.get("research_data") or []
+        
+        if not topic:
+            logger.error("No topic found in state")
+            raise ValueError("No topic selected for section generation")
+        
+        if not identity_spec:
+            logger.error("No identity spec found in state")
+            raise ValueError("Identity specification required for section generation")
+        
+        research_context = "\n".join([
+            f"{item['source']}: {item['snippet']}"
+            for item in research_data
+        ]) if research_data else "No research data available"
+        
+        try:
+            # Reference the identity block in the context cache if there is one
+            llm, cached_context = await self.context_llm(state)
+            variant = "context" if cached_context else ""
+            
+            # One call for all three sections; both prompts are built once per identity version
+            prompt = self.cached_prompt(state, lambda: self.create_prompt(identity_spec, cached_context), variant)
+            chain = self.structured_chain(prompt, SectionsResult, llm=llm)
+            logger.debug("Invoking combined section chain with topic: %s", topic)
+            result = await chain.ainvoke({"topic": topic, "research": research_context})
+            logger.debug("Section Generation Result: %s", lazy(result))
+            draft = {"hook": result.hook_text, "body": result.body_text, "cta": result.cta_text}
+            
+            rewrite_prompt = self.cached_prompt(state, lambda: self.create_rewrite_prompt(identity_spec, cached_context), "rewrite_context" if cached_context else "rewrite")
+            rewrite_chain = self.structured_chain(rewrite_prompt, SectionRewrite, llm=llm)
+            
+            async def check_section(section: str) -> str:
+                _, validator, tone = SECTIONS[section]
+                
+                async def generate(prompt_feedback: str, attempt: int) -> str:
+                    # The first attempt is the combined call's draft; only a failing section costs another call
+                    if attempt == 1:
+                        return draft[section]
+                    rewrite = await rewrite_chain.ainvoke({
+                        "topic": topic,
+                        "hook": draft["hook"],
+                        "body": draft["body"],
+                        "cta": draft["cta"],
+                        "section": section,
+                        "feedback": prompt_feedback
+                    })
+                    return rewrite.text
+                
+                return await self.retry_policy.run(
+                    self.name,
+                    generate,
+                    lambda text: text,
+                    self.output_checks(validators, validator, tone=tone)
+                )
+            
+            # Sections are checked, and regenerated if needed, concurrently
+            texts: List[str] = await asyncio.gather(*(check_section(section) for section in SECTIONS))
+            regenerated = [section for section, text in zip(SECTIONS, texts) if text != draft[section]]
+            if regenerated:
+                logger.info(f"Regenerated sections after the combined call: {', '.join(regenerated)}")
+        
+        except Exception as e:
+            logger.error(f"Error in SectionGeneratorAgent: {str(e)}", exc_info=True)
+            raise
+        
+        # Return only the fields this node changed
+        update = {field: text for (field, _, _), text in zip(SECTIONS.values(), texts)}
+        update["messages"] = [self.message(state, f"Generated sections in one call:\nHook: {update['hook_text']}\nBody: {update['body_text']}\nCTA: {update['cta_text']}\nTone: {result.tone}")]
+        
+        # Save final checkpoint
+        checkpoints.append(self.save_checkpoint(state, "output", update))
+        update["checkpoint_history"] = checkpoints
+        
+        logger.debug("Section Generator - Output Update: %s", lazy(update))
+        return update
+    
+    def get_graph(self) -> Graph:
+        workflow = StateGraph(AgentState)
+        workflow.add_node("generate_sections", self.run)
+        workflow.set_entry_point("generate_sections")
+        workflow.add_edge("generate_sections", "end")
+        return workflow.compile()
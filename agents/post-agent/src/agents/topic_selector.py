@@ -1,12 +1,11 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 from .base import BaseAgent, AgentState
+from ..logging_utils import lazy
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
+from langchain_core.language_models import BaseChatModel
 from langgraph.graph import Graph, StateGraph
 import logging
-import re
-import json
 
 logger = logging.getLogger(__name__)
 
@@ -30,9 +29,11 @@ class TopicBrief(BaseModel):
 class TopicSelectorAgent(BaseAgent):
     """Agent responsible for selecting topics for LinkedIn posts."""
     
-    def __init__(self):
-        super().__init__("topic_selector")
-        self.parser = JsonOutputParser(pydantic_object=TopicBrief)
+    # Briefs for a given topic are reusable across runs
+    cache_responses = True
+    
+    def __init__(self, llm: Optional[BaseChatModel] = None):
+        super().__init__("topic_selector", llm=llm)
         
     def create_prompt(self, with_topic: bool = False) -> ChatPromptTemplate:
         if with_topic:
@@ -96,62 +97,45 @@ class TopicSelectorAgent(BaseAgent):
             ("human", human_message)
         ])
     
-    async def run(self, state: AgentState) -> AgentState:
-        logger.debug(f"Topic Selector - Input State Type: {type(state)}")
-        logger.debug(f"Topic Selector - Input State Content: {state}")
-        
-        # Convert state dictionary to AgentState if needed
-        if isinstance(state, dict):
-            logger.info("Converting dictionary state to AgentState")
-            state = AgentState(**state)
-            logger.debug(f"Converted State Type: {type(state)}")
-            logger.debug(f"Converted State Content: {state}")
+    async def run(self, state: AgentState) -> Dict[str, Any]:
+        logger.debug("Topic Selector - Input State Content: %s", lazy(state))
             
         # Save initial checkpoint
-        self.save_checkpoint(state)
+        checkpoints = [self.save_checkpoint(state, "input")]
             
         # Check if a topic is already provided
-        if state.current_topic:
-            logger.info(f"Using provided topic: {state.current_topic}")
+        topic = state.get("current_topic")
+        if topic:
+            logger.info(f"Using provided topic: {topic}")
             prompt = self.create_prompt(with_topic=True)
-            chain = prompt | self.llm | self.parser
+            chain = self.structured_chain(prompt, TopicBrief)
             
             # Create a brief for the provided topic
-            result = await chain.ainvoke({"topic": state.current_topic})
-            logger.debug(f"Topic Brief Result: {result}")
+            result = await chain.ainvoke({"topic": topic})
+            logger.debug("Topic Brief Result: %s", lazy(result))
         else:
             logger.info("No topic provided, selecting a new topic")
             prompt = self.create_prompt(with_topic=False)
-            chain = prompt | self.llm | self.parser
+            # The selection prompt never changes, so a cached answer would always pick the same topic
+            chain = self.structured_chain(prompt, TopicBrief, llm=self.uncached_llm)
             
             # Select a new topic and create a brief
             result = await chain.ainvoke({"input": "Select a topic for a LinkedIn post"})
-            logger.debug(f"Topic Selection Result: {result}")
-        
-        # Handle markdown code blocks in the output
-        if isinstance(result, str):
-            # Remove markdown code block markers
-            result = re.sub(r'```json\n?|\n?```', '', result)
-            # Parse the cleaned JSON
-            result = json.loads(result)
-        
-        # Convert result to TopicBrief if it's a dictionary
-        if isinstance(result, dict):
-            result = TopicBrief(**result)
+            logger.debug("Topic Selection Result: %s", lazy(result))
         
-        # Update state
-        state.current_topic = result.current_topic
-        state.messages.append({
-            "role": "assistant",
-            "content": f"Selected topic: {result.current_topic}\nBrief: {result.brief.model_dump_json()}"
-        })
+        # Return only the fields this node changed
+        update = {
+            "current_topic": result.current_topic,
+            "hashtags": result.brief.hashtags,
+            "messages": [self.message(state, f"Selected topic: {result.current_topic}\nBrief: {result.brief.model_dump_json()}")]
+        }
         
         # Save final checkpoint
-        self.save_checkpoint(state)
+        checkpoints.append(self.save_checkpoint(state, "output", update))
+        update["checkpoint_history"] = checkpoints
         
-        logger.debug(f"Topic Selector - Output State Type: {type(state)}")
-        logger.debug(f"Topic Selector - Output State Content: {state}")
-        return state
+        logger.debug("Topic Selector - Output Update: %s", lazy(update))
+        return update
     
     def get_graph(self) -> Graph:
         workflow = StateGraph(AgentState)
@@ -0,0 +1,348 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+from abc import ABC, abstractmethod
+import threading
+import hashlib
+import logging
+import queue
+import json
+import os
+
+logger = logging.getLogger(__name__)
+
+class CheckpointStore(ABC):
+    """Storage backend for per-run checkpoint records."""
+
+    # Whether records can be read back; spilled payloads are only moved to stores that keep them
+    persistent = True
+
+    @abstractmethod
+    def append(self, run_id: str, line: str) -> None:
+        """Append one serialized checkpoint record to a run."""
+
+    @abstractmethod
+    def read(self, run_id: str) -> List[Dict[str, Any]]:
+        """Return all checkpoint records of a run in write order."""
+
+    def next_step(self, run_id: str) -> int:
+        """Step number the run's next checkpoint should get: one past the last one stored."""
+        return max((record["step"] for record in self.read(run_id) if "step" in record), default=-1) + 1
+
+    def close(self) -> None:
+        """Release any resources held by the store."""
+
+class JsonlCheckpointStore(CheckpointStore):
+    """Append-only JSON Lines store, one file per run."""
+
+    def __init__(self, directory: str = "testresult"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, run_id: str) -> str:
+        return os.path.join(self.directory, f"history_{run_id}.jsonl")
+
+    def append(self, run_id: str, line: str) -> None:
+        with open(self.path_for(run_id), "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def read(self, run_id: str) -> List[Dict[str, Any]]:
+        path = self.path_for(run_id)
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A crash mid-write can only truncate the last line
+                    logger.warning(f"Skipping unreadable checkpoint line {line_no} in {path}")
+        return records
+
+class NullCheckpointStore(CheckpointStore):
+    """Store that discards checkpoints, for runs where history is not needed."""
+
+    persistent = False
+
+    def append(self, run_id: str, line: str) -> None:
+        pass
+
+    def read(self, run_id: str) -> List[Dict[str, Any]]:
+        return []
+
+_STOP = object()
+_MISSING = object()
+
+def diff_state(previous: Dict[str, Any], current: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, List[Any]], List[str]]:
+    """Return (changed fields, appended list tails, removed fields) between two snapshots."""
+    changed: Dict[str, Any] = {}
+    appended: Dict[str, List[Any]] = {}
+    for key, value in current.items():
+        old = previous.get(key, _MISSING)
+        if old is not _MISSING and old == value:
+            continue
+        # Lists such as messages and research_data mostly grow at the end
+        if isinstance(old, list) and isinstance(value, list) and len(value) > len(old) and value[:len(old)] == old:
+            appended[key] = value[len(old):]
+        else:
+            changed[key] = value
+    removed = [key for key in previous if key not in current]
+    return changed, appended, removed
+
+class DeltaEncoder:
+    """Encodes successive snapshots of one run as full or delta records.
+
+    The first record and every `snapshot_interval`-th record carry the full
+    state; the rest only carry the fields that changed since the previous
+    record, with growing lists stored as their new tail. `encode` has no side
+    effects: call `commit` once the record is stored, so the next delta is
+    taken against a record that was actually written. `start_step` continues
+    the numbering of a run that already has records.
+    """
+
+    def __init__(self, snapshot_interval: int = 8, start_step: int = 0):
+        self.snapshot_interval = max(1, snapshot_interval)
+        self.step = start_step
+        self._previous: Optional[Dict[str, Any]] = None
+
+    def encode(self, checkpoint: Dict[str, Any]) -> Dict[str, Any]:
+        state = checkpoint["state"]
+        record = {key: value for key, value in checkpoint.items() if key != "state"}
+        record["step"] = self.step
+        if self._previous is None or self.step % self.snapshot_interval == 0:
+            record["kind"] = "full"
+            record["state"] = state
+        else:
+            changed, appended, removed = diff_state(self._previous, state)
+            record["kind"] = "delta"
+            if changed:
+                record["set"] = changed
+            if appended:
+                record["append"] = appended
+            if removed:
+                record["unset"] = removed
+        return record
+
+    def commit(self, checkpoint: Dict[str, Any]) -> None:
+        """Make the just-stored checkpoint the base of the next delta."""
+        self._previous = checkpoint["state"]
+        self.step += 1
+
+    def reset(self) -> None:
+        """Start the chain over: the next record is a full snapshot (e.g. after a failed write)."""
+        self._previous = None
+
+def iter_states(records: List[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Yield (record, materialized state) for each record in order.
+
+    Each yielded state is a separate dict; containers are replaced rather
+    than mutated, so earlier states stay valid.
+    """
+    state: Optional[Dict[str, Any]] = None
+    for record in records:
+        if record.get("kind") == "payload":
+            continue
+        if record.get("kind", "full") == "full":
+            state = dict(record["state"])
+        elif state is None:
+            raise ValueError(f"Checkpoint step {record.get('step')} has no preceding full snapshot")
+        else:
+            state = dict(state)
+            state.update(record.get("set", {}))
+            for key, tail in record.get("append", {}).items():
+                state[key] = list(state.get(key) or []) + tail
+            for key in record.get("unset", []):
+                state.pop(key, None)
+        yield record, state
+
+def materialize(records: List[Dict[str, Any]], step: Optional[int] = None) -> Dict[str, Any]:
+    """Rebuild the state at `step` (or the last step) from a run's records."""
+    result: Optional[Dict[str, Any]] = None
+    for record, state in iter_states(records):
+        if step is not None and record["step"] > step:
+            break
+        result = state
+    if result is None:
+        raise ValueError(f"No checkpoint found at or before step {step}")
+    return result
+
+class CheckpointWriter:
+    """Encodes and writes checkpoints to a store from a background thread.
+
+    Callers must hand over a snapshot they will not mutate afterwards (a
+    dict with its lists and dicts copied, as `BaseAgent.save_checkpoint`
+    builds). Delta encoding, serialization and disk I/O all happen on the
+    writer thread. If the queue is full the record is dropped rather than
+    blocking the agent. If a write fails, the run's next record is a full
+    snapshot, so no delta is stored against a record that is missing.
+    """
+
+    def __init__(self, store: CheckpointStore, max_queue_size: int = 10000, snapshot_interval: int = 8, max_open_runs: int = 1024):
+        self.store = store
+        self.snapshot_interval = snapshot_interval
+        self.max_open_runs = max_open_runs
+        self.dropped = 0
+        self.written = 0
+        self.bytes_written = 0
+        self._encoders: "OrderedDict[str, DeltaEncoder]" = OrderedDict()
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue_size)
+        self._thread = threading.Thread(target=self._worker, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, run_id: str, checkpoint: Dict[str, Any]) -> bool:
+        """Queue a checkpoint (with its snapshot under "state") without waiting for the disk; False if it was dropped."""
+        try:
+            self._queue.put_nowait((run_id, checkpoint))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Checkpoint queue full, dropped checkpoint for run {run_id}")
+            return False
+
+    def spill(self, run_id: str, content: str) -> Optional[str]:
+        """Queue a large payload for the run's store and return the reference it is filed under.
+
+        Returns None, and the caller keeps the content, if the store does not
+        persist records or the payload could not be queued.
+        """
+        if not self.store.persistent:
+            return None
+        ref = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+        if not self.submit(run_id, {"kind": "payload", "ref": ref, "content": content}):
+            return None
+        return ref
+
+    def end_run(self, run_id: str) -> None:
+        """Forget the delta-encoding state of a finished run, without waiting on a full queue."""
+        try:
+            self._queue.put_nowait((run_id, None))
+        except queue.Full:
+            # The run's encoder is evicted later, once max_open_runs is exceeded
+            self.dropped += 1
+            logger.warning(f"Checkpoint queue full, dropped end of run {run_id}")
+
+    def _encoder_for(self, run_id: str) -> DeltaEncoder:
+        encoder = self._encoders.get(run_id)
+        if encoder is None:
+            # A run evicted below, or from an earlier process, continues its step numbers
+            encoder = DeltaEncoder(self.snapshot_interval, start_step=self.store.next_step(run_id))
+            self._encoders[run_id] = encoder
+            # Runs that never called end_run must not pin memory forever
+            while len(self._encoders) > self.max_open_runs:
+                self._encoders.popitem(last=False)
+        else:
+            self._encoders.move_to_end(run_id)
+        return encoder
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                run_id, checkpoint = item
+                if checkpoint is None:
+                    self._encoders.pop(run_id, None)
+                    continue
+                # Spilled payloads are stored as they are, outside the delta chain
+                encoder = None
+                if checkpoint.get("kind") == "payload":
+                    record = checkpoint
+                else:
+                    encoder = self._encoder_for(run_id)
+                    record = encoder.encode(checkpoint)
+                try:
+                    line = json.dumps(record, default=str, separators=(",", ":"))
+                    self.store.append(run_id, line)
+                except Exception:
+                    if encoder is not None:
+                        encoder.reset()
+                    raise
+                if encoder is not None:
+                    encoder.commit(checkpoint)
+                self.written += 1
+                self.bytes_written += len(line) + 1
+            except Exception as e:
+                logger.error(f"Failed to write checkpoint: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Block until every queued checkpoint has been written."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Flush pending checkpoints and stop the writer thread."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self.store.close()
+        logger.info(f"Checkpoint writer stopped ({self.written} written, {self.dropped} dropped, {self.bytes_written} bytes)")
+
+_writer: Optional[CheckpointWriter] = None
+_writer_lock = threading.Lock()
+
+def create_checkpoint_store() -> CheckpointStore:
+    """Build the store selected by CHECKPOINT_BACKEND (jsonl or none)."""
+    backend = os.getenv("CHECKPOINT_BACKEND", "jsonl").lower()
+    if backend == "none":
+        return NullCheckpointStore()
+    if backend == "jsonl":
+        return JsonlCheckpointStore(os.getenv("CHECKPOINT_DIR", "testresult"))
+    raise ValueError(f"Unknown CHECKPOINT_BACKEND: {backend}")
+
+def get_checkpoint_writer() -> CheckpointWriter:
+    """Return the process-wide checkpoint writer, starting it on first use."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = CheckpointWriter(
+                create_checkpoint_store(),
+                snapshot_interval=int(os.getenv("CHECKPOINT_SNAPSHOT_INTERVAL", "8"))
+            )
+        return _writer
+
+def set_checkpoint_store(store: CheckpointStore) -> CheckpointWriter:
+    """Replace the checkpoint backend, flushing and stopping the previous writer."""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+        _writer = CheckpointWriter(store, snapshot_interval=int(os.getenv("CHECKPOINT_SNAPSHOT_INTERVAL", "8")))
+        return _writer
+
+def close_checkpoint_writer() -> None:
+    """Flush and stop the process-wide writer if it was started."""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+
+def load_run_history(run_id: str, store: Optional[CheckpointStore] = None) -> List[Dict[str, Any]]:
+    """Rebuild a run's checkpoint history, with the full state materialized at every step."""
+    if store is None:
+        writer = get_checkpoint_writer()
+        writer.flush()
+        store = writer.store
+    history = []
+    for record, state in iter_states(store.read(run_id)):
+        entry = {key: value for key, value in record.items() if key not in ("kind", "state", "set", "append", "unset")}
+        entry["state"] = state
+        history.append(entry)
+    return history
+
+def load_payload(run_id: str, ref: str, store: Optional[CheckpointStore] = None) -> Optional[str]:
+    """Return the content spilled under `ref` for a run, or None if it was not stored."""
+    if store is None:
+        writer = get_checkpoint_writer()
+        writer.flush()
+        store = writer.store
+    for record in store.read(run_id):
+        if record.get("kind") == "payload" and record.get("ref") == ref:
+            return record["content"]
+    return None
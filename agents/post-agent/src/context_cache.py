@@ -0,0 +1,246 @@
+from typing import Any, Callable, Dict, Optional, Tuple
+from langchain_core.language_models import BaseChatModel
+from .identity_cache import identity_cache
+import threading
+import asyncio
+import hashlib
+import datetime
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+class LocalContextCacheBackend:
+    """In-memory stand-in for a provider's context cache, for benchmarks and offline runs.
+
+    Handles are `local/<hash>`; the model is used as is, so the prompt just
+    leaves the cached block out. Only models that declare
+    `local_context_cache = True` (the benchmarks' fake model) are supported:
+    a real model would otherwise never see the identity.
+    """
+
+    def __init__(self):
+        self.contents: Dict[str, str] = {}
+
+    def create(self, model: str, system_instruction: str, ttl_seconds: float, display_name: str) -> str:
+        handle = "local/" + hashlib.sha256(f"{model}\x00{system_instruction}".encode("utf-8")).hexdigest()[:16]
+        self.contents[handle] = system_instruction
+        return handle
+
+    def delete(self, handle: str) -> None:
+        self.contents.pop(handle, None)
+
+    def supports(self, llm: BaseChatModel) -> bool:
+        return getattr(llm, "local_context_cache", False) is True
+
+    def bind(self, llm: BaseChatModel, handle: str) -> BaseChatModel:
+        return llm
+
+class GeminiContextCacheBackend:
+    """Gemini context caching: the block is uploaded as a CachedContent's system instruction.
+
+    Calls reference it through the model's `cached_content` field and are
+    billed for the cached tokens at the reduced rate. Gemini rejects caches
+    below a model-specific minimum size (see CONTEXT_CACHE_MIN_CHARS).
+    """
+
+    def __init__(self, api_key: Optional[str] = None):
+        # Only needed when Gemini context caching is enabled
+        import google.generativeai as genai
+        from google.generativeai import caching
+        genai.configure(api_key=api_key or os.getenv("GOOGLE_API_KEY"))
+        self._caching = caching
+
+    def create(self, model: str, system_instruction: str, ttl_seconds: float, display_name: str) -> str:
+        cached = self._caching.CachedContent.create(
+            model=model if model.startswith("models/") else f"models/{model}",
+            display_name=display_name,
+            system_instruction=system_instruction,
+            ttl=datetime.timedelta(seconds=ttl_seconds)
+        )
+        return cached.name
+
+    def delete(self, handle: str) -> None:
+        self._caching.CachedContent.get(handle).delete()
+
+    def supports(self, llm: BaseChatModel) -> bool:
+        return "cached_content" in getattr(type(llm), "model_fields", {})
+
+    def bind(self, llm: BaseChatModel, handle: str) -> BaseChatModel:
+        # The copy shares the underlying client, as the response-cache copy does
+        return llm.model_copy(update={"cached_content": handle})
+
+def _model_name(llm: BaseChatModel) -> str:
+    return getattr(llm, "model", None) or getattr(llm, "model_name", None) or type(llm).__name__
+
+class ContextCache:
+    """Provider-side cache handles for the identity block, one per (model, identity id, identity version).
+
+    The first call for an identity version uploads the block; later calls,
+    from any generator, reference the handle instead of resending the text.
+    Handles are renewed shortly before their TTL runs out (a tenth of the
+    TTL early, at most a minute), the replaced handle is deleted once the new
+    one is uploaded, and handles are deleted when the identity cache
+    invalidates their identity. Blocks shorter than `min_chars` are never
+    uploaded, and a failed upload is not retried for that version until
+    `retry_after` seconds have passed. Lookups are counted per agent as hits,
+    misses (uploads), skipped or failed.
+    """
+
+    def __init__(self, backend: Any, ttl_seconds: float = 3600.0, min_chars: int = 0, retry_after: float = 300.0):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.min_chars = min_chars
+        self.retry_after = retry_after
+        # key -> (handle or None after a failed upload, expires_at)
+        self._entries: Dict[Tuple[str, Any, str], Tuple[Optional[str], float]] = {}
+        self._lock = threading.Lock()
+        self._create_lock: Optional[asyncio.Lock] = None
+        self._counters: Dict[str, Dict[str, int]] = {}
+        # Versions already reported as too small to cache, so the warning is logged once
+        self._too_small: set = set()
+
+    def _count(self, agent_name: str, outcome: str) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(agent_name, {"hits": 0, "misses": 0, "skipped": 0, "failed": 0})
+            counters[outcome] += 1
+
+    def _fresh(self, key: Tuple[str, Any, str]) -> Optional[Tuple[Optional[str], float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+        # Renew early so a handle never expires between lookup and call; short TTLs renew proportionally sooner
+        margin = min(60.0, self.ttl_seconds / 10)
+        if entry is None or entry[1] - margin < time.time():
+            return None
+        return entry
+
+    async def handle_for(self, agent_name: str, llm: BaseChatModel, identity_id: Any, version: Optional[str], build_block: Callable[[], str]) -> Optional[str]:
+        """Return the cache handle of the identity block for `llm`, uploading it on first use.
+
+        Returns None when the block should be sent inline instead: no identity
+        version, a model the backend can't bind, a block below `min_chars`, or
+        an upload that failed.
+        """
+        if version is None or not self.backend.supports(llm):
+            self._count(agent_name, "skipped")
+            return None
+        model = _model_name(llm)
+        key = (model, identity_id, version)
+        entry = self._fresh(key)
+        if entry is None:
+            if self._create_lock is None:
+                self._create_lock = asyncio.Lock()
+            async with self._create_lock:
+                # Another generator may have uploaded it while we waited
+                entry = self._fresh(key)
+                if entry is None:
+                    entry = await self._create(agent_name, key, build_block())
+                    if entry is None:
+                        self._count(agent_name, "skipped")
+                        return None
+                    self._count(agent_name, "misses" if entry[0] else "failed")
+                    return entry[0]
+        handle = entry[0]
+        self._count(agent_name, "hits" if handle else "failed")
+        return handle
+
+    async def _create(self, agent_name: str, key: Tuple[str, Any, str], block: str) -> Optional[Tuple[Optional[str], float]]:
+        model, identity_id, version = key
+        if len(block) < self.min_chars:
+            if version not in self._too_small:
+                self._too_small.add(version)
+                logger.warning(f"Identity block {version} ({len(block)} chars) is below CONTEXT_CACHE_MIN_CHARS ({self.min_chars}); sending it inline")
+            return None
+        try:
+            handle = await asyncio.to_thread(self.backend.create, model, block, self.ttl_seconds, f"identity-{version}")
+            entry = (handle, time.time() + self.ttl_seconds)
+            logger.info(f"Uploaded identity block {version} to the context cache for {model}: {handle}")
+        except Exception as e:
+            entry = (None, time.time() + self.retry_after)
+            logger.warning(f"Context cache upload for identity {version} failed, sending it inline: {str(e)}")
+        with self._lock:
+            previous = self._entries.get(key)
+            self._entries[key] = entry
+        # A renewal replaces the handle; the old cache would otherwise stay billed until it expires
+        if entry[0] and previous is not None and previous[0] and previous[0] != entry[0]:
+            await asyncio.to_thread(self._delete, previous[0])
+        return entry
+
+    def _delete(self, handle: str) -> None:
+        try:
+            self.backend.delete(handle)
+        except Exception as e:
+            # It expires on its own after the TTL
+            logger.warning(f"Failed to delete context cache {handle}: {str(e)}")
+
+    def bind(self, llm: BaseChatModel, handle: str) -> BaseChatModel:
+        """Return `llm` set to reference the cached block."""
+        return self.backend.bind(llm, handle)
+
+    def invalidate(self, identity_id: Any = None) -> None:
+        """Forget, and delete from the provider, the handles of one identity or all of them."""
+        with self._lock:
+            keys = [key for key in self._entries if identity_id is None or key[1] == identity_id]
+            handles = [self._entries.pop(key)[0] for key in keys]
+        for handle in handles:
+            if handle is not None:
+                self._delete(handle)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            per_agent = {name: dict(counters) for name, counters in self._counters.items()}
+            size = sum(1 for handle, _ in self._entries.values() if handle)
+        totals = {"hits": 0, "misses": 0, "skipped": 0, "failed": 0}
+        for counters in per_agent.values():
+            for outcome, count in counters.items():
+                totals[outcome] += count
+        lookups = totals["hits"] + totals["misses"]
+        hit_rate = totals["hits"] / lookups if lookups else 0.0
+        return {"handles": size, "agents": per_agent, "totals": totals, "hit_rate": round(hit_rate, 4)}
+
+_context_cache: Optional[ContextCache] = None
+_context_cache_configured = False
+_context_cache_lock = threading.Lock()
+
+def get_context_cache() -> Optional[ContextCache]:
+    """Return the process-wide context cache, or None if CONTEXT_CACHE is off (the default).
+
+    CONTEXT_CACHE=gemini uses Gemini context caching, CONTEXT_CACHE=local the
+    in-memory stand-in. CONTEXT_CACHE_MIN_CHARS defaults to 4096, about the
+    1,024 tokens Gemini requires of a cached block; a typical identity block
+    is a few hundred characters and is sent inline, so the cache only pays off
+    for large identities (a warning is logged once per version it skips).
+    """
+    global _context_cache, _context_cache_configured
+    with _context_cache_lock:
+        if not _context_cache_configured:
+            mode = os.getenv("CONTEXT_CACHE", "off").lower()
+            backend = None
+            if mode == "gemini":
+                backend = GeminiContextCacheBackend()
+            elif mode == "local":
+                backend = LocalContextCacheBackend()
+            elif mode != "off":
+                logger.warning(f"Unknown CONTEXT_CACHE mode {mode}; context caching is off")
+            if backend is not None:
+                _context_cache = ContextCache(
+                    backend,
+                    ttl_seconds=float(os.getenv("CONTEXT_CACHE_TTL", "3600")),
+                    min_chars=int(os.getenv("CONTEXT_CACHE_MIN_CHARS", "4096"))
+                )
+                identity_cache.add_listener(_context_cache.invalidate)
+            _context_cache_configured = True
+        return _context_cache
+
+def set_context_cache(cache: Optional[ContextCache]) -> None:
+    """Replace the process-wide context cache; None turns context caching off."""
+    global _context_cache, _context_cache_configured
+    with _context_cache_lock:
+        if _context_cache is not None and cache is not _context_cache:
+            identity_cache.remove_listener(_context_cache.invalidate)
+            _context_cache.invalidate()
+        if cache is not None and cache is not _context_cache:
+            identity_cache.add_listener(cache.invalidate)
+        _context_cache = cache
+        _context_cache_configured = True
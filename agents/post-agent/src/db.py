@@ -0,0 +1,281 @@
+from typing import Any, Callable, Dict, Optional, Sequence, TypeVar
+from contextlib import contextmanager
+from collections import deque
+import threading
+import asyncio
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class PoolTimeout(RuntimeError):
+    """Raised when no connection becomes available within the acquire timeout."""
+
+class PoolMetrics:
+    """Counters describing how the pool is being used."""
+
+    def __init__(self):
+        self.acquisitions = 0
+        self.timeouts = 0
+        self.connections_created = 0
+        self.connections_discarded = 0
+        self.health_check_failures = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        self.acquisitions += 1
+        self.total_wait_seconds += seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "acquisitions": self.acquisitions,
+            "timeouts": self.timeouts,
+            "connections_created": self.connections_created,
+            "connections_discarded": self.connections_discarded,
+            "health_check_failures": self.health_check_failures,
+            "avg_wait_ms": round(self.total_wait_seconds * 1000 / self.acquisitions, 3) if self.acquisitions else 0.0,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 3)
+        }
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections with an asyncio front end.
+
+    Blocking work (connecting, waiting for a free connection, running the
+    query) is offloaded to a worker thread so the event loop never stalls.
+    Connections idle for longer than `health_check_interval` are pinged
+    before reuse and replaced if the ping fails.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 10,
+        acquire_timeout: float = 5.0,
+        health_check_interval: float = 30.0
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.metrics = PoolMetrics()
+        self._idle: deque = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _new_connection(self) -> Any:
+        conn = self._connect()
+        self.metrics.connections_created += 1
+        return conn
+
+    def open(self) -> None:
+        """Eagerly create `min_size` connections."""
+        with self._cond:
+            missing = self.min_size - self._size
+            self._size += max(0, missing)
+        for _ in range(max(0, missing)):
+            try:
+                conn = self._new_connection()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            self._release(conn)
+        logger.info(f"Connection pool opened with {self._size} connections (max {self.max_size})")
+
+    def _is_healthy(self, conn: Any) -> bool:
+        if getattr(conn, "closed", False):
+            return False
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            finally:
+                cur.close()
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection failed health check: {str(e)}")
+            return False
+
+    def _discard(self, conn: Any) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self.metrics.connections_discarded += 1
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _acquire(self, timeout: Optional[float] = None) -> Any:
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            conn, last_used = None, None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Connection pool is closed")
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.metrics.timeouts += 1
+                        raise PoolTimeout(f"No database connection available within {timeout}s")
+                    self._cond.wait(remaining)
+            if conn is None:
+                try:
+                    conn = self._new_connection()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif time.monotonic() - last_used > self.health_check_interval and not self._is_healthy(conn):
+                self.metrics.health_check_failures += 1
+                self._discard(conn)
+                continue
+            self.metrics.record_wait(time.monotonic() - started)
+            return conn
+
+    def _release(self, conn: Any) -> None:
+        with self._cond:
+            if not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+            self._size -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Borrow a connection on the current thread; it is rolled back and returned afterwards."""
+        conn = self._acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self._discard_or_release(conn)
+
+    def _discard_or_release(self, conn: Any) -> None:
+        # End any open transaction; a connection that cannot roll back is broken
+        try:
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        self._release(conn)
+
+    def _run_sync(self, fn: Callable[[Any], T]) -> T:
+        with self.connection() as conn:
+            return fn(conn)
+
+    async def run(self, fn: Callable[[Any], T]) -> T:
+        """Run `fn(conn)` with a pooled connection on a worker thread."""
+        return await asyncio.to_thread(self._run_sync, fn)
+
+    async def fetchone(self, sql: str, params: Optional[Sequence[Any]] = None) -> Optional[tuple]:
+        """Execute a query and return its first row."""
+        def _query(conn: Any) -> Optional[tuple]:
+            cur = conn.cursor()
+            try:
+                cur.execute(sql, params)
+                return cur.fetchone()
+            finally:
+                cur.close()
+        return await self.run(_query)
+
+    async def check_health(self) -> bool:
+        """Ping the database through the pool."""
+        try:
+            return await self.run(self._is_healthy)
+        except Exception as e:
+            logger.warning(f"Database health check failed: {str(e)}")
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool size, usage and wait-time metrics."""
+        with self._cond:
+            idle = len(self._idle)
+            size = self._size
+        return {
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            **self.metrics.snapshot()
+        }
+
+    def close(self) -> None:
+        """Close idle connections; borrowed ones are closed when returned."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        logger.info("Connection pool closed")
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def connect_from_env() -> Any:
+    """Open a new psycopg2 connection to DATABASE_URL."""
+    import psycopg2
+
+    dsn = os.getenv("DATABASE_URL")
+    if not dsn:
+        logger.error("DATABASE_URL environment variable not set")
+        raise RuntimeError("DATABASE_URL env var not set")
+    return psycopg2.connect(dsn, connect_timeout=int(os.getenv("DB_CONNECT_TIMEOUT", "5")))
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide pool, configured from DB_POOL_* environment variables."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                connect_from_env,
+                min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+                max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+                acquire_timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+                health_check_interval=float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+            )
+        return _pool
+
+def set_pool(pool: Optional[ConnectionPool]) -> None:
+    """Replace the process-wide pool (e.g. with one backed by a stub driver), closing the old one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool is not pool:
+            _pool.close()
+        _pool = pool
+
+def close_pool() -> None:
+    """Close the process-wide pool if it was created."""
+    set_pool(None)
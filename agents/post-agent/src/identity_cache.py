@@ -0,0 +1,230 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import threading
+import asyncio
+import logging
+import hashlib
+import select
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# Channel the identity_spec trigger notifies on; the payload is the changed row id
+NOTIFY_CHANNEL = "identity_spec_changed"
+
+NOTIFY_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION notify_identity_spec_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{NOTIFY_CHANNEL}', COALESCE(NEW.id, OLD.id)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS identity_spec_changed ON identity_spec;
+CREATE TRIGGER identity_spec_changed
+    AFTER INSERT OR UPDATE OR DELETE ON identity_spec
+    FOR EACH ROW EXECUTE FUNCTION notify_identity_spec_changed();
+"""
+
+def identity_version(identity_id: Any, identity_spec: Any) -> str:
+    """Version tag of an identity: its row id plus a hash of the spec, so in-place edits get a new tag too."""
+    digest = hashlib.sha256(identity_spec.model_dump_json().encode("utf-8")).hexdigest()[:12]
+    return f"{identity_id}:{digest}"
+
+class IdentitySpecCache:
+    """In-process TTL cache of validated identity specs, keyed by identity id.
+
+    The cache remembers which id is currently active so the hot path is a
+    dict lookup. Concurrent misses share a single load. Entries are dropped
+    when their TTL expires or when `invalidate` is called (e.g. by the
+    LISTEN/NOTIFY listener), and registered listeners are told about it.
+    Each entry keeps its `identity_version`, computed once when it is stored.
+    A load that overlaps an invalidation is returned to its caller but not
+    cached, since it may have read the row before the change.
+    """
+
+    def __init__(self, ttl_seconds: float = 300.0):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # identity_id -> (spec, expires_at, identity version)
+        self._entries: Dict[Any, Tuple[Any, float, Optional[str]]] = {}
+        self._active_id: Any = None
+        # Bumped by every invalidation, so an in-flight load can tell it raced one
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._load_lock: Optional[asyncio.Lock] = None
+        self._listeners: List[Callable[[Any], None]] = []
+
+    def get_active(self) -> Optional[Tuple[Any, Any]]:
+        """Return (identity_id, spec) for the active identity if cached and fresh."""
+        with self._lock:
+            entry = self._entries.get(self._active_id)
+            if entry is None or entry[1] < time.monotonic():
+                return None
+            return self._active_id, entry[0]
+
+    def get(self, identity_id: Any) -> Optional[Any]:
+        """Return the cached spec for an identity id if fresh."""
+        with self._lock:
+            entry = self._entries.get(identity_id)
+            if entry is None or entry[1] < time.monotonic():
+                return None
+            return entry[0]
+
+    def version(self, identity_id: Any) -> Optional[str]:
+        """Return the `identity_version` stored with a cached identity, or None if it is not cached or expired."""
+        with self._lock:
+            entry = self._entries.get(identity_id)
+            if entry is None or entry[1] < time.monotonic():
+                return None
+            return entry[2]
+
+    def put(self, identity_id: Any, spec: Any, active: bool = True, generation: Optional[int] = None) -> bool:
+        """Cache a validated spec, optionally marking it as the active identity.
+
+        Pass the `generation` read before loading the spec; if the cache has
+        been invalidated since, the spec may be stale and is not stored.
+        Returns whether it was stored.
+        """
+        # Hashed here, once per load, rather than on every run
+        version = identity_version(identity_id, spec) if hasattr(spec, "model_dump_json") else None
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            self._entries[identity_id] = (spec, time.monotonic() + self.ttl_seconds, version)
+            if active:
+                self._active_id = identity_id
+            return True
+
+    @property
+    def generation(self) -> int:
+        """Number of invalidations so far."""
+        with self._lock:
+            return self._generation
+
+    async def get_or_load_active(self, loader: Callable[[], Awaitable[Tuple[Any, Any]]]) -> Tuple[Any, Any]:
+        """Return the active (identity_id, spec), calling `loader` only on a miss."""
+        cached = self.get_active()
+        if cached is not None:
+            self.hits += 1
+            return cached
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            # Another request may have loaded it while we waited
+            cached = self.get_active()
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+            generation = self.generation
+            identity_id, spec = await loader()
+            if not self.put(identity_id, spec, active=True, generation=generation):
+                logger.info(f"Identity {identity_id} changed while it was loading; not caching it")
+            return identity_id, spec
+
+    def invalidate(self, identity_id: Any = None) -> None:
+        """Drop one identity (or everything when no id is given) and notify listeners."""
+        with self._lock:
+            self._generation += 1
+            if identity_id is None:
+                self._entries.clear()
+                self._active_id = None
+            else:
+                self._entries.pop(identity_id, None)
+                # A changed row may mean a different row is active now
+                self._active_id = None
+        logger.info(f"Invalidated identity cache ({'all' if identity_id is None else identity_id})")
+        for listener in list(self._listeners):
+            try:
+                listener(identity_id)
+            except Exception as e:
+                logger.warning(f"Identity cache listener failed: {str(e)}")
+
+    def add_listener(self, listener: Callable[[Any], None]) -> None:
+        """Register a callback invoked with the identity id on every invalidation."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Any], None]) -> None:
+        """Unregister a callback added with add_listener; unknown callbacks are ignored."""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        return {"entries": size, "hits": self.hits, "misses": self.misses, "ttl_seconds": self.ttl_seconds}
+
+def install_notify_trigger(connect: Callable[[], Any]) -> None:
+    """Create (or replace) the identity_spec trigger in NOTIFY_TRIGGER_SQL; needs DDL rights on the table."""
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        try:
+            cur.execute(NOTIFY_TRIGGER_SQL)
+        finally:
+            cur.close()
+        conn.commit()
+        logger.info(f"Installed identity_spec trigger notifying on channel: {NOTIFY_CHANNEL}")
+    finally:
+        conn.close()
+
+class IdentityChangeListener:
+    """Background thread that LISTENs for identity_spec changes and invalidates the cache.
+
+    Requires the trigger in NOTIFY_TRIGGER_SQL (see `install_notify_trigger`). Reconnects with a delay if
+    the connection drops; the TTL bounds staleness in the meantime.
+    """
+
+    def __init__(self, cache: IdentitySpecCache, connect: Callable[[], Any], channel: str = NOTIFY_CHANNEL, poll_interval: float = 5.0, reconnect_delay: float = 5.0):
+        self.cache = cache
+        self.channel = channel
+        self.poll_interval = poll_interval
+        self.reconnect_delay = reconnect_delay
+        self._connect = connect
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="identity-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+
+    def _listen(self) -> None:
+        conn = self._connect()
+        try:
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {self.channel}")
+            logger.info(f"Listening for identity changes on channel: {self.channel}")
+            # Anything may have changed while we were not listening
+            self.cache.invalidate()
+            while not self._stop.is_set():
+                if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    payload = notify.payload
+                    self.cache.invalidate(int(payload) if payload.isdigit() else None)
+        finally:
+            conn.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                logger.warning(f"Identity change listener error: {str(e)}")
+                self._stop.wait(self.reconnect_delay)
+
+# Shared by all IdentityAgent instances in the process
+identity_cache = IdentitySpecCache(ttl_seconds=float(os.getenv("IDENTITY_CACHE_TTL", "300")))
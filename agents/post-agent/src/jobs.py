@@ -0,0 +1,193 @@
+from typing import Any, Awaitable, Callable, Dict, Literal, Optional
+from pydantic import BaseModel, Field
+import itertools
+import asyncio
+import logging
+import time
+import uuid
+import os
+
+logger = logging.getLogger(__name__)
+
+JobStatus = Literal["queued", "running", "succeeded", "failed", "cancelled"]
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+class QueueFull(RuntimeError):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+class QueueStopped(RuntimeError):
+    """Raised when a job is submitted after the queue was stopped and no worker would run it."""
+
+class Job(BaseModel):
+    """A queued post generation and, once finished, its outcome."""
+    job_id: str = Field(description="Identifier used to poll or cancel the job")
+    topic: Optional[str] = Field(default=None, description="Requested topic, if any")
+    priority: int = Field(default=0, description="Higher runs first; equal priorities run in submission order")
+    status: JobStatus = Field(default="queued", description="Current job status")
+    created_at: float = Field(description="Submission time (epoch seconds)")
+    started_at: Optional[float] = Field(default=None, description="Time a worker picked the job up")
+    finished_at: Optional[float] = Field(default=None, description="Time the job finished")
+    result: Optional[Dict[str, Any]] = Field(default=None, description="Post payload on success")
+    error: Optional[str] = Field(default=None, description="Error message on failure")
+
+class JobQueue:
+    """In-process priority queue of post generations served by asyncio workers.
+
+    Submitting returns immediately with a job ID; `workers` tasks take jobs
+    highest priority first and run them through `runner`. Finished jobs are
+    kept for `retention_seconds` so clients can poll for the result.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[Optional[str]], Awaitable[Dict[str, Any]]],
+        workers: int = 4,
+        max_queue_size: int = 1000,
+        retention_seconds: float = 3600.0
+    ):
+        self.runner = runner
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.retention_seconds = retention_seconds
+        self._jobs: Dict[str, Job] = {}
+        self._done: Dict[str, asyncio.Event] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: list = []
+        self._sequence = itertools.count()
+        # Jobs still waiting for a worker; cancelled entries left in the queue don't count
+        self._pending = 0
+        self._stopped = False
+
+    def start(self) -> None:
+        """Start the worker tasks on the running event loop."""
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._stopped = False
+        self._workers = [asyncio.create_task(self._work(i)) for i in range(self.workers)]
+        logger.info(f"Started job queue with {self.workers} workers")
+
+    async def stop(self) -> None:
+        """Cancel the workers; queued and running jobs are marked cancelled.
+
+        Later submissions raise QueueStopped until `start` is called again.
+        """
+        self._stopped = True
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for job in self._jobs.values():
+            if job.status not in FINISHED_STATUSES:
+                self._finish(job, "cancelled", error="Job queue stopped")
+
+    def submit(self, topic: Optional[str] = None, priority: int = 0) -> Job:
+        """Enqueue a post generation and return its job."""
+        if self._stopped:
+            raise QueueStopped("Job queue is stopped")
+        if self._queue is None:
+            self.start()
+        self._prune()
+        if self._pending >= self.max_queue_size:
+            raise QueueFull(f"Job queue is full ({self.max_queue_size} jobs)")
+        job = Job(job_id=uuid.uuid4().hex, topic=topic, priority=priority, created_at=time.time())
+        self._jobs[job.job_id] = job
+        self._done[job.job_id] = asyncio.Event()
+        # PriorityQueue pops the smallest item first
+        self._queue.put_nowait((-priority, next(self._sequence), job.job_id))
+        self._pending += 1
+        logger.info(f"Queued job {job.job_id} (priority {priority})")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """Return the job once it finished or `timeout` seconds passed, whichever is first."""
+        done = self._done.get(job_id)
+        if done is not None:
+            try:
+                await asyncio.wait_for(done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job; finished jobs are returned unchanged."""
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return job
+        task = self._running.get(job_id)
+        if task is not None:
+            # The worker marks the job cancelled when the task unwinds
+            task.cancel()
+        else:
+            # Still queued; the worker skips it when it comes up
+            self._finish(job, "cancelled")
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {status: 0 for status in ("queued", "running", *FINISHED_STATUSES)}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return {"workers": len(self._workers), "max_queue_size": self.max_queue_size, "jobs": counts}
+
+    def _finish(self, job: Job, status: JobStatus, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        if job.status == "queued":
+            self._pending -= 1
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        done = self._done.get(job.job_id)
+        if done is not None:
+            done.set()
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the retention period."""
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._done.pop(job_id, None)
+
+    async def _work(self, worker_id: int) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            try:
+                job = self._jobs.get(job_id)
+                if job is None or job.status != "queued":
+                    continue
+                self._pending -= 1
+                job.status = "running"
+                job.started_at = time.time()
+                task = asyncio.create_task(self.runner(job.topic))
+                self._running[job_id] = task
+                try:
+                    # Unlike awaiting the task, asyncio.wait does not forward the worker's own cancellation
+                    await asyncio.wait({task})
+                except asyncio.CancelledError:
+                    task.cancel()
+                    raise
+                finally:
+                    self._running.pop(job_id, None)
+                if task.cancelled():
+                    self._finish(job, "cancelled")
+                elif task.exception() is not None:
+                    logger.error(f"Job {job_id} failed: {str(task.exception())}")
+                    self._finish(job, "failed", error=str(task.exception()))
+                else:
+                    self._finish(job, "succeeded", result=task.result())
+                logger.info(f"Worker {worker_id} finished job {job_id} with status {job.status}")
+            finally:
+                self._queue.task_done()
+
+def create_job_queue(runner: Callable[[Optional[str]], Awaitable[Dict[str, Any]]]) -> JobQueue:
+    """Create a job queue configured from JOB_* environment variables."""
+    return JobQueue(
+        runner,
+        workers=int(os.getenv("JOB_WORKERS", "4")),
+        max_queue_size=int(os.getenv("JOB_QUEUE_MAX_SIZE", "1000")),
+        retention_seconds=float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+    )
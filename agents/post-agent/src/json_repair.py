@@ -0,0 +1,180 @@
+from typing import Any, List, Optional, Tuple
+import json
+import re
+
+FENCE_RE = re.compile(r"```(?:json|JSON)?")
+LITERALS = {"True": "true", "False": "false", "None": "null", "true": "true", "false": "false", "null": "null"}
+CLOSERS = {"{": "}", "[": "]"}
+# A number with its sign, fraction and exponent, read as one token so "1e3" isn't split into 1, e and 3
+NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d*)?")
+
+def _strip_fences(text: str) -> str:
+    """Drop markdown code fences and anything before the first JSON container."""
+    text = FENCE_RE.sub("", text)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    return text[min(starts):] if starts else text.strip()
+
+def repair_json(text: str) -> str:
+    """Rewrite almost-JSON LLM output into valid JSON text.
+
+    Handles code fences and surrounding prose, single-quoted strings,
+    unescaped quotes and raw newlines inside strings, Python literals
+    (True/False/None), trailing commas, and output cut off mid-way (open
+    strings and containers are closed, a dangling key or comma is dropped).
+    Numbers JSON doesn't allow (`+1`, `.5`, `007`) are normalized.
+    Text after the first complete top-level value is ignored.
+
+    Raises ValueError if the output is complete but still malformed, e.g. a
+    quote taken as the end of a string turns out not to be: returning the
+    value parsed so far would silently cut the text short. A bare word other
+    than a literal raises too, rather than being dropped.
+    """
+    text = _strip_fences(text)
+    out: List[str] = []
+    stack: List[str] = []
+    # Output length and open containers after the last complete value, to cut back to
+    safe: Tuple[int, List[str]] = (0, [])
+    quote = None
+    escaped = False
+    closed = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if quote is not None:
+            if escaped:
+                if ch == "'":
+                    # \' is not a JSON escape; the quote needs none inside "..."
+                    out[-1] = "'"
+                else:
+                    out.append(ch)
+                escaped = False
+            elif ch == "\\":
+                out.append(ch)
+                escaped = True
+            elif ch == quote and _ends_string(text, i + 1, stack):
+                out.append('"')
+                quote = None
+            elif ch in "\"'":
+                out.append('\\"' if ch == '"' else ch)
+            elif ch == "\n":
+                out.append("\\n")
+            elif ch == "\t":
+                out.append("\\t")
+            elif ch != "\r":
+                out.append(ch)
+            i += 1
+            continue
+        if ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch in CLOSERS:
+            stack.append(CLOSERS[ch])
+            out.append(ch)
+            safe = (len(out), list(stack))
+        elif ch in "}]":
+            # Drop a trailing comma before the closer
+            while out and out[-1] in " \n\t,":
+                out.pop()
+            if stack and stack[-1] == ch:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                closed = True
+                break
+            safe = (len(out), list(stack))
+        elif ch == ",":
+            safe = (len(out), list(stack))
+            out.append(ch)
+        elif ch in "-+.0123456789":
+            token = NUMBER_RE.match(text, i)
+            number = _number(token.group(0)) if token else None
+            end = token.end() if token else i + 1
+            if number is not None:
+                out.append(number)
+            elif end < len(text.rstrip()):
+                raise ValueError(f"Malformed number at position {i}: {text[i:end + 1]!r}")
+            i = end
+            continue
+        elif ch.isalpha():
+            word = re.match(r"[A-Za-z_]\w*", text[i:]).group(0)
+            if word in LITERALS:
+                out.append(LITERALS[word])
+            elif i + len(word) < len(text) or not any(literal.startswith(word) for literal in LITERALS):
+                # A literal cut off at the very end is left to the truncation fallback
+                raise ValueError(f"Unexpected bare word {word!r} at position {i}")
+            i += len(word)
+            continue
+        elif not ch.isspace():
+            out.append(ch)
+        i += 1
+    if quote is not None:
+        if escaped:
+            out.pop()
+        out.append('"')
+    repaired = _close("".join(out), stack)
+    try:
+        json.loads(repaired)
+        return repaired
+    except json.JSONDecodeError as e:
+        # Only output that was cut off may fall back to its last complete value
+        if closed or e.pos < safe[0]:
+            raise ValueError(f"Output is malformed, not truncated: {e}") from e
+        return _close("".join(out[:safe[0]]), safe[1])
+
+# Characters that can start a non-literal value, for telling a closing quote from an inner one
+VALUE_STARTS = "\"'{[-0123456789"
+
+def _ends_string(text: str, pos: int, stack: List[str]) -> bool:
+    """Whether a quote before `pos` closes the string.
+
+    It must be followed by a delimiter or the end, and a comma by what may
+    come next in the enclosing container: a key or `}` in an object, a value
+    or `]` in an array.
+    """
+    rest = text[pos:].lstrip()
+    if not rest or rest[0] in ":}]":
+        return True
+    if rest[0] != ",":
+        return False
+    after = rest[1:].lstrip()
+    if not after:
+        return True
+    if stack and stack[-1] == "}":
+        return after[0] in "\"'}"
+    if after[0].isalpha():
+        return re.match(r"[A-Za-z]+", after).group(0) in LITERALS
+    return after[0] in VALUE_STARTS + "]"
+
+def _number(token: str) -> Optional[str]:
+    """`token` as a JSON number, or None if it isn't a complete number (e.g. cut off after "1e")."""
+    try:
+        json.loads(token)
+        return token
+    except json.JSONDecodeError:
+        pass
+    try:
+        value = float(token)
+    except ValueError:
+        return None
+    return str(int(value)) if re.fullmatch(r"[-+]?\d+", token) else json.dumps(value)
+
+def _close(text: str, stack: List[str]) -> str:
+    text = text.rstrip(" \n\t,")
+    if text.endswith(":"):
+        text += "null"
+    return text + "".join(reversed(stack))
+
+def loads(text: str) -> Tuple[Any, bool]:
+    """Parse LLM output as JSON, repairing it if needed.
+
+    Returns (value, repaired). Raises ValueError if nothing usable is left.
+    """
+    try:
+        return json.loads(text), False
+    except (json.JSONDecodeError, TypeError):
+        pass
+    repaired = repair_json(text)
+    try:
+        return json.loads(repaired), True
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Output is not recoverable JSON: {e}") from e
@@ -0,0 +1,293 @@
+from typing import Any, Dict, Optional, Tuple
+from collections import OrderedDict
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+import threading
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import json
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """Hash of the model name/parameters string and the rendered prompt.
+
+    Runs of whitespace are collapsed first, so re-indenting a prompt template
+    does not invalidate the entries it produced.
+    """
+    normalized = " ".join(prompt.split())
+    return hashlib.sha256(f"{llm_string}\x00{normalized}".encode("utf-8")).hexdigest()
+
+def _response_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class MemoryTier:
+    """Thread-safe LRU of serialized responses with a per-entry TTL."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[RETURN_VAL_TYPE, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: RETURN_VAL_TYPE, expires_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[key] = (value, expires_at or time.time() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+class SqliteTier:
+    """On-disk tier in a SQLite database (WAL mode), shared across restarts."""
+
+    def __init__(self, path: str, ttl_seconds: float = 86400.0):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[RETURN_VAL_TYPE, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_responses WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        return [loads(item) for item in json.loads(row[0])], row[1]
+
+    def set(self, key: str, value: RETURN_VAL_TYPE) -> None:
+        payload = json.dumps([dumps(generation) for generation in value])
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, payload, time.time() + self.ttl_seconds)
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses")
+            self._conn.commit()
+
+class ResponseCache:
+    """Two-tier LLM response store shared by every agent that opts in.
+
+    Lookups check the in-memory LRU first, then SQLite; disk hits are
+    promoted to memory. Hits and misses are counted per agent. The keys of
+    recently served responses are remembered by response text, so a response
+    the agent could not parse can be evicted with `discard`.
+    """
+
+    def __init__(self, memory: MemoryTier, disk: Optional[SqliteTier] = None):
+        self.memory = memory
+        self.disk = disk
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._counters_lock = threading.Lock()
+        # response digest -> cache key, for the last `memory.max_entries` responses served or stored
+        self._recent: "OrderedDict[str, str]" = OrderedDict()
+        self._recent_lock = threading.Lock()
+
+    def _count(self, agent_name: str, outcome: str) -> None:
+        with self._counters_lock:
+            counters = self._counters.setdefault(agent_name, {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+            counters[outcome] += 1
+
+    def lookup_memory(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        return self.memory.get(key)
+
+    def lookup_disk(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        if self.disk is None:
+            return None
+        found = self.disk.get(key)
+        if found is None:
+            return None
+        value, expires_at = found
+        self.memory.set(key, value, expires_at=min(expires_at, time.time() + self.memory.ttl_seconds))
+        return value
+
+    def store(self, key: str, value: RETURN_VAL_TYPE) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value)
+            except Exception as e:
+                logger.warning(f"Failed to write LLM response to disk cache: {str(e)}")
+
+    def remember(self, key: str, value: RETURN_VAL_TYPE) -> None:
+        """Note which key served `value`, so `discard` can find it from the response text."""
+        digest = _response_digest("".join(generation.text for generation in value))
+        with self._recent_lock:
+            self._recent[digest] = key
+            self._recent.move_to_end(digest)
+            while len(self._recent) > self.memory.max_entries:
+                self._recent.popitem(last=False)
+
+    def discard(self, text: str) -> bool:
+        """Evict the response with this text from both tiers; returns whether it was cached."""
+        with self._recent_lock:
+            key = self._recent.pop(_response_digest(text), None)
+        if key is None:
+            return False
+        self.memory.delete(key)
+        if self.disk is not None:
+            try:
+                self.disk.delete(key)
+            except Exception as e:
+                logger.warning(f"Failed to delete LLM response from disk cache: {str(e)}")
+        return True
+
+    def for_agent(self, agent_name: str) -> "AgentResponseCache":
+        """Return a LangChain cache view that attributes hits and misses to an agent."""
+        return AgentResponseCache(self, agent_name)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counters_lock:
+            per_agent = {name: dict(counters) for name, counters in self._counters.items()}
+        totals = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        for counters in per_agent.values():
+            for outcome, count in counters.items():
+                totals[outcome] += count
+        lookups = sum(totals.values())
+        hit_rate = (totals["memory_hits"] + totals["disk_hits"]) / lookups if lookups else 0.0
+        return {"agents": per_agent, "totals": totals, "hit_rate": round(hit_rate, 4)}
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+        with self._recent_lock:
+            self._recent.clear()
+
+class AgentResponseCache(BaseCache):
+    """LangChain `BaseCache` for one agent, backed by the shared ResponseCache.
+
+    Attached to an agent's model via its `cache` field, so LangChain itself
+    keys lookups by the rendered prompt and the model's parameters.
+    """
+
+    def __init__(self, cache: ResponseCache, agent_name: str):
+        self.cache = cache
+        self.agent_name = agent_name
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = cache_key(prompt, llm_string)
+        value = self.cache.lookup_memory(key)
+        if value is not None:
+            self.cache._count(self.agent_name, "memory_hits")
+            self.cache.remember(key, value)
+            return value
+        value = self.cache.lookup_disk(key)
+        self.cache._count(self.agent_name, "disk_hits" if value is not None else "misses")
+        if value is not None:
+            self.cache.remember(key, value)
+        return value
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = cache_key(prompt, llm_string)
+        self.cache.store(key, return_val)
+        self.cache.remember(key, return_val)
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = cache_key(prompt, llm_string)
+        # Memory hits are answered inline; only the SQLite tier goes to a thread
+        value = self.cache.lookup_memory(key)
+        if value is not None:
+            self.cache._count(self.agent_name, "memory_hits")
+            self.cache.remember(key, value)
+            return value
+        value = await asyncio.to_thread(self.cache.lookup_disk, key)
+        self.cache._count(self.agent_name, "disk_hits" if value is not None else "misses")
+        if value is not None:
+            self.cache.remember(key, value)
+        return value
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = cache_key(prompt, llm_string)
+        self.cache.memory.set(key, return_val)
+        if self.cache.disk is not None:
+            await asyncio.to_thread(self.cache.store, key, return_val)
+        self.cache.remember(key, return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        self.cache.clear()
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache, configured from LLM_CACHE_* environment variables."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            memory = MemoryTier(
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+                ttl_seconds=float(os.getenv("LLM_CACHE_MEMORY_TTL", "3600"))
+            )
+            # The SQLite tier is opt-in: set LLM_CACHE_PATH to keep responses across restarts
+            path = os.getenv("LLM_CACHE_PATH", "")
+            disk = SqliteTier(path, ttl_seconds=float(os.getenv("LLM_CACHE_DISK_TTL", "86400"))) if path else None
+            _response_cache = ResponseCache(memory, disk)
+        return _response_cache
+
+def discard_cached_response(text: str) -> bool:
+    """Evict a response that could not be parsed, so the next call asks the model again.
+
+    A no-op until the response cache has been created.
+    """
+    cache = _response_cache
+    return cache.discard(text) if cache is not None else False
+
+def is_cache_enabled_for(agent_name: str, default: bool) -> bool:
+    """Whether an agent should cache responses.
+
+    LLM_CACHE=false disables caching everywhere; LLM_CACHE_AGENTS, a comma
+    separated list of agent names, overrides the agents' own opt-in.
+    """
+    if os.getenv("LLM_CACHE", "true").lower() != "true":
+        return False
+    agents = os.getenv("LLM_CACHE_AGENTS")
+    if agents:
+        return agent_name in {name.strip() for name in agents.split(",") if name.strip()}
+    return default
@@ -0,0 +1,67 @@
+from typing import Dict, Optional
+from pydantic import BaseModel, Field
+from langchain_core.language_models import BaseChatModel
+from langchain_google_genai import ChatGoogleGenerativeAI
+from dotenv import load_dotenv
+import threading
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+class LLMConfig(BaseModel):
+    """Model settings shared by every agent in a workflow."""
+    model: str = Field(default="gemini-2.0-flash-lite", description="Gemini model name")
+    temperature: float = Field(default=0.7, description="Sampling temperature")
+    top_p: float = Field(default=0.8, description="Nucleus sampling probability")
+    top_k: int = Field(default=40, description="Top-k sampling cutoff")
+
+    model_config = {"frozen": True}
+
+    @classmethod
+    def from_env(cls) -> "LLMConfig":
+        """Build a config from LLM_* environment variables, falling back to defaults."""
+        defaults = cls()
+        return cls(
+            model=os.getenv("LLM_MODEL", defaults.model),
+            temperature=float(os.getenv("LLM_TEMPERATURE", defaults.temperature)),
+            top_p=float(os.getenv("LLM_TOP_P", defaults.top_p)),
+            top_k=int(os.getenv("LLM_TOP_K", defaults.top_k))
+        )
+
+# One client per distinct config, shared across agents, workflows and requests
+_llm_clients: Dict[LLMConfig, BaseChatModel] = {}
+_llm_clients_lock = threading.Lock()
+
+def build_llm(config: LLMConfig) -> BaseChatModel:
+    """Create a new Gemini chat client for the given config."""
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("GOOGLE_API_KEY not found in environment variables")
+    return ChatGoogleGenerativeAI(
+        model=config.model,
+        google_api_key=api_key,
+        temperature=config.temperature,
+        top_p=config.top_p,
+        top_k=config.top_k
+    )
+
+def get_shared_llm(config: Optional[LLMConfig] = None) -> BaseChatModel:
+    """Return the process-wide client for a config, creating it on first use."""
+    config = config or LLMConfig.from_env()
+    with _llm_clients_lock:
+        llm = _llm_clients.get(config)
+        if llm is None:
+            llm = build_llm(config)
+            _llm_clients[config] = llm
+            logger.info(f"Created shared LLM client for model: {config.model}")
+        return llm
+
+def clear_shared_llms() -> None:
+    """Drop all cached clients so the next lookup builds fresh ones."""
+    with _llm_clients_lock:
+        _llm_clients.clear()
+    logger.info("Cleared shared LLM clients")
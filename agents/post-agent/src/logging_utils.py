@@ -0,0 +1,79 @@
+from typing import Any, Optional
+from pydantic import BaseModel
+import random
+import os
+
+# Longest string rendered per field, and list items shown before eliding the rest
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "200"))
+LOG_MAX_ITEMS = int(os.getenv("LOG_MAX_ITEMS", "5"))
+
+# Fraction of debug payloads (states, LLM results) that are rendered at all
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+
+def truncate(text: str, max_chars: int = LOG_MAX_FIELD_CHARS) -> str:
+    """Cut `text` to `max_chars`, noting how much was dropped."""
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}… (+{len(text) - max_chars} chars)"
+
+def summarize(value: Any, max_chars: int = LOG_MAX_FIELD_CHARS, max_items: int = LOG_MAX_ITEMS) -> Any:
+    """Return a compact, log-friendly copy of `value`.
+
+    Strings are truncated, lists keep their first `max_items` items, pydantic
+    models become dicts of their (summarized) fields without a full
+    `model_dump`, and callables are shown by name.
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        return truncate(value, max_chars)
+    if isinstance(value, BaseModel):
+        return {
+            name: summarize(getattr(value, name), max_chars, max_items)
+            for name in type(value).model_fields
+        }
+    if isinstance(value, dict):
+        items = list(value.items())
+        summary = {str(key): summarize(item, max_chars, max_items) for key, item in items[:max_items * 4]}
+        if len(items) > max_items * 4:
+            summary["…"] = f"+{len(items) - max_items * 4} keys"
+        return summary
+    if isinstance(value, (list, tuple, set)):
+        items = list(value)
+        summary = [summarize(item, max_chars, max_items) for item in items[:max_items]]
+        if len(items) > max_items:
+            summary.append(f"… (+{len(items) - max_items} items)")
+        return summary
+    if callable(value):
+        return f"<{getattr(value, '__qualname__', type(value).__name__)}>"
+    return truncate(str(value), max_chars)
+
+class LazyRepr:
+    """Defers summarizing a value until a log record is actually formatted.
+
+    Pass it as a %-style logging argument, e.g.
+    `logger.debug("State: %s", lazy(state))`; if DEBUG is disabled nothing
+    is rendered. When rendered, only a `sample_rate` fraction of payloads is
+    summarized, the rest show as "<sampled out>".
+    """
+    __slots__ = ("value", "max_chars", "sample_rate")
+
+    def __init__(self, value: Any, max_chars: int = LOG_MAX_FIELD_CHARS, sample_rate: float = LOG_DEBUG_SAMPLE_RATE):
+        self.value = value
+        self.max_chars = max_chars
+        self.sample_rate = sample_rate
+
+    def __str__(self) -> str:
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return "<sampled out>"
+        return str(summarize(self.value, self.max_chars))
+
+    __repr__ = __str__
+
+def lazy(value: Any, max_chars: Optional[int] = None, sample_rate: Optional[float] = None) -> LazyRepr:
+    """Wrap a large value (agent state, LLM result) for deferred, truncated, sampled logging."""
+    return LazyRepr(
+        value,
+        LOG_MAX_FIELD_CHARS if max_chars is None else max_chars,
+        LOG_DEBUG_SAMPLE_RATE if sample_rate is None else sample_rate
+    )
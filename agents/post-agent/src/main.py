@@ -1,10 +1,63 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Optional
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from pydantic import BaseModel, Field
+from typing import Any, AsyncIterator, Dict, List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import hmac
+import json
+import os
 import uvicorn
-from .orchestrator import generate_post
+from .orchestrator import generate_post, generate_posts_batch, stream_post_events, workflow_registry
+from .checkpoints import close_checkpoint_writer
+from .db import get_pool, close_pool, connect_from_env
+from .identity_cache import identity_cache, IdentityChangeListener, install_notify_trigger
+from .prompt_cache import prompt_cache
+from .llm_cache import get_response_cache
+from .context_cache import get_context_cache
+from .research_engine import close_research_engine
+from .jobs import Job, QueueFull, QueueStopped, create_job_queue
+from .metrics import recent_runs
 
-app = FastAPI(title="LinkedIn Post Generation System")
+logger = logging.getLogger(__name__)
+
+# Background generations submitted through /jobs
+job_queue = create_job_queue(generate_post)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Compile the workflow and open the DB pool once before serving requests."""
+    await workflow_registry.start()
+    identity_listener = None
+    if os.getenv("DATABASE_URL"):
+        try:
+            await asyncio.to_thread(get_pool().open)
+        except Exception as e:
+            # The pool retries on first use; don't block startup on the database
+            logger.warning(f"Could not pre-open database pool: {str(e)}")
+        if os.getenv("IDENTITY_LISTEN", "true").lower() == "true":
+            if os.getenv("IDENTITY_INSTALL_TRIGGER", "false").lower() == "true":
+                try:
+                    await asyncio.to_thread(install_notify_trigger, connect_from_env)
+                except Exception as e:
+                    # The TTL still bounds staleness without the trigger
+                    logger.warning(f"Could not install identity_spec trigger: {str(e)}")
+            # Invalidate cached identity specs as soon as the table changes
+            identity_listener = IdentityChangeListener(identity_cache, connect_from_env)
+            identity_listener.start()
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    if identity_listener is not None:
+        identity_listener.stop()
+    await close_research_engine()
+    close_pool()
+    # Make sure queued checkpoints reach disk before exit
+    close_checkpoint_writer()
+
+app = FastAPI(title="LinkedIn Post Generation System", lifespan=lifespan)
 
 class PostRequest(BaseModel):
     """Request model for post generation."""
@@ -17,12 +70,38 @@ class PostResponse(BaseModel):
     image_url: Optional[str] = None
     status: str
 
+class BatchPostRequest(BaseModel):
+    """Request model for batch post generation."""
+    topics: List[Optional[str]] = Field(min_length=1)
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+
+class JobRequest(BaseModel):
+    """Request model for queued post generation."""
+    topic: Optional[str] = None
+    priority: int = 0
+
+class ReloadResponse(BaseModel):
+    """Response model for workflow reloads."""
+    reloaded: bool
+    model: str
+    mode: str
+    section_mode: str
+    version: int
+
+def require_admin_token(token: Optional[str]) -> None:
+    """Reject admin calls without the ADMIN_TOKEN; admin endpoints are disabled while it is unset."""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if token is None or not hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
 @app.post("/generate-post", response_model=PostResponse)
 async def create_post(request: PostRequest) -> PostResponse:
     """Generate a LinkedIn post."""
     try:
         result = await generate_post(topic=request.topic)
-        
+
         return PostResponse(
             text=result["text"],
             image_url=result.get("image_url"),
@@ -34,5 +113,118 @@ async def create_post(request: PostRequest) -> PostResponse:
             detail=f"Error generating post: {str(e)}"
         )
 
+@app.get("/generate-post/stream")
+async def stream_post(topic: Optional[str] = None) -> StreamingResponse:
+    """Generate a LinkedIn post, streaming progress and body/CTA tokens as Server-Sent Events."""
+
+    async def events() -> AsyncIterator[str]:
+        async for item in stream_post_events(topic=topic):
+            yield f"event: {item.pop('event')}\ndata: {json.dumps(item)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/generate-posts/batch")
+async def create_posts_batch(request: BatchPostRequest) -> StreamingResponse:
+    """Generate a post per topic, streaming one JSON line per post as it finishes."""
+    max_posts = int(os.getenv("BATCH_MAX_POSTS", "50"))
+    if len(request.topics) > max_posts:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {max_posts} topics per batch"
+        )
+    max_concurrency = request.max_concurrency or int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+    max_concurrency = min(max_concurrency, int(os.getenv("BATCH_CONCURRENCY_LIMIT", "16")))
+
+    async def lines() -> AsyncIterator[str]:
+        async for item in generate_posts_batch(request.topics, max_concurrency=max_concurrency):
+            yield json.dumps(item) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.post("/jobs", response_model=Job, status_code=202)
+async def create_job(request: JobRequest) -> Job:
+    """Queue a post generation and return its job ID immediately."""
+    try:
+        return job_queue.submit(topic=request.topic, priority=request.priority)
+    except (QueueFull, QueueStopped) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.get("/jobs")
+async def job_queue_stats() -> Dict[str, Any]:
+    """Report the number of jobs in each status."""
+    return job_queue.stats()
+
+@app.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str, wait: float = 0) -> Job:
+    """Return a job's status and result, waiting up to `wait` seconds for it to finish."""
+    if wait > 0:
+        job = await job_queue.wait(job_id, timeout=min(wait, float(os.getenv("JOB_MAX_WAIT", "60"))))
+    else:
+        job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.delete("/jobs/{job_id}", response_model=Job)
+async def cancel_job(job_id: str) -> Job:
+    """Cancel a queued or running job."""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.post("/admin/reload-workflow", response_model=ReloadResponse)
+async def reload_workflow(force: bool = False, x_admin_token: Optional[str] = Header(default=None)) -> ReloadResponse:
+    """Rebuild the shared workflow if its config (LLM settings, workflow and section mode) changed."""
+    require_admin_token(x_admin_token)
+    try:
+        reloaded = await workflow_registry.reload(force=force)
+        config = workflow_registry.config
+        return ReloadResponse(
+            reloaded=reloaded,
+            model=config.llm.model,
+            mode=config.mode,
+            section_mode=config.section_mode,
+            version=workflow_registry.version
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error reloading workflow: {str(e)}"
+        )
+
+@app.get("/health/db")
+async def database_health() -> Dict[str, Any]:
+    """Ping the database and report connection pool and identity cache metrics."""
+    pool = get_pool()
+    healthy = await pool.check_health()
+    return {"healthy": healthy, "pool": pool.stats(), "identity_cache": identity_cache.stats(), "prompt_cache": prompt_cache.stats()}
+
+@app.get("/health/llm-cache")
+async def llm_cache_health() -> Dict[str, Any]:
+    """Report LLM response cache hits and misses per agent."""
+    return get_response_cache().stats()
+
+@app.get("/health/context-cache")
+async def context_cache_health() -> Dict[str, Any]:
+    """Report identity context cache handles and hits per agent."""
+    cache = get_context_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
+@app.get("/metrics")
+async def metrics() -> Response:
+    """Export node timings, token counts, retries and parse failures in Prometheus format."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/metrics/runs")
+async def run_summaries(limit: int = 20) -> List[Dict[str, Any]]:
+    """Return per-node summaries of the most recent runs, newest first."""
+    return list(reversed(recent_runs))[:limit]
+
 if __name__ == "__main__":
-    uvicorn.run("src.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    uvicorn.run("src.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,71 @@
+from typing import Dict, List, Optional
+import logging
+import os
+
+from .checkpoints import get_checkpoint_writer
+
+logger = logging.getLogger(__name__)
+
+# Messages kept in the state; 0 keeps everything
+MESSAGE_RETENTION = int(os.getenv("MESSAGE_RETENTION", "20"))
+# "last" drops the oldest messages, "summary" folds them into one leading summary message
+MESSAGE_RETENTION_MODE = os.getenv("MESSAGE_RETENTION_MODE", "last").lower()
+# Lines kept in the summary message, one per folded message
+MESSAGE_SUMMARY_LINES = int(os.getenv("MESSAGE_SUMMARY_LINES", "10"))
+# Message contents longer than this are spilled to the checkpoint store; 0 disables spilling
+MESSAGE_SPILL_CHARS = int(os.getenv("MESSAGE_SPILL_CHARS", "500"))
+
+PREVIEW_CHARS = 120
+SUMMARY_ROLE = "summary"
+
+def _preview(content: str, max_chars: int = PREVIEW_CHARS) -> str:
+    """`content` on one line, cut to `max_chars`."""
+    line = " ".join(content.split())
+    return line if len(line) <= max_chars else line[:max_chars - 1] + "…"
+
+def _summarize(previous: Optional[Dict[str, str]], dropped: List[Dict[str, str]]) -> Dict[str, str]:
+    """Fold `dropped` messages into the running summary message."""
+    count = int(previous.get("count", "0")) if previous else 0
+    lines = previous["content"].split("\n")[1:] if previous else []
+    lines += [f"{m.get('role', '?')}: {_preview(m.get('content', ''))}" for m in dropped]
+    count += len(dropped)
+    lines = lines[-MESSAGE_SUMMARY_LINES:] if MESSAGE_SUMMARY_LINES > 0 else []
+    return {
+        "role": SUMMARY_ROLE,
+        "content": "\n".join([f"{count} earlier messages:"] + lines),
+        "count": str(count)
+    }
+
+def append_messages(left: Optional[List[Dict[str, str]]], right: Optional[List[Dict[str, str]]]) -> List[Dict[str, str]]:
+    """Reducer for AgentState.messages: append new messages, then apply the retention policy.
+
+    With MESSAGE_RETENTION=N the channel never holds more than N messages, so
+    the state (and every checkpoint of it) stays the same size however long a
+    run loops.
+    """
+    messages = (left or []) + (right or [])
+    limit = MESSAGE_RETENTION
+    if limit <= 0 or len(messages) <= limit:
+        return messages
+    if MESSAGE_RETENTION_MODE == "summary":
+        summary = messages[0] if messages[0].get("role") == SUMMARY_ROLE else None
+        rest = messages[1:] if summary else messages
+        keep = max(1, limit - 1)
+        return [_summarize(summary, rest[:-keep])] + rest[-keep:]
+    return messages[-limit:]
+
+def spill_message(run_id: Optional[str], message: Dict[str, str]) -> Dict[str, str]:
+    """Move a large message content to the checkpoint store, keeping a preview and its `ref`.
+
+    The full content can be read back with `load_payload(run_id, ref)`.
+    Without a run ID, or with a store that keeps nothing (CHECKPOINT_BACKEND=none),
+    there is nowhere to file the payload, so it is kept inline.
+    """
+    content = message.get("content", "")
+    if MESSAGE_SPILL_CHARS <= 0 or not run_id or len(content) <= MESSAGE_SPILL_CHARS:
+        return message
+    ref = get_checkpoint_writer().spill(run_id, content)
+    if ref is None:
+        return message
+    logger.debug("Spilled %s char message to payload %s", len(content), ref)
+    return {**message, "content": _preview(content), "ref": ref}
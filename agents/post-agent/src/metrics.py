@@ -0,0 +1,284 @@
+from typing import Any, Deque, Dict, List, Optional
+from collections import deque
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables.config import var_child_runnable_config
+from prometheus_client import Counter, Histogram
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+NODE_DURATION = Histogram(
+    "post_agent_node_duration_seconds",
+    "Wall time of each workflow node",
+    ["node"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+)
+LLM_CALL_DURATION = Histogram(
+    "post_agent_llm_call_duration_seconds",
+    "Latency of each LLM call, by the node that made it",
+    ["node"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32)
+)
+LLM_TOKENS = Counter(
+    "post_agent_llm_tokens_total",
+    "Prompt and completion tokens reported by the LLM; cached counts prompt tokens read from a context cache",
+    ["node", "kind"]
+)
+LLM_CALLS = Counter(
+    "post_agent_llm_calls_total",
+    "LLM calls made by each node",
+    ["node"]
+)
+RETRIES = Counter(
+    "post_agent_retries_total",
+    "Regenerations triggered by an agent's validation checks",
+    ["node", "reason"]
+)
+RETRY_OUTCOMES = Counter(
+    "post_agent_retry_outcomes_total",
+    "Generations that needed retries, by whether a retry finally passed the checks",
+    ["node", "outcome"]
+)
+PARSE_FAILURES = Counter(
+    "post_agent_parse_failures_total",
+    "LLM outputs that could not be parsed",
+    ["node"]
+)
+PARSE_OUTCOMES = Counter(
+    "post_agent_parse_outcomes_total",
+    "Structured LLM outputs by how they were parsed: native, parsed, repaired or failed",
+    ["node", "outcome"]
+)
+QA_SCORES = Histogram(
+    "post_agent_qa_score",
+    "Scores given by each QA check, including re-checks after a refinement",
+    buckets=(1, 2, 3, 4, 5, 6, 7, 8, 9, 10)
+)
+REFINEMENTS = Counter(
+    "post_agent_refinements_total",
+    "Sections regenerated because the QA score was too low",
+    ["section"]
+)
+RESEARCH_FETCHES = Counter(
+    "post_agent_research_fetches_total",
+    "Result pages fetched by the research engine: ok, empty (no main text), skipped (not HTML), timeout or error",
+    ["outcome"]
+)
+RESEARCH_FETCH_DURATION = Histogram(
+    "post_agent_research_fetch_duration_seconds",
+    "Time to fetch and extract one result page, including waiting for the per-host rate limit",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16)
+)
+RUNS = Counter(
+    "post_agent_runs_total",
+    "Finished workflow runs",
+    ["status"]
+)
+RUN_DURATION = Histogram(
+    "post_agent_run_duration_seconds",
+    "Wall time of a whole workflow run",
+    buckets=(1, 2, 5, 10, 20, 30, 45, 60, 90, 120, 180)
+)
+
+def _empty_node_stats() -> Dict[str, Any]:
+    return {
+        "duration_s": 0.0,
+        "llm_calls": 0,
+        "llm_duration_s": 0.0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_prompt_tokens": 0,
+        "retries": 0,
+        "retries_recovered": 0,
+        "retries_exhausted": 0,
+        "parses": 0,
+        "parse_repairs": 0,
+        "parse_failures": 0
+    }
+
+class RunMetrics:
+    """Per-node timings, token counts, retries and parse failures of one workflow run."""
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.started = time.perf_counter()
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.qa_rounds: List[Dict[str, Any]] = []
+
+    def node(self, name: str) -> Dict[str, Any]:
+        return self.nodes.setdefault(name, _empty_node_stats())
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def total_tokens(self) -> int:
+        return sum(stats["prompt_tokens"] + stats["completion_tokens"] for stats in self.nodes.values())
+
+    def summary(self, status: str) -> Dict[str, Any]:
+        totals = _empty_node_stats()
+        for stats in self.nodes.values():
+            for key, value in stats.items():
+                totals[key] += value
+        totals.pop("duration_s")
+        return {
+            "run_id": self.run_id,
+            "status": status,
+            "duration_s": round(self.elapsed(), 3),
+            "qa_rounds": list(self.qa_rounds),
+            "totals": {key: round(value, 3) if isinstance(value, float) else value for key, value in totals.items()},
+            "nodes": {
+                name: {key: round(value, 3) if isinstance(value, float) else value for key, value in stats.items()}
+                for name, stats in self.nodes.items()
+            }
+        }
+
+# Summaries of the most recent runs, newest last
+recent_runs: Deque[Dict[str, Any]] = deque(maxlen=100)
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Records node and LLM timings and token usage from LangChain callbacks.
+
+    Pass one handler per run in the workflow's `callbacks` config. Events are
+    attributed to the graph node in their `langgraph_node` metadata.
+    """
+
+    # Bookkeeping only; don't hop to an executor thread for every event
+    run_inline = True
+
+    def __init__(self, run_metrics: RunMetrics):
+        self.run_metrics = run_metrics
+        self._nodes: Dict[UUID, str] = {}
+        self._llm_calls: Dict[UUID, tuple] = {}
+        self._started: Dict[UUID, float] = {}
+
+    def on_chain_start(self, serialized: Optional[Dict[str, Any]], inputs: Any, *, run_id: UUID, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        if node is None:
+            return
+        if kwargs.get("name") == node:
+            self._nodes[run_id] = node
+            self._started[run_id] = time.perf_counter()
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        node = self._nodes.pop(run_id, None)
+        if node is not None:
+            elapsed = time.perf_counter() - self._started.pop(run_id)
+            NODE_DURATION.labels(node).observe(elapsed)
+            self.run_metrics.node(node)["duration_s"] += elapsed
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.on_chain_end(None, run_id=run_id)
+
+    def on_chat_model_start(self, serialized: Optional[Dict[str, Any]], messages: List[List[Any]], *, run_id: UUID, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        node = (metadata or {}).get("langgraph_node", "unknown")
+        self._llm_calls[run_id] = (node, time.perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        node, started = self._llm_calls.pop(run_id, ("unknown", time.perf_counter()))
+        elapsed = time.perf_counter() - started
+        prompt_tokens, completion_tokens, cached_tokens = _token_usage(response)
+        LLM_CALLS.labels(node).inc()
+        LLM_CALL_DURATION.labels(node).observe(elapsed)
+        LLM_TOKENS.labels(node, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(node, "completion").inc(completion_tokens)
+        LLM_TOKENS.labels(node, "cached").inc(cached_tokens)
+        stats = self.run_metrics.node(node)
+        stats["llm_calls"] += 1
+        stats["llm_duration_s"] += elapsed
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        stats["cached_prompt_tokens"] += cached_tokens
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._llm_calls.pop(run_id, None)
+
+def _token_usage(response: LLMResult) -> tuple:
+    """Return (prompt, completion, cached prompt) tokens from message usage metadata, else the provider's llm_output."""
+    prompt_tokens = completion_tokens = cached_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+                cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0)
+    if not prompt_tokens and not completion_tokens:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+    return prompt_tokens, completion_tokens, cached_tokens
+
+def _current_node_and_run(default: str) -> tuple:
+    """Return the graph node the caller runs in and its RunMetrics, from LangChain's current runnable config."""
+    config = var_child_runnable_config.get() or {}
+    node = config.get("metadata", {}).get("langgraph_node", default)
+    callbacks = config.get("callbacks")
+    handlers = getattr(callbacks, "handlers", callbacks) or []
+    run = next((h.run_metrics for h in handlers if isinstance(h, MetricsCallbackHandler)), None)
+    return node, run
+
+def record_retry(agent_name: str, reason: str) -> None:
+    """Count a regeneration, e.g. after a failed validation ("validation") or a low tone score ("tone")."""
+    node, run = _current_node_and_run(agent_name)
+    RETRIES.labels(node, reason).inc()
+    if run is not None:
+        run.node(node)["retries"] += 1
+
+def record_retry_outcome(agent_name: str, recovered: bool) -> None:
+    """Count a generation that needed retries as recovered (a retry passed) or exhausted (none did)."""
+    node, run = _current_node_and_run(agent_name)
+    outcome = "recovered" if recovered else "exhausted"
+    RETRY_OUTCOMES.labels(node, outcome).inc()
+    if run is not None:
+        run.node(node)[f"retries_{outcome}"] += 1
+
+def record_parse_outcome(agent_name: str, outcome: str) -> None:
+    """Count a structured output as "native", "parsed", "repaired" or "failed" (also a parse failure)."""
+    node, run = _current_node_and_run(agent_name)
+    PARSE_OUTCOMES.labels(node, outcome).inc()
+    if outcome == "failed":
+        PARSE_FAILURES.labels(node).inc()
+    if run is not None:
+        stats = run.node(node)
+        stats["parses"] += 1
+        if outcome == "repaired":
+            stats["parse_repairs"] += 1
+        elif outcome == "failed":
+            stats["parse_failures"] += 1
+
+def current_run() -> Optional[RunMetrics]:
+    """Return the RunMetrics of the workflow run the caller is part of, if it has a metrics handler."""
+    return _current_node_and_run("unknown")[1]
+
+def record_research_fetch(outcome: str, duration: float) -> None:
+    """Record one research page fetch by its outcome."""
+    RESEARCH_FETCHES.labels(outcome).inc()
+    RESEARCH_FETCH_DURATION.observe(duration)
+
+def record_qa_round(round_info: Dict[str, Any]) -> None:
+    """Record one QA check (score, weakest section, refine/stop decision) for the current run."""
+    QA_SCORES.observe(round_info["score"])
+    if round_info.get("action") == "refine":
+        REFINEMENTS.labels(round_info["weakest_section"]).inc()
+    run = current_run()
+    if run is not None:
+        run.qa_rounds.append(round_info)
+
+def finish_run(run: RunMetrics, status: str) -> Dict[str, Any]:
+    """Record a finished run and keep its summary for GET /metrics/runs."""
+    summary = run.summary(status)
+    RUNS.labels(status).inc()
+    RUN_DURATION.observe(summary["duration_s"])
+    recent_runs.append(summary)
+    totals = summary["totals"]
+    logger.info(
+        f"Run {run.run_id} {status} in {summary['duration_s']}s: {totals['llm_calls']} LLM calls, "
+        f"{totals['prompt_tokens']} prompt ({totals['cached_prompt_tokens']} cached) / {totals['completion_tokens']} completion tokens, "
+        f"{totals['retries']} retries ({totals['retries_recovered']} recovered, {totals['retries_exhausted']} exhausted), "
+        f"{totals['parses']} parses ({totals['parse_repairs']} repaired, {totals['parse_failures']} failed), "
+        f"{sum(r['action'] == 'refine' for r in summary['qa_rounds'])} refinements"
+    )
+    return summary
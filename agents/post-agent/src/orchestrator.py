@@ -1,16 +1,21 @@
-from typing import Dict, Any, Optional, List, TypedDict, Literal
+from typing import Dict, Any, Optional, List, Tuple, AsyncIterator
 from langchain_core.language_models import BaseChatModel
-from langgraph.graph import StateGraph, END
-from .agents.base import AgentState, BaseAgent
+from langgraph.graph import StateGraph, START, END
+from .agents.base import AgentState
 from .agents.topic_selector import TopicSelectorAgent
 from .agents.research_agent import ResearchAgent
 from .agents.hook_generator import HookGeneratorAgent
 from .agents.body_generator import BodyGeneratorAgent
 from .agents.cta_generator import CTAGeneratorAgent
+from .agents.section_generator import SectionGeneratorAgent
 from .agents.qa_agent import QAAgent
 from .agents.final_assembler import FinalAssemblerAgent
-from .agents.identity_agent import IdentityAgent, IdentityAgentState
-from langchain_google_genai import ChatGoogleGenerativeAI
+from .agents.identity_agent import IdentityAgent
+from .llm_factory import get_shared_llm
+from .workflow_registry import WorkflowRegistry
+from .checkpoints import get_checkpoint_writer
+from .metrics import RunMetrics, MetricsCallbackHandler, finish_run
+from . import json_repair
 import os
 from dotenv import load_dotenv
 import logging
@@ -82,126 +87,236 @@ async def safe_wait_for_tracers():
     except Exception as e:
         logger.warning(f"Unexpected error waiting for tracers: {str(e)}")
 
-def create_workflow(llm: Optional[BaseChatModel] = None) -> StateGraph:
-    """Create the main workflow graph for post generation."""
-    # Initialize LLM if not provided
+# Nodes that regenerate one section after a low QA score; each leads straight back to qa_check
+REFINE_NODES = {"hook": "refine_hook", "body": "refine_body", "cta": "refine_cta"}
+
+def route_after_qa(state: AgentState) -> str:
+    """Send the draft to the node regenerating the section the QA check picked, or on to assembly."""
+    return REFINE_NODES.get(state.get("refine_section"), "assemble_post")
+
+def create_workflow(llm: Optional[BaseChatModel] = None, mode: Optional[str] = None, section_mode: Optional[str] = None) -> StateGraph:
+    """Create the main workflow graph for post generation.
+    
+    `mode` (default: WORKFLOW_MODE env var, else "linear") selects the graph shape:
+    "linear" runs every agent one after another; "parallel" runs identity loading
+    alongside topic selection and hook generation alongside research.
+    `section_mode` (default: SECTION_MODE env var, else "separate") selects how the
+    hook, body and CTA are written: "separate" uses one generator node each,
+    "fused" a single generate_sections node making one LLM call for all three.
+    In all, a draft the QA check scores too low loops back through the
+    generator of its weakest section only (see QAAgent.decide).
+    """
+    mode = mode or os.getenv("WORKFLOW_MODE", "linear")
+    if mode not in ("linear", "parallel"):
+        raise ValueError(f"Unknown workflow mode: {mode}")
+    section_mode = section_mode or os.getenv("SECTION_MODE", "separate")
+    if section_mode not in ("separate", "fused"):
+        raise ValueError(f"Unknown section mode: {section_mode}")
+    
+    # Use the shared client for the default configuration if no LLM is provided
     if llm is None:
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY not found in environment variables")
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-lite",
-            google_api_key=api_key,
-            temperature=0.7,
-            top_p=0.8,
-            top_k=40
-        )
-        logger.info("Initialized default LLM")
+        llm = get_shared_llm()
+        logger.info("Using shared default LLM")
     
     # Initialize agents
-    identity_agent = IdentityAgent()
-    identity_agent.set_llm(llm)
+    identity_agent = IdentityAgent(llm=llm)
+    topic_selector = TopicSelectorAgent(llm=llm)
+    researcher = ResearchAgent(llm=llm)
+    hook_generator = HookGeneratorAgent(llm=llm)
+    body_generator = BodyGeneratorAgent(llm=llm)
+    cta_generator = CTAGeneratorAgent(llm=llm)
+    section_generator = SectionGeneratorAgent(llm=llm)
+    qa_agent = QAAgent(llm=llm)
+    final_assembler = FinalAssemblerAgent(llm=llm)
     
-    topic_selector = TopicSelectorAgent()
-    topic_selector.set_llm(llm)
-    
-    researcher = ResearchAgent()
-    researcher.set_llm(llm)
+    logger.info("All agents initialized with LLM")
     
-    hook_generator = HookGeneratorAgent()
-    hook_generator.set_llm(llm)
+    nodes = {
+        "identity": identity_agent.run,
+        "select_topic": topic_selector.run,
+        "research": researcher.run,
+        "qa_check": qa_agent.run,
+        "assemble_post": final_assembler.run,
+        REFINE_NODES["hook"]: hook_generator.run,
+        REFINE_NODES["body"]: body_generator.run,
+        REFINE_NODES["cta"]: cta_generator.run
+    }
+    if section_mode == "fused":
+        nodes["generate_sections"] = section_generator.run
+    else:
+        nodes["generate_hook"] = hook_generator.run
+        nodes["generate_body"] = body_generator.run
+        nodes["generate_cta"] = cta_generator.run
     
-    body_generator = BodyGeneratorAgent()
-    body_generator.set_llm(llm)
+    # Both modes share one reducer-based state; every node returns only the fields it changed
+    workflow = StateGraph(AgentState)
     
-    cta_generator = CTAGeneratorAgent()
-    cta_generator.set_llm(llm)
+    # Add nodes
+    for name, run in nodes.items():
+        workflow.add_node(name, run)
     
-    qa_agent = QAAgent()
-    qa_agent.set_llm(llm)
+    logger.info("Added all nodes to workflow graph")
     
-    final_assembler = FinalAssemblerAgent()
-    final_assembler.set_llm(llm)
+    if mode == "parallel":
+        # Identity loading and topic selection are independent
+        workflow.add_edge(START, "identity")
+        workflow.add_edge(START, "select_topic")
+        
+        workflow.add_edge("select_topic", "research")
+        if section_mode == "fused":
+            # The combined call needs the identity and the research
+            workflow.add_edge(["identity", "research"], "generate_sections")
+            workflow.add_edge("generate_sections", "qa_check")
+        else:
+            # Research needs the topic; the hook needs the topic and identity but not the research
+            workflow.add_edge(["identity", "select_topic"], "generate_hook")
+            
+            # Everything after the body depends on the previous section
+            workflow.add_edge(["generate_hook", "research"], "generate_body")
+            workflow.add_edge("generate_body", "generate_cta")
+            workflow.add_edge("generate_cta", "qa_check")
+        
+        logger.info("Added fan-out and join edges to workflow graph")
+    else:
+        # Define edges
+        workflow.add_edge("identity", "select_topic")
+        workflow.add_edge("select_topic", "research")
+        if section_mode == "fused":
+            workflow.add_edge("research", "generate_sections")
+            workflow.add_edge("generate_sections", "qa_check")
+        else:
+            workflow.add_edge("research", "generate_hook")
+            workflow.add_edge("generate_hook", "generate_body")
+            workflow.add_edge("generate_body", "generate_cta")
+            workflow.add_edge("generate_cta", "qa_check")
+        
+        logger.info("Added all edges to workflow graph")
+        
+        # Set entry point
+        workflow.set_entry_point("identity")
+        logger.info("Set entry point to 'identity'")
     
-    logger.info("All agents initialized with LLM")
+    # Low-scoring drafts go back through their weakest section, then to QA again
+    workflow.add_conditional_edges("qa_check", route_after_qa, list(REFINE_NODES.values()) + ["assemble_post"])
+    for node in REFINE_NODES.values():
+        workflow.add_edge(node, "qa_check")
+    workflow.add_edge("assemble_post", END)
     
-    # Define the workflow
-    workflow = StateGraph(IdentityAgentState)
+    # Compile the workflow
+    compiled_workflow = workflow.compile()
     
-    # Add nodes
-    workflow.add_node("identity", identity_agent.run)
-    workflow.add_node("select_topic", topic_selector.run)
-    workflow.add_node("research", researcher.run)
-    workflow.add_node("generate_hook", hook_generator.run)
-    workflow.add_node("generate_body", body_generator.run)
-    workflow.add_node("generate_cta", cta_generator.run)
-    workflow.add_node("qa_check", qa_agent.run)
-    workflow.add_node("assemble_post", final_assembler.run)
+    logger.info(f"Workflow compiled successfully in {mode} mode with {section_mode} section generation")
+    return compiled_workflow
+
+# Compiled once and shared by all requests; see WorkflowRegistry.reload for hot reloads
+workflow_registry = WorkflowRegistry(create_workflow)
+
+def _tracing_config(topic: Optional[str]) -> Dict[str, Any]:
+    """Return the LangSmith run config for a post, or an empty config if tracing is disabled."""
+    if not langsmith_tracing_enabled:
+        return {}
     
-    logger.info("Added all nodes to workflow graph")
+    # Track metadata about the run
+    metadata = {
+        "topic": topic or "auto-selected",
+        "workflow_type": "linkedin_post_generation",
+        "version": "v1.3.24"
+    }
     
-    # Define edges
-    workflow.add_edge("identity", "select_topic")
-    workflow.add_edge("select_topic", "research")
-    workflow.add_edge("research", "generate_hook")
-    workflow.add_edge("generate_hook", "generate_body")
-    workflow.add_edge("generate_body", "generate_cta")
-    workflow.add_edge("generate_cta", "qa_check")
-    workflow.add_edge("qa_check", "assemble_post")
-    workflow.add_edge("assemble_post", END)
+    # Add additional metadata for better tracking
+    if topic:
+        metadata["topic_provided"] = "true"
+    else:
+        metadata["topic_provided"] = "false"
+        
+    # Add run configuration
+    return {
+        "run_name": f"LinkedIn Post Generation - {topic or 'Auto Topic'}",
+        "metadata": metadata
+    }
+
+def _run_config(topic: Optional[str], run_metrics: RunMetrics) -> Dict[str, Any]:
+    """Return the run config: tracing (if enabled) plus the metrics callback for this run."""
+    return {**_tracing_config(topic), "callbacks": [MetricsCallbackHandler(run_metrics)]}
+
+def _initial_state(run_id: str, topic: Optional[str]) -> Dict[str, Any]:
+    """Create the initial state; unset fields are simply absent from the dict."""
+    initial_state = {"run_id": run_id}
+    if topic:
+        initial_state["current_topic"] = topic
+    return initial_state
+
+# Nodes whose LLM output is streamed token by token, and the JSON field holding their text
+STREAMED_TEXT_FIELDS = {
+    "generate_body": ("body_text",),
+    "generate_cta": ("cta_text",),
+    "generate_sections": ("body_text", "cta_text"),
+    REFINE_NODES["body"]: ("body_text",),
+    REFINE_NODES["cta"]: ("cta_text",)
+}
+
+class _TextFieldStream:
+    """Turns the JSON fragments a node's LLM emits into increments of its text fields.
     
-    logger.info("Added all edges to workflow graph")
+    The agents ask for JSON, so raw tokens look like `{"body_text": "Most fo`;
+    the accumulated output is repaired and parsed on every chunk and only
+    the newly revealed part of each field is returned.
+    """
     
-    # Set entry point
-    workflow.set_entry_point("identity")
-    logger.info("Set entry point to 'identity'")
+    def __init__(self, fields: Tuple[str, ...]):
+        self.fields = fields
+        self.buffer = ""
+        self.emitted = {field: 0 for field in fields}
     
-    # Compile the workflow
-    compiled_workflow = workflow.compile()
+    def feed(self, content: Any) -> List[Tuple[str, str]]:
+        """Add a chunk and return (field, new text) for every field that grew."""
+        self.buffer += content if isinstance(content, str) else str(content)
+        try:
+            parsed, _ = json_repair.loads(self.buffer)
+        except ValueError:
+            return []
+        if not isinstance(parsed, dict):
+            return []
+        deltas = []
+        for field in self.fields:
+            text = parsed.get(field)
+            if isinstance(text, str) and len(text) > self.emitted[field]:
+                deltas.append((field, text[self.emitted[field]:]))
+                self.emitted[field] = len(text)
+        return deltas
+
+def _post_payload(result: Any) -> Dict[str, Any]:
+    """Return the post payload from a finished workflow's final state."""
+    # Convert AddableValuesDict to a regular dict and access state keys
+    # In LangGraph, the result is an AddableValuesDict, not an AgentState
+    result_dict = dict(result)
+    logger.debug("Converted result to dict. Keys: %s", result_dict.keys())
     
-    logger.info("Workflow compiled successfully")
-    return compiled_workflow
+    # Check if the final state has a post_payload
+    if "post_payload" not in result_dict or not result_dict["post_payload"]:
+        logger.error("Workflow did not produce a post_payload")
+        raise ValueError("Failed to generate post: No post payload in result")
+    return result_dict["post_payload"]
 
 async def generate_post(topic: Optional[str] = None) -> Dict[str, Any]:
     """Generate a LinkedIn post on the given topic."""
+    run_id = uuid.uuid4().hex
+    run_metrics = RunMetrics(run_id)
+    status = "error"
     try:
         logger.info(f"Starting post generation for topic: {topic}")
         
-        # Initialize workflow
-        workflow = create_workflow()
+        # Reuse the compiled workflow
+        workflow = workflow_registry.get()
         
-        # Create initial state
-        initial_state = IdentityAgentState()
+        initial_state = _initial_state(run_id, topic)
         if topic:
-            initial_state.current_topic = topic
             logger.info(f"Initialized state with topic: {topic}")
         
-        # Setup config for tracing
-        config = {}
-        
-        # Set up LangSmith tracing if available
+        # Setup config for tracing and metrics
+        config = _run_config(topic, run_metrics)
         if langsmith_tracing_enabled:
-            run_id = str(uuid.uuid4())
             logger.info(f"LangSmith run ID: {run_id}")
-            
-            # Track metadata about the run
-            metadata = {
-                "topic": topic or "auto-selected",
-                "workflow_type": "linkedin_post_generation",
-                "version": "v1.3.24"
-            }
-            
-            # Add additional metadata for better tracking
-            if topic:
-                metadata["topic_provided"] = "true"
-            else:
-                metadata["topic_provided"] = "false"
-                
-            # Add run configuration
-            config = {
-                "run_name": f"LinkedIn Post Generation - {topic or 'Auto Topic'}",
-                "metadata": metadata
-            }
                 
         # Execute workflow
         logger.info("Executing workflow")
@@ -214,8 +329,8 @@ async def generate_post(topic: Optional[str] = None) -> Dict[str, Any]:
                 await safe_wait_for_tracers()
                 logger.info("LangSmith tracing complete")
             else:
-                # Execute without tracing config if LangSmith is not enabled
-                result = await workflow.ainvoke(initial_state)
+                # The config only carries the metrics callback if LangSmith is not enabled
+                result = await workflow.ainvoke(initial_state, config=config)
         except Exception as e:
             logger.error(f"Workflow execution failed: {str(e)}")
             if langsmith_tracing_enabled:
@@ -223,27 +338,142 @@ async def generate_post(topic: Optional[str] = None) -> Dict[str, Any]:
                 logger.info("LangSmith tracing complete despite error")
             raise
             
-        logger.debug(f"Workflow execution complete. Result type: {type(result)}")
-        
-        # Convert AddableValuesDict to a regular dict and access state keys
-        # In LangGraph, the result is an AddableValuesDict, not an AgentState
-        result_dict = dict(result)
-        logger.debug(f"Converted result to dict. Keys: {result_dict.keys()}")
-        
-        # Check if the final state has a post_payload
-        if "post_payload" not in result_dict or not result_dict["post_payload"]:
-            logger.error("Workflow did not produce a post_payload")
-            raise ValueError("Failed to generate post: No post payload in result")
+        logger.debug("Workflow execution complete. Result type: %s", type(result))
         
+        post_payload = _post_payload(result)
         logger.info("Post generation completed successfully")
-        return result_dict["post_payload"]
+        status = "success"
+        return post_payload
     except Exception as e:
         logger.error(f"Error in workflow execution: {str(e)}", exc_info=True)
         raise ValueError(f"Error generating post: {str(e)}")
     finally:
+        finish_run(run_metrics, status)
+        
+        # Release the run's delta-encoding state in the checkpoint writer
+        get_checkpoint_writer().end_run(run_id)
+        
         # Ensure all traces are completed
         if langsmith_tracing_enabled:
             try:
                 await safe_wait_for_tracers()
             except Exception as e:
-                logger.warning(f"Error in finally block waiting for tracers: {str(e)}") 
\ No newline at end of file
+                logger.warning(f"Error in finally block waiting for tracers: {str(e)}")
+
+async def generate_posts_batch(
+    topics: List[Optional[str]],
+    max_concurrency: Optional[int] = None,
+    workflow: Any = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Generate one post per topic through the shared workflow, yielding each result as it finishes.
+    
+    At most `max_concurrency` workflows (default: BATCH_MAX_CONCURRENCY env var,
+    else 4) run at once. Each yielded item has the topic's `index` and `topic`,
+    and either `status` "success" with the `post`, or "error" with the `error`.
+    A failing post does not stop the rest of the batch.
+    """
+    if max_concurrency is None:
+        max_concurrency = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+    workflow = workflow or workflow_registry.get()
+    run_ids = [uuid.uuid4().hex for _ in topics]
+    run_metrics = [RunMetrics(run_id) for run_id in run_ids]
+    inputs = [_initial_state(run_id, topic) for run_id, topic in zip(run_ids, topics)]
+    # max_concurrency stays out of the per-run configs: children inherit them, and it would
+    # also cap a run's own parallel branches and the hook generator's candidates
+    configs = [_run_config(topic, metrics) for topic, metrics in zip(topics, run_metrics)]
+    slots = asyncio.Semaphore(max_concurrency)
+    
+    async def run(index: int) -> Tuple[int, Any]:
+        async with slots:
+            try:
+                return index, await workflow.ainvoke(inputs[index], config=configs[index])
+            except Exception as e:
+                return index, e
+    
+    logger.info(f"Starting batch generation of {len(topics)} posts with concurrency {max_concurrency}")
+    tasks = [asyncio.create_task(run(index)) for index in range(len(topics))]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            index, result = await finished
+            get_checkpoint_writer().end_run(run_ids[index])
+            item = {"index": index, "topic": topics[index]}
+            try:
+                if isinstance(result, Exception):
+                    raise result
+                item.update(status="success", post=_post_payload(result))
+            except Exception as e:
+                logger.error(f"Batch post {index} failed: {str(e)}")
+                item.update(status="error", error=str(e))
+            finish_run(run_metrics[index], item["status"])
+            yield item
+    finally:
+        # Stop runs that never finished (e.g. the client went away) and release their delta-encoding state
+        for task in tasks:
+            task.cancel()
+        for run_id in run_ids:
+            get_checkpoint_writer().end_run(run_id)
+        if langsmith_tracing_enabled:
+            await safe_wait_for_tracers()
+
+async def stream_post_events(topic: Optional[str] = None, workflow: Any = None) -> AsyncIterator[Dict[str, Any]]:
+    """Generate a post, yielding progress events as the workflow runs.
+    
+    Events are dicts with an `event` key:
+    - "run_start" (`run_id`) before anything else runs
+    - "node_start" / "node_end" (`node`, and `elapsed_s` on end) for every graph node
+    - "token" (`node`, `field`, `text`) for the body and CTA text as the LLM produces it;
+      a refine_* node starts that section's text over
+    - "reset" (`node`, `field`, `attempt`) when a node's next LLM call (e.g. a
+      retry after a failed validation) starts producing a field the node has
+      already streamed: the client discards that field's text so far, and the
+      following tokens are attempt number `attempt`
+    - "post" (`post`) with the final payload, or "error" (`error`) if the run failed
+    """
+    run_id = uuid.uuid4().hex
+    run_metrics = RunMetrics(run_id)
+    status = "error"
+    workflow = workflow or workflow_registry.get()
+    config = _run_config(topic, run_metrics)
+    started: Dict[str, float] = {}
+    streams: Dict[str, _TextFieldStream] = {}
+    # (node, field) -> the LLM call whose text the client has, and how many calls have streamed it
+    streamed_by: Dict[Tuple[str, str], str] = {}
+    attempts: Dict[Tuple[str, str], int] = {}
+    loop = asyncio.get_running_loop()
+    
+    yield {"event": "run_start", "run_id": run_id}
+    try:
+        async for event in workflow.astream_events(_initial_state(run_id, topic), config=config, version="v2"):
+            kind = event["event"]
+            node = event.get("metadata", {}).get("langgraph_node")
+            
+            if kind == "on_chat_model_stream" and node in STREAMED_TEXT_FIELDS:
+                # Keyed by the LLM call, so a retried generation starts its own stream
+                llm_run = event["run_id"]
+                stream = streams.setdefault(llm_run, _TextFieldStream(STREAMED_TEXT_FIELDS[node]))
+                for field, text in stream.feed(event["data"]["chunk"].content):
+                    key = (node, field)
+                    if streamed_by.get(key) != llm_run:
+                        attempts[key] = attempts.get(key, 0) + 1
+                        if key in streamed_by:
+                            yield {"event": "reset", "node": node, "field": field, "attempt": attempts[key]}
+                        streamed_by[key] = llm_run
+                    yield {"event": "token", "node": node, "field": field, "text": text}
+            elif kind == "on_chain_start" and node is not None and event["name"] == node:
+                started[event["run_id"]] = loop.time()
+                yield {"event": "node_start", "node": node}
+            elif kind == "on_chain_end" and event["run_id"] in started:
+                elapsed = loop.time() - started.pop(event["run_id"])
+                yield {"event": "node_end", "node": node, "elapsed_s": round(elapsed, 3)}
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                post = _post_payload(event["data"]["output"])
+                status = "success"
+                yield {"event": "post", "post": post}
+    except Exception as e:
+        logger.error(f"Error in streamed workflow execution: {str(e)}", exc_info=True)
+        yield {"event": "error", "error": str(e)}
+    finally:
+        finish_run(run_metrics, status)
+        get_checkpoint_writer().end_run(run_id)
+        if langsmith_tracing_enabled:
+            await safe_wait_for_tracers()
@@ -0,0 +1,67 @@
+from typing import Any, Callable, Dict, Optional
+from collections import OrderedDict
+from langchain_core.prompts import ChatPromptTemplate
+from .identity_cache import identity_cache
+import threading
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+class PromptTemplateCache:
+    """Compiled prompt templates keyed by (prompt name, identity id, identity version).
+
+    The generators' system prompts only depend on the identity spec, so each
+    is built once per identity version instead of on every run. Entries of an
+    identity are dropped when the identity cache invalidates it; the least
+    recently used entry goes once `max_entries` are held.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, ChatPromptTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, name: str, identity_id: Any, version: Optional[str], build: Callable[[], ChatPromptTemplate]) -> ChatPromptTemplate:
+        """Return the cached template for `name` and the identity version, calling `build` on a miss.
+
+        Without a version (e.g. an agent run outside the workflow) the template is built and not cached.
+        """
+        if version is None:
+            return build()
+        key = (name, identity_id, version)
+        with self._lock:
+            template = self._entries.get(key)
+            if template is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return template
+        # Built outside the lock; a concurrent miss just builds the same template twice
+        template = build()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = template
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        logger.debug("Compiled prompt template %s for identity version %s", name, version)
+        return template
+
+    def invalidate(self, identity_id: Any = None) -> None:
+        """Drop the templates of one identity, or all of them when no id is given."""
+        with self._lock:
+            if identity_id is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[1] == identity_id]:
+                    del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        return {"entries": size, "hits": self.hits, "misses": self.misses, "max_entries": self.max_entries}
+
+# Shared by all agents in the process; cleared together with the identity it was built from
+prompt_cache = PromptTemplateCache(max_entries=int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "64")))
+identity_cache.add_listener(prompt_cache.invalidate)
@@ -0,0 +1,361 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from abc import ABC, abstractmethod
+from urllib.parse import urlsplit
+from pydantic import BaseModel
+from .metrics import record_research_fetch
+import threading
+import asyncio
+import logging
+import time
+import re
+import httpx
+import os
+
+logger = logging.getLogger(__name__)
+
+class SearchHit(BaseModel):
+    url: str
+    title: str = ""
+    snippet: str = ""
+
+class SearchProvider(ABC):
+    """Source of result URLs for a research query."""
+
+    name = "search"
+
+    @abstractmethod
+    async def search(self, client: httpx.AsyncClient, query: str, limit: int) -> List[SearchHit]:
+        """Return up to `limit` results for `query`, fetched over the engine's pooled client."""
+
+class GoogleSearchProvider(SearchProvider):
+    """Google Programmable Search (Custom Search JSON API); needs an API key and a search engine id."""
+
+    name = "google"
+    endpoint = "https://www.googleapis.com/customsearch/v1"
+
+    def __init__(self, api_key: Optional[str] = None, engine_id: Optional[str] = None):
+        # Deliberately not GOOGLE_API_KEY: the Gemini key must not be sent to another API
+        self.api_key = api_key or os.getenv("GOOGLE_SEARCH_API_KEY")
+        self.engine_id = engine_id or os.getenv("GOOGLE_CSE_ID")
+        if not self.api_key or not self.engine_id:
+            raise ValueError("GoogleSearchProvider needs GOOGLE_SEARCH_API_KEY and GOOGLE_CSE_ID")
+
+    async def search(self, client: httpx.AsyncClient, query: str, limit: int) -> List[SearchHit]:
+        # The API returns at most 10 results per request
+        response = await client.get(self.endpoint, params={"key": self.api_key, "cx": self.engine_id, "q": query, "num": min(limit, 10)})
+        response.raise_for_status()
+        return [
+            SearchHit(url=item["link"], title=item.get("title", ""), snippet=item.get("snippet", ""))
+            for item in response.json().get("items", [])[:limit]
+        ]
+
+class SearxngSearchProvider(SearchProvider):
+    """A SearXNG instance's JSON API, e.g. a self-hosted one; the benchmarks' fixture server speaks the same format."""
+
+    name = "searxng"
+
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = (base_url or os.getenv("SEARXNG_URL", "")).rstrip("/")
+        if not self.base_url:
+            raise ValueError("SearxngSearchProvider needs SEARXNG_URL")
+
+    async def search(self, client: httpx.AsyncClient, query: str, limit: int) -> List[SearchHit]:
+        response = await client.get(f"{self.base_url}/search", params={"q": query, "format": "json"})
+        response.raise_for_status()
+        return [
+            SearchHit(url=item["url"], title=item.get("title", ""), snippet=item.get("content", ""))
+            for item in response.json().get("results", [])[:limit]
+        ]
+
+class HostRateLimiter:
+    """Per-host politeness: at most `max_concurrent` requests in flight and `min_interval` seconds between starts.
+
+    State is kept for the `max_hosts` most recently used hosts; older hosts
+    with nothing in flight are forgotten.
+    """
+
+    def __init__(self, max_concurrent: int = 2, min_interval: float = 0.25, max_hosts: int = 1024):
+        self.max_concurrent = max_concurrent
+        self.min_interval = min_interval
+        self.max_hosts = max_hosts
+        # host -> (in-flight semaphore, lock guarding the last start time, [last start, requests holding or awaiting a slot])
+        self._hosts: "OrderedDict[str, Tuple[asyncio.Semaphore, asyncio.Lock, List[float]]]" = OrderedDict()
+
+    def _slot(self, host: str) -> Tuple[asyncio.Semaphore, asyncio.Lock, List[float]]:
+        slot = self._hosts.get(host)
+        if slot is not None:
+            self._hosts.move_to_end(host)
+            return slot
+        slot = self._hosts[host] = (asyncio.Semaphore(self.max_concurrent), asyncio.Lock(), [0.0, 0])
+        if len(self._hosts) > self.max_hosts:
+            # Only idle hosts whose spacing has elapsed can go without loosening the limits
+            cutoff = time.monotonic() - self.min_interval
+            idle = [name for name, (_, _, state) in self._hosts.items() if state[1] == 0 and state[0] < cutoff]
+            for name in idle[:len(self._hosts) - self.max_hosts]:
+                del self._hosts[name]
+        return slot
+
+    async def run(self, host: str, request: Callable[[], Any]) -> Any:
+        semaphore, lock, state = self._slot(host)
+        state[1] += 1
+        try:
+            async with semaphore:
+                async with lock:
+                    wait = state[0] + self.min_interval - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    state[0] = time.monotonic()
+                return await request()
+        finally:
+            state[1] -= 1
+
+# Elements that never hold a page's main text
+_BOILERPLATE = ("script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg", "iframe")
+_WORD = re.compile(r"\w+")
+
+def _paragraphs_selectolax(html: str) -> List[str]:
+    from selectolax.lexbor import LexborHTMLParser
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(list(_BOILERPLATE))
+    root = tree.css_first("article") or tree.css_first("main") or tree.body
+    if root is None:
+        return []
+    return [node.text(separator=" ", strip=True) for node in root.css("p, li, h2, h3")]
+
+def _paragraphs_lxml(html: str) -> List[str]:
+    import lxml.html
+    tree = lxml.html.fromstring(html)
+    for node in tree.xpath("|".join(f"//{tag}" for tag in _BOILERPLATE)):
+        node.drop_tree()
+    roots = tree.xpath("//article") or tree.xpath("//main") or [tree]
+    return [" ".join(node.text_content().split()) for node in roots[0].xpath(".//p | .//li | .//h2 | .//h3")]
+
+def _paragraphs_bs4(html: str) -> List[str]:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    for node in soup(list(_BOILERPLATE)):
+        node.extract()
+    root = soup.find("article") or soup.find("main") or soup.body or soup
+    return [node.get_text(" ", strip=True) for node in root.find_all(["p", "li", "h2", "h3"])]
+
+_extractor: Optional[Tuple[str, Callable[[str], List[str]]]] = None
+
+def html_extractor() -> Tuple[str, Callable[[str], List[str]]]:
+    """Return the fastest available paragraph extractor: selectolax, then lxml, then BeautifulSoup."""
+    global _extractor
+    if _extractor is None:
+        for name, module, extract in (("selectolax", "selectolax.lexbor", _paragraphs_selectolax), ("lxml", "lxml.html", _paragraphs_lxml)):
+            try:
+                __import__(module)
+                _extractor = (name, extract)
+                break
+            except ImportError:
+                continue
+        else:
+            _extractor = ("bs4", _paragraphs_bs4)
+        logger.info(f"Extracting research pages with {_extractor[0]}")
+    return _extractor
+
+def extract_snippet(html: str, query: str, max_chars: int = 600, min_paragraph_chars: int = 40) -> str:
+    """The page's main text cut down to `max_chars`: the paragraphs sharing the most words with `query`, in page order."""
+    _, extract = html_extractor()
+    paragraphs = [text for text in extract(html) if len(text) >= min_paragraph_chars]
+    if not paragraphs:
+        return ""
+    terms = {word.lower() for word in _WORD.findall(query) if len(word) > 2}
+    ranked = sorted(
+        range(len(paragraphs)),
+        key=lambda i: (-len(terms & {word.lower() for word in _WORD.findall(paragraphs[i])}), i)
+    )
+    chosen, size = [], 0
+    for i in ranked:
+        if size and size + len(paragraphs[i]) > max_chars:
+            continue
+        chosen.append(i)
+        size += len(paragraphs[i]) + 1
+        if size >= max_chars:
+            break
+    return " ".join(paragraphs[i] for i in sorted(chosen))[:max_chars]
+
+class ResearchEngine:
+    """Searches a query, then fetches and extracts the result pages concurrently.
+
+    Pages are fetched over one pooled `httpx.AsyncClient` (keep-alive
+    connections are reused across runs), each bounded as a whole by
+    `fetch_timeout` (httpx's timeout only bounds each read, so a slow trickle
+    would outlive it) and the per-host `HostRateLimiter`. Bodies are streamed and reading stops after
+    `max_page_bytes`. Extraction runs in a worker thread so parsing
+    never blocks the event loop. A page that fails or times out falls back to
+    the search result's own snippet; the whole research step is bounded by
+    `total_timeout`. Every fetch is counted with `record_research_fetch`.
+    """
+
+    def __init__(
+        self,
+        provider: SearchProvider,
+        max_pages: int = 5,
+        fetch_timeout: float = 5.0,
+        total_timeout: float = 15.0,
+        max_connections: int = 20,
+        per_host_concurrency: int = 2,
+        per_host_interval: float = 0.25,
+        snippet_chars: int = 600,
+        max_page_bytes: int = 2_000_000
+    ):
+        self.provider = provider
+        self.max_pages = max_pages
+        self.fetch_timeout = fetch_timeout
+        self.total_timeout = total_timeout
+        self.max_connections = max_connections
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_interval = per_host_interval
+        self.snippet_chars = snippet_chars
+        self.max_page_bytes = max_page_bytes
+        self._client: Optional[httpx.AsyncClient] = None
+        self._limiter: Optional[HostRateLimiter] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def _pool(self) -> Tuple[httpx.AsyncClient, HostRateLimiter]:
+        # Connections and locks belong to an event loop; a new loop (e.g. another asyncio.run) gets a new pool
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            if self._client is not None:
+                try:
+                    await self._client.aclose()
+                except Exception as e:
+                    # Its connections may belong to a loop that is already closed
+                    logger.debug("Closing the previous research client failed: %s", e)
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.fetch_timeout),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                follow_redirects=True,
+                headers={"User-Agent": os.getenv("RESEARCH_USER_AGENT", "post-agent-research/1.0")}
+            )
+            self._limiter = HostRateLimiter(self.per_host_concurrency, self.per_host_interval)
+            self._loop = loop
+        return self._client, self._limiter
+
+    async def _read_page(self, client: httpx.AsyncClient, url: str) -> Optional[str]:
+        """Return the page's HTML, at most `max_page_bytes` of it, or None if it is not HTML."""
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            if "html" not in response.headers.get("content-type", "text/html"):
+                return None
+            chunks, size = [], 0
+            async for chunk in response.aiter_bytes():
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= self.max_page_bytes:
+                    break
+            return b"".join(chunks)[:self.max_page_bytes].decode(response.charset_encoding or "utf-8", errors="replace")
+
+    async def _fetch(self, client: httpx.AsyncClient, limiter: HostRateLimiter, hit: SearchHit, query: str) -> Dict[str, str]:
+        start = time.perf_counter()
+        host = urlsplit(hit.url).netloc
+        try:
+            html = await limiter.run(host, lambda: asyncio.wait_for(self._read_page(client, hit.url), self.fetch_timeout))
+            if html is None:
+                outcome, snippet = "skipped", ""
+            else:
+                snippet = await asyncio.to_thread(extract_snippet, html, query, self.snippet_chars)
+                outcome = "ok" if snippet else "empty"
+        except (httpx.TimeoutException, asyncio.TimeoutError):
+            outcome, snippet = "timeout", ""
+        except Exception as e:
+            logger.debug("Fetching %s failed: %s", hit.url, e)
+            outcome, snippet = "error", ""
+        record_research_fetch(outcome, time.perf_counter() - start)
+        return {"source": hit.url, "snippet": snippet or hit.snippet}
+
+    async def research(self, query: str) -> List[Dict[str, str]]:
+        """Return `{"source", "snippet"}` items for `query`, in search rank order; items with no text are dropped."""
+        client, limiter = await self._pool()
+        deadline = time.monotonic() + self.total_timeout
+        try:
+            hits = await asyncio.wait_for(self.provider.search(client, query, self.max_pages), self.total_timeout)
+        except Exception as e:
+            logger.warning(f"{self.provider.name} search for {query!r} failed: {str(e)}")
+            return []
+        tasks = [asyncio.create_task(self._fetch(client, limiter, hit, query)) for hit in hits]
+        if not tasks:
+            return []
+        done, pending = await asyncio.wait(tasks, timeout=max(deadline - time.monotonic(), 0))
+        for task in pending:
+            task.cancel()
+        if pending:
+            # Let the cancelled fetches unwind (and release their connections) before returning
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(f"Research for {query!r} hit RESEARCH_TOTAL_TIMEOUT; {len(pending)} of {len(tasks)} pages dropped")
+        items = []
+        for hit, task in zip(hits, tasks):
+            if task in done and not task.cancelled() and task.exception() is None:
+                items.append(task.result())
+            elif hit.snippet:
+                items.append({"source": hit.url, "snippet": hit.snippet})
+        return [item for item in items if item["snippet"]]
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+_research_engine: Optional[ResearchEngine] = None
+_research_engine_configured = False
+_research_engine_lock = threading.Lock()
+
+def _provider_from_env() -> Optional[SearchProvider]:
+    mode = os.getenv("SEARCH_PROVIDER", "auto").lower()
+    if mode == "auto":
+        if os.getenv("SEARXNG_URL"):
+            mode = "searxng"
+        elif os.getenv("GOOGLE_CSE_ID") and os.getenv("GOOGLE_SEARCH_API_KEY"):
+            mode = "google"
+        else:
+            mode = "none"
+    if mode == "google":
+        return GoogleSearchProvider()
+    if mode == "searxng":
+        return SearxngSearchProvider()
+    if mode != "none":
+        logger.warning(f"Unknown SEARCH_PROVIDER {mode}; web research is off")
+    return None
+
+def get_research_engine() -> Optional[ResearchEngine]:
+    """Return the process-wide research engine, or None when no search provider is configured.
+
+    SEARCH_PROVIDER=google uses Programmable Search, SEARCH_PROVIDER=searxng a
+    SearXNG instance at SEARXNG_URL; the default, auto, picks whichever is
+    configured.
+    """
+    global _research_engine, _research_engine_configured
+    with _research_engine_lock:
+        if not _research_engine_configured:
+            provider = _provider_from_env()
+            if provider is not None:
+                _research_engine = ResearchEngine(
+                    provider,
+                    max_pages=int(os.getenv("RESEARCH_MAX_PAGES", "5")),
+                    fetch_timeout=float(os.getenv("RESEARCH_FETCH_TIMEOUT", "5")),
+                    total_timeout=float(os.getenv("RESEARCH_TOTAL_TIMEOUT", "15")),
+                    max_connections=int(os.getenv("RESEARCH_MAX_CONNECTIONS", "20")),
+                    per_host_concurrency=int(os.getenv("RESEARCH_PER_HOST_CONCURRENCY", "2")),
+                    per_host_interval=float(os.getenv("RESEARCH_PER_HOST_INTERVAL", "0.25")),
+                    snippet_chars=int(os.getenv("RESEARCH_SNIPPET_CHARS", "600")),
+                    max_page_bytes=int(os.getenv("RESEARCH_MAX_PAGE_BYTES", "2000000"))
+                )
+                logger.info(f"Web research through {provider.name}")
+            _research_engine_configured = True
+        return _research_engine
+
+def set_research_engine(engine: Optional[ResearchEngine]) -> None:
+    """Replace the process-wide research engine; None makes the research agent fall back to the LLM."""
+    global _research_engine, _research_engine_configured
+    with _research_engine_lock:
+        _research_engine = engine
+        _research_engine_configured = True
+
+async def close_research_engine() -> None:
+    """Close the pooled HTTP connections of the process-wide engine."""
+    if _research_engine is not None:
+        await _research_engine.close()
@@ -0,0 +1,129 @@
+from types import UnionType
+from typing import Any, Type, TypeVar, Union, get_args, get_origin
+from langchain_core.messages import BaseMessage
+from pydantic import BaseModel, ValidationError
+from .json_repair import loads
+from .llm_cache import discard_cached_response
+from .metrics import record_parse_outcome
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# "native" asks the model for schema-constrained JSON; "prompt" only relies on the prompt's JSON instructions
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "native").lower()
+# with_structured_output method; json_mode keeps the raw tokens as JSON text, so body and CTA still stream
+STRUCTURED_OUTPUT_METHOD = os.getenv("STRUCTURED_OUTPUT_METHOD", "json_mode")
+
+M = TypeVar("M", bound=BaseModel)
+
+def _unwrap_optional(annotation: Any) -> Any:
+    """`X` for `Optional[X]` / `X | None`, else the annotation itself."""
+    if get_origin(annotation) in (Union, UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+def _coerce(value: Any, annotation: Any) -> Any:
+    """Convert `value` to the shape `annotation` expects, where the conversion is unambiguous."""
+    annotation = _unwrap_optional(annotation)
+    if value is None:
+        return value
+    if get_origin(annotation) is list:
+        item = (get_args(annotation) or (Any,))[0]
+        items = value if isinstance(value, list) else [value]
+        return [_coerce(v, item) for v in items]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return coerce_to_schema(value, annotation)
+    if annotation is str:
+        if isinstance(value, list):
+            return ", ".join(str(v) for v in value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+    if annotation is int:
+        if isinstance(value, str):
+            match = re.search(r"-?\d+", value)
+            return int(match.group(0)) if match else value
+        if isinstance(value, float):
+            return round(value)
+    return value
+
+def coerce_to_schema(data: Any, schema: Type[BaseModel]) -> Any:
+    """Fix the shape mismatches models commonly make before validating `data` against `schema`.
+
+    Lists given for string fields are joined ("professional, friendly"),
+    numbers given for strings are stringified, a single value given for a list
+    field is wrapped, scores like "8/10" become 8, and nested models are
+    coerced recursively. A one-item list around the object is unwrapped, and a
+    bare list is taken as the value of the schema's only list field.
+    """
+    if isinstance(data, list):
+        list_fields = [name for name, field in schema.model_fields.items() if get_origin(_unwrap_optional(field.annotation)) is list]
+        if len(data) == 1 and isinstance(data[0], dict):
+            data = data[0]
+        elif len(list_fields) == 1:
+            data = {list_fields[0]: data}
+    if not isinstance(data, dict):
+        return data
+    coerced = dict(data)
+    for name, field in schema.model_fields.items():
+        if name in coerced:
+            coerced[name] = _coerce(coerced[name], field.annotation)
+    return coerced
+
+def _text_of(output: Any) -> str:
+    if isinstance(output, BaseMessage):
+        content = output.content
+        if isinstance(content, list):
+            return "".join(part if isinstance(part, str) else part.get("text", "") for part in content)
+        return content
+    return output if isinstance(output, str) else str(output)
+
+def _validate(data: Any, schema: Type[M]) -> M:
+    return schema.model_validate(coerce_to_schema(data, schema))
+
+def parse_output(output: Any, schema: Type[M], agent_name: str) -> M:
+    """Turn a chain's output into `schema`, repairing malformed JSON instead of regenerating.
+
+    `output` is the result of `with_structured_output(..., include_raw=True)`
+    (a dict with "raw", "parsed" and "parsing_error"), or a plain model
+    message or text. Each call is counted with `record_parse_outcome` as
+    "native" (schema-constrained output validated as is), "parsed" (clean
+    JSON), "repaired" (JSON or field shapes had to be fixed) or "failed".
+    Raises ValueError if nothing valid can be recovered, after evicting the
+    response from the LLM response cache.
+    """
+    if isinstance(output, dict) and "raw" in output and "parsing_error" in output:
+        parsed = output.get("parsed")
+        if isinstance(parsed, schema) and output.get("parsing_error") is None:
+            record_parse_outcome(agent_name, "native")
+            return parsed
+        logger.debug("%s structured output did not validate (%s); parsing raw text", agent_name, output.get('parsing_error'))
+        output = output["raw"]
+    if isinstance(output, schema):
+        record_parse_outcome(agent_name, "native")
+        return output
+
+    text = _text_of(output)
+    try:
+        data, repaired = loads(text)
+        try:
+            result = schema.model_validate(data)
+        except ValidationError:
+            result = _validate(data, schema)
+            repaired = True
+    except (ValueError, ValidationError) as e:
+        record_parse_outcome(agent_name, "failed")
+        logger.error(f"{agent_name} output could not be parsed as {schema.__name__}: {e}")
+        logger.debug("Raw output: %s", text)
+        # Don't let the response cache serve the same broken reply again
+        if discard_cached_response(text):
+            logger.info(f"Evicted unparseable {agent_name} response from the LLM cache")
+        raise ValueError(f"Invalid {schema.__name__} output: {e}") from e
+
+    if repaired:
+        logger.warning(f"Repaired malformed {schema.__name__} output from {agent_name}")
+    record_parse_outcome(agent_name, "repaired" if repaired else "parsed")
+    return result
@@ -0,0 +1,105 @@
+from typing import Any, Callable, Dict, Optional
+from pydantic import BaseModel, Field
+from dotenv import dotenv_values, find_dotenv
+from .llm_factory import LLMConfig, get_shared_llm
+import asyncio
+import threading
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# The .env settings a reload re-reads; every other variable (API keys included) keeps its startup value
+RELOADABLE_ENV_VARS = ("LLM_MODEL", "LLM_TEMPERATURE", "LLM_TOP_P", "LLM_TOP_K", "WORKFLOW_MODE", "SECTION_MODE")
+
+class WorkflowConfig(BaseModel):
+    """Settings a compiled workflow depends on; a reload rebuilds only when they change."""
+    llm: LLMConfig = Field(default_factory=LLMConfig, description="Model settings shared by the agents")
+    mode: str = Field(default="linear", description="Graph shape: linear or parallel")
+    section_mode: str = Field(default="separate", description="Hook, body and CTA in separate calls or one fused call")
+
+    model_config = {"frozen": True}
+
+    @classmethod
+    def from_env(cls) -> "WorkflowConfig":
+        """Build a config from the LLM_*, WORKFLOW_MODE and SECTION_MODE environment variables."""
+        return cls(
+            llm=LLMConfig.from_env(),
+            mode=os.getenv("WORKFLOW_MODE", "linear"),
+            section_mode=os.getenv("SECTION_MODE", "separate")
+        )
+
+def reload_env() -> Dict[str, str]:
+    """Copy the RELOADABLE_ENV_VARS set in .env into the environment and return them."""
+    values = {name: value for name, value in dotenv_values(find_dotenv()).items() if name in RELOADABLE_ENV_VARS and value is not None}
+    os.environ.update(values)
+    return values
+
+class WorkflowRegistry:
+    """Holds the compiled workflow so requests reuse it instead of rebuilding per call.
+
+    The compiled graph is swapped atomically on reload; requests that already
+    fetched the previous graph finish on it undisturbed.
+    """
+
+    def __init__(self, factory: Callable[..., Any], config_loader: Callable[[], WorkflowConfig] = WorkflowConfig.from_env):
+        self._factory = factory
+        self._config_loader = config_loader
+        self._workflow = None
+        self._config: Optional[WorkflowConfig] = None
+        self._version = 0
+        self._build_lock = threading.RLock()
+        self._reload_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def config(self) -> Optional[WorkflowConfig]:
+        """Config the current workflow was built with."""
+        return self._config
+
+    @property
+    def version(self) -> int:
+        """Number of times the workflow has been built."""
+        return self._version
+
+    def _build(self, config: WorkflowConfig) -> None:
+        """Compile a workflow for the config and publish it."""
+        with self._build_lock:
+            llm = get_shared_llm(config.llm)
+            workflow = self._factory(llm, mode=config.mode, section_mode=config.section_mode)
+            self._workflow, self._config = workflow, config
+            self._version += 1
+            logger.info(f"Compiled workflow v{self._version} for model: {config.llm.model} ({config.mode}, {config.section_mode} sections)")
+
+    async def start(self) -> None:
+        """Compile the workflow once at process start."""
+        if self._workflow is None:
+            await asyncio.to_thread(self._build, self._config_loader())
+
+    def get(self) -> Any:
+        """Return the current compiled workflow, building it on first use."""
+        workflow = self._workflow
+        if workflow is None:
+            with self._build_lock:
+                if self._workflow is None:
+                    self._build(self._config_loader())
+            workflow = self._workflow
+        return workflow
+
+    async def reload(self, config: Optional[WorkflowConfig] = None, force: bool = False) -> bool:
+        """Rebuild the workflow if the config changed (or when forced).
+
+        Without an explicit config the workflow settings in .env
+        (RELOADABLE_ENV_VARS) are re-read so edits take effect without
+        restarting the process. Returns True if a new workflow was published.
+        """
+        if self._reload_lock is None:
+            self._reload_lock = asyncio.Lock()
+        async with self._reload_lock:
+            if config is None:
+                reload_env()
+                config = self._config_loader()
+            if not force and config == self._config:
+                logger.info("Workflow config unchanged, skipping reload")
+                return False
+            await asyncio.to_thread(self._build, config)
+            return True
@@ -0,0 +1,78 @@
+from typing import Any, List
+import pytest
+
+SAMPLE_IDENTITY_SPEC = {
+    "creator": "Sample Creator",
+    "promise": "Practical lessons for bootstrapped founders",
+    "voice": {"tone": ["conversational", "direct"], "person": "first", "avoid": ["jargon"]},
+    "visual": {"primary_color": "#1a73e8", "background": "white", "font_family": "Inter", "icon": None},
+    "pillars_ranked": ["Bootstrapping Business", "Founder Mindset & Leadership"],
+    "signature_stories": ["Shipping the first product in 30 days"],
+    "hook_templates": ["Nobody tells you this about {topic}:", "{n} lessons I learned about {topic}"],
+    "cta_style": "Ask one specific question"
+}
+
+class FakeCursor:
+    """DB-API cursor answering the identity query and health checks."""
+
+    def __init__(self, connection: "FakeConnection"):
+        self._connection = connection
+        self._row = None
+
+    def execute(self, sql: str, params: Any = None) -> None:
+        if self._connection.broken:
+            raise RuntimeError("server closed the connection unexpectedly")
+        self._connection.queries.append(sql)
+        self._row = (self._connection.database.identity_id, self._connection.database.identity_spec) if "identity_spec" in sql else (1,)
+
+    def fetchone(self) -> Any:
+        return self._row
+
+    def close(self) -> None:
+        pass
+
+class FakeConnection:
+    """DB-API connection stub; a `broken` one fails every query, like one whose server went away."""
+
+    def __init__(self, database: "FakeDatabase", broken: bool = False):
+        self.database = database
+        self.broken = broken
+        self.queries: List[str] = []
+        self.closed = 0
+        self.autocommit = False
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self)
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        if self.broken:
+            raise RuntimeError("server closed the connection unexpectedly")
+
+    def close(self) -> None:
+        self.closed = 1
+
+class FakeDatabase:
+    """Stand-in for Postgres: `connect` is the pool's connect callable and every connection is kept."""
+
+    def __init__(self):
+        self.connections: List[FakeConnection] = []
+        self.identity_id = 1
+        self.identity_spec = dict(SAMPLE_IDENTITY_SPEC)
+        self.broken_connections = 0
+
+    def connect(self) -> FakeConnection:
+        broken = self.broken_connections > 0
+        self.broken_connections -= broken
+        conn = FakeConnection(self, broken=broken)
+        self.connections.append(conn)
+        return conn
+
+    def identity_queries(self) -> int:
+        return sum("identity_spec" in sql for conn in self.connections for sql in conn.queries)
+
+@pytest.fixture
+def fake_db() -> FakeDatabase:
+    return FakeDatabase()
@@ -0,0 +1,146 @@
+import json
+from typing import Any, Dict, List
+import pytest
+
+from src.checkpoints import (
+    CheckpointStore, CheckpointWriter, DeltaEncoder, JsonlCheckpointStore,
+    diff_state, iter_states, load_payload, load_run_history, materialize
+)
+
+class MemoryStore(CheckpointStore):
+    """Store keeping each run's lines in memory; `fail_next` makes that many appends raise."""
+
+    def __init__(self):
+        self.lines: Dict[str, List[str]] = {}
+        self.fail_next = 0
+
+    def append(self, run_id: str, line: str) -> None:
+        if self.fail_next:
+            self.fail_next -= 1
+            raise OSError("disk full")
+        self.lines.setdefault(run_id, []).append(line)
+
+    def read(self, run_id: str) -> List[Dict[str, Any]]:
+        return [json.loads(line) for line in self.lines.get(run_id, [])]
+
+def states() -> List[Dict[str, Any]]:
+    """Snapshots of one run, the way the nodes change them."""
+    snapshots = [{"current_topic": None, "messages": [], "research_data": []}]
+    def step(**changes):
+        snapshots.append({**snapshots[-1], **changes})
+    step(current_topic="pricing", messages=[{"role": "system", "content": "topic"}])
+    step(research_data=[{"source": "a", "snippet": "b"}], messages=snapshots[-1]["messages"] + [{"role": "assistant", "content": "research"}])
+    step(hook_text="Nobody tells you this about pricing:")
+    step(body_text="Raise prices.", messages=[{"role": "system", "content": "summary"}])
+    step(cta_text="What would you charge?")
+    snapshots.append({key: value for key, value in snapshots[-1].items() if key != "hook_text"})
+    step(qa_score=8, messages=snapshots[-1]["messages"] + [{"role": "assistant", "content": "qa"}])
+    return snapshots
+
+def checkpoint(state: Dict[str, Any], i: int) -> Dict[str, Any]:
+    return {"timestamp": f"t{i}", "agent_name": "agent", "phase": "output", "state": state}
+
+def test_diff_state():
+    previous = {"a": 1, "messages": [1, 2], "b": [1, 2], "gone": True}
+    current = {"a": 2, "messages": [1, 2, 3], "b": [9], "new": None}
+    changed, appended, removed = diff_state(previous, current)
+    assert changed == {"a": 2, "b": [9], "new": None}
+    assert appended == {"messages": [3]}
+    assert removed == ["gone"]
+    assert diff_state(current, dict(current)) == ({}, {}, [])
+
+@pytest.mark.parametrize("snapshot_interval", [1, 3, 8])
+def test_delta_records_round_trip(snapshot_interval):
+    snapshots = states()
+    encoder = DeltaEncoder(snapshot_interval)
+    records = []
+    for i, state in enumerate(snapshots):
+        record = encoder.encode(checkpoint(state, i))
+        encoder.commit(checkpoint(state, i))
+        records.append(json.loads(json.dumps(record)))
+    assert [record["kind"] == "full" for record in records] == [i % snapshot_interval == 0 for i in range(len(snapshots))]
+    assert [state for _, state in iter_states(records)] == snapshots
+    for i, state in enumerate(snapshots):
+        assert materialize(records, step=i) == state
+    assert materialize(records) == snapshots[-1]
+
+def test_delta_records_are_smaller():
+    snapshots = states()
+    encoder = DeltaEncoder(8)
+    for i, state in enumerate(snapshots[:-1]):
+        encoder.commit(checkpoint(state, i))
+    delta = encoder.encode(checkpoint(snapshots[-1], len(snapshots) - 1))
+    assert delta["kind"] == "delta"
+    assert set(delta) >= {"set", "append"} and "state" not in delta
+    assert delta["append"] == {"messages": [{"role": "assistant", "content": "qa"}]}
+
+def test_delta_without_full_snapshot_raises():
+    with pytest.raises(ValueError):
+        list(iter_states([{"kind": "delta", "step": 3, "set": {"a": 1}}]))
+    with pytest.raises(ValueError):
+        materialize([])
+
+def write(writer: CheckpointWriter, run_id: str, snapshots: List[Dict[str, Any]]) -> None:
+    for i, state in enumerate(snapshots):
+        writer.submit(run_id, checkpoint(state, i))
+    writer.flush()
+
+def test_writer_round_trip_with_payloads(tmp_path):
+    store = JsonlCheckpointStore(str(tmp_path))
+    writer = CheckpointWriter(store, snapshot_interval=4)
+    snapshots = states()
+    writer.submit("run", checkpoint(snapshots[0], 0))
+    ref = writer.spill("run", "x" * 5000)
+    write(writer, "run", snapshots[1:])
+    writer.close()
+    records = store.read("run")
+    # Payload records sit in the file but are not steps of the state
+    assert [record["kind"] for record in records].count("payload") == 1
+    assert load_payload("run", ref, store) == "x" * 5000
+    assert load_payload("run", "missing", store) is None
+    history = load_run_history("run", store)
+    assert [entry["state"] for entry in history] == snapshots
+    assert [entry["step"] for entry in history] == list(range(len(snapshots)))
+    assert history[0]["timestamp"] == "t0"
+
+def test_failed_write_does_not_break_the_delta_chain():
+    store = MemoryStore()
+    writer = CheckpointWriter(store, snapshot_interval=100)
+    snapshots = states()
+    write(writer, "run", snapshots[:3])
+    store.fail_next = 1
+    write(writer, "run", [snapshots[3]])
+    write(writer, "run", snapshots[4:])
+    writer.close()
+    records = store.read("run")
+    # The lost record's step is reused and the next record is a full snapshot
+    assert [record["step"] for record in records] == list(range(len(snapshots) - 1))
+    assert records[3]["kind"] == "full"
+    assert [state for _, state in iter_states(records)] == snapshots[:3] + snapshots[4:]
+
+def test_evicted_run_continues_its_step_numbers():
+    store = MemoryStore()
+    writer = CheckpointWriter(store, snapshot_interval=100, max_open_runs=1)
+    snapshots = states()
+    # Interleaved runs keep evicting each other's encoder
+    for i, state in enumerate(snapshots):
+        writer.submit("a", checkpoint(state, i))
+        writer.submit("b", checkpoint(state, i))
+    writer.close()
+    for run_id in ("a", "b"):
+        records = store.read(run_id)
+        assert [record["step"] for record in records] == list(range(len(snapshots)))
+        for i, state in enumerate(snapshots):
+            assert materialize(records, step=i) == state
+
+def test_end_run_then_resume_continues_numbering():
+    store = MemoryStore()
+    writer = CheckpointWriter(store)
+    snapshots = states()
+    write(writer, "run", snapshots[:2])
+    writer.end_run("run")
+    write(writer, "run", snapshots[2:])
+    writer.close()
+    assert [record["step"] for record in store.read("run")] == list(range(len(snapshots)))
+    assert store.next_step("run") == len(snapshots)
+    assert store.next_step("other") == 0
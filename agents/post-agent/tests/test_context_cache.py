@@ -0,0 +1,71 @@
+import asyncio
+import time
+from typing import List
+import pytest
+
+from src.context_cache import ContextCache
+
+class RecordingBackend:
+    """Context cache backend that hands out a new handle per upload and records deletions."""
+
+    def __init__(self):
+        self.created: List[str] = []
+        self.deleted: List[str] = []
+
+    def create(self, model: str, system_instruction: str, ttl_seconds: float, display_name: str) -> str:
+        handle = f"cachedContents/{len(self.created)}"
+        self.created.append(handle)
+        return handle
+
+    def delete(self, handle: str) -> None:
+        self.deleted.append(handle)
+
+    def supports(self, llm) -> bool:
+        return True
+
+    def bind(self, llm, handle: str):
+        return llm
+
+class Model:
+    model = "gemini-test"
+
+def lookup(cache: ContextCache, block: str = "x" * 100) -> str:
+    return asyncio.run(cache.handle_for("writer", Model(), 1, "v1", lambda: block))
+
+def test_reuses_handle_until_renewal(monkeypatch):
+    backend = RecordingBackend()
+    cache = ContextCache(backend, ttl_seconds=3600)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    assert lookup(cache) == lookup(cache) == "cachedContents/0"
+    # Within the last minute of the TTL the handle is renewed and the old one deleted
+    now += 3600 - 30
+    assert lookup(cache) == "cachedContents/1"
+    assert backend.deleted == ["cachedContents/0"]
+    assert cache.stats()["totals"] == {"hits": 1, "misses": 2, "skipped": 0, "failed": 0}
+
+@pytest.mark.parametrize("ttl", [10, 30])
+def test_short_ttl_is_reused(monkeypatch, ttl):
+    backend = RecordingBackend()
+    cache = ContextCache(backend, ttl_seconds=ttl)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    lookup(cache)
+    now += ttl / 2
+    assert lookup(cache) == "cachedContents/0"
+    assert len(backend.created) == 1
+
+def test_block_below_min_chars_is_sent_inline():
+    backend = RecordingBackend()
+    cache = ContextCache(backend, min_chars=4096)
+    assert lookup(cache, "x" * 600) is None
+    assert backend.created == []
+    assert cache.stats()["totals"]["skipped"] == 1
+
+def test_invalidate_deletes_handles():
+    backend = RecordingBackend()
+    cache = ContextCache(backend)
+    lookup(cache)
+    cache.invalidate(1)
+    assert backend.deleted == ["cachedContents/0"]
+    assert cache.stats()["handles"] == 0
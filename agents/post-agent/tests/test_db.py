@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+
+from src.db import ConnectionPool, PoolTimeout
+
+def test_reuses_idle_connection(fake_db):
+    pool = ConnectionPool(fake_db.connect, min_size=1, max_size=4)
+    pool.open()
+    for _ in range(5):
+        assert asyncio.run(pool.fetchone("SELECT 1")) == (1,)
+    assert len(fake_db.connections) == 1
+    assert pool.stats()["connections_created"] == 1
+    assert pool.stats()["acquisitions"] == 5
+    pool.close()
+
+def test_fetchone_returns_identity_row(fake_db):
+    pool = ConnectionPool(fake_db.connect)
+    assert asyncio.run(pool.fetchone("SELECT id, spec FROM identity_spec")) == (1, fake_db.identity_spec)
+    pool.close()
+
+def test_grows_up_to_max_size_then_times_out(fake_db):
+    pool = ConnectionPool(fake_db.connect, min_size=0, max_size=2, acquire_timeout=0.05)
+    with pool.connection() as first, pool.connection() as second:
+        assert first is not second
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+    assert len(fake_db.connections) == 2
+    assert pool.stats()["timeouts"] == 1
+    assert pool.stats()["idle"] == 2
+    pool.close()
+
+def test_replaces_connection_that_fails_health_check(fake_db):
+    fake_db.broken_connections = 1
+    pool = ConnectionPool(fake_db.connect, min_size=1, max_size=2, health_check_interval=0.0)
+    pool.open()
+    # The idle connection is pinged before reuse, found broken and replaced
+    with pool.connection() as conn:
+        assert conn is fake_db.connections[1]
+    assert fake_db.connections[0].closed
+    stats = pool.stats()
+    assert stats["health_check_failures"] == 1
+    assert stats["connections_discarded"] == 1
+    assert stats["size"] == 1
+    pool.close()
+
+def test_check_health(fake_db):
+    assert asyncio.run(ConnectionPool(fake_db.connect).check_health()) is True
+    fake_db.broken_connections = 1
+    assert asyncio.run(ConnectionPool(fake_db.connect).check_health()) is False
+
+def test_close_closes_idle_connections(fake_db):
+    pool = ConnectionPool(fake_db.connect, min_size=2, max_size=2)
+    pool.open()
+    pool.close()
+    assert all(conn.closed for conn in fake_db.connections)
+    with pytest.raises(RuntimeError):
+        with pool.connection():
+            pass
@@ -0,0 +1,151 @@
+import asyncio
+import socket
+import time
+from types import SimpleNamespace
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from src.agents.identity_agent import IdentityAgent
+from src.db import ConnectionPool, set_pool
+from src.identity_cache import NOTIFY_CHANNEL, IdentityChangeListener, IdentitySpecCache, identity_cache, install_notify_trigger
+
+@pytest.fixture
+def agent(fake_db):
+    set_pool(ConnectionPool(fake_db.connect, min_size=1, max_size=2))
+    identity_cache.invalidate()
+    hits, misses = identity_cache.hits, identity_cache.misses
+    identity_cache.hits = identity_cache.misses = 0
+    yield IdentityAgent(llm=FakeListChatModel(responses=["{}"]))
+    set_pool(None)
+    identity_cache.invalidate()
+    identity_cache.hits, identity_cache.misses = hits, misses
+
+def run(agent):
+    return asyncio.run(agent.run({"messages": []}))
+
+def test_miss_loads_from_database(agent, fake_db):
+    result = run(agent)
+    assert result["identity_id"] == 1
+    assert result["identity_spec"].creator == fake_db.identity_spec["creator"]
+    assert result["identity_version"].startswith("1:")
+    assert fake_db.identity_queries() == 1
+    assert (identity_cache.hits, identity_cache.misses) == (0, 1)
+
+def test_hit_skips_database(agent, fake_db):
+    first = run(agent)
+    second = run(agent)
+    assert second["identity_spec"] is first["identity_spec"]
+    assert second["identity_version"] == first["identity_version"]
+    assert fake_db.identity_queries() == 1
+    assert (identity_cache.hits, identity_cache.misses) == (1, 1)
+
+def test_invalidate_forces_reload(agent, fake_db):
+    first = run(agent)
+    notified = []
+    listener = notified.append
+    identity_cache.add_listener(listener)
+    try:
+        fake_db.identity_spec = {**fake_db.identity_spec, "promise": "Changed promise"}
+        identity_cache.invalidate(first["identity_id"])
+    finally:
+        identity_cache.remove_listener(listener)
+    second = run(agent)
+    assert notified == [1]
+    assert second["identity_spec"].promise == "Changed promise"
+    assert second["identity_version"] != first["identity_version"]
+    assert fake_db.identity_queries() == 2
+    assert (identity_cache.hits, identity_cache.misses) == (0, 2)
+
+def test_expired_entry_is_reloaded(agent, fake_db, monkeypatch):
+    monkeypatch.setattr(identity_cache, "ttl_seconds", 0.0)
+    first = run(agent)
+    assert identity_cache.version(first["identity_id"]) is None
+    run(agent)
+    assert fake_db.identity_queries() == 2
+    assert identity_cache.misses == 2
+
+def test_load_racing_an_invalidation_is_not_cached():
+    cache = IdentitySpecCache()
+    loads = []
+
+    async def loader():
+        loads.append(len(loads))
+        # A NOTIFY arrives while the row is being read
+        if len(loads) == 1:
+            cache.invalidate(1)
+        return 1, f"spec {len(loads)}"
+
+    async def scenario():
+        first = await cache.get_or_load_active(loader)
+        second = await cache.get_or_load_active(loader)
+        third = await cache.get_or_load_active(loader)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    # The first load is served but not cached, so the next call reads the row again
+    assert first == (1, "spec 1")
+    assert second == third == (1, "spec 2")
+    assert len(loads) == 2
+
+def test_version_expires_with_the_entry():
+    cache = IdentitySpecCache(ttl_seconds=0.05)
+    spec = SimpleNamespace(model_dump_json=lambda: '{"creator": "x"}')
+    cache.put(1, spec)
+    assert cache.version(1).startswith("1:")
+    time.sleep(0.06)
+    assert cache.version(1) is None
+    assert cache.get(1) is None
+
+def test_install_notify_trigger(fake_db):
+    install_notify_trigger(fake_db.connect)
+    conn = fake_db.connections[0]
+    assert "CREATE TRIGGER identity_spec_changed" in conn.queries[0]
+    assert conn.closed
+
+class NotifyingConnection:
+    """LISTEN connection whose notifications arrive over a socket, like psycopg2's."""
+
+    def __init__(self):
+        self._socket, self.server = socket.socketpair()
+        self.notifies = []
+        self.queries = []
+        self.autocommit = False
+        self.closed = 0
+
+    def fileno(self):
+        return self._socket.fileno()
+
+    def cursor(self):
+        return SimpleNamespace(execute=self.queries.append)
+
+    def poll(self):
+        for payload in self._socket.recv(1024).decode().split():
+            self.notifies.append(SimpleNamespace(payload=payload))
+
+    def close(self):
+        self.closed = 1
+        self._socket.close()
+        self.server.close()
+
+def test_listener_invalidates_on_notify():
+    cache = IdentitySpecCache()
+    conn = NotifyingConnection()
+    invalidated = []
+    cache.add_listener(invalidated.append)
+    listener = IdentityChangeListener(cache, lambda: conn, poll_interval=0.05)
+    listener.start()
+    try:
+        deadline = time.monotonic() + 2
+        while not conn.queries and time.monotonic() < deadline:
+            time.sleep(0.01)
+        cache.put(7, "spec")
+        conn.server.sendall(b"7 ")
+        while 7 not in invalidated and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        listener.stop()
+    assert conn.queries == [f"LISTEN {NOTIFY_CHANNEL}"]
+    # Everything is dropped on (re)connect, then the notified row
+    assert invalidated[:2] == [None, 7]
+    assert cache.get(7) is None
+    assert conn.closed
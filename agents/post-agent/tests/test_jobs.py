@@ -0,0 +1,127 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+import pytest
+
+from src.jobs import JobQueue, QueueFull, QueueStopped
+
+class Runner:
+    """Job runner that records the topics it ran; each run waits for `release` to be set."""
+
+    def __init__(self):
+        self.started: List[Optional[str]] = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, topic: Optional[str]) -> Dict[str, Any]:
+        self.started.append(topic)
+        await self.release.wait()
+        if topic == "boom":
+            raise RuntimeError("generation failed")
+        return {"text": f"post about {topic}"}
+
+async def until(condition, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.005)
+
+def test_runs_highest_priority_first():
+    async def scenario():
+        runner = Runner()
+        runner.release.set()
+        queue = JobQueue(runner, workers=1)
+        # Queued before the worker gets a chance to run
+        jobs = [queue.submit(topic, priority) for topic, priority in [("low", 0), ("high", 5), ("low2", 0), ("mid", 2)]]
+        queue.start()
+        for job in jobs:
+            await queue.wait(job.job_id, timeout=2)
+        await queue.stop()
+        return runner.started
+
+    assert asyncio.run(scenario()) == ["high", "mid", "low", "low2"]
+
+def test_poll_status_until_finished():
+    async def scenario():
+        runner = Runner()
+        queue = JobQueue(runner, workers=1)
+        job = queue.submit("pricing")
+        assert queue.get(job.job_id).status == "queued"
+        await until(lambda: queue.get(job.job_id).status == "running")
+        assert queue.get(job.job_id).started_at is not None
+        # A long poll that times out returns the job as it is
+        assert (await queue.wait(job.job_id, timeout=0.01)).status == "running"
+        runner.release.set()
+        finished = await queue.wait(job.job_id, timeout=2)
+        failed = queue.submit("boom")
+        await queue.wait(failed.job_id, timeout=2)
+        stats = queue.stats()
+        await queue.stop()
+        return finished, failed, stats
+
+    finished, failed, stats = asyncio.run(scenario())
+    assert finished.status == "succeeded"
+    assert finished.result == {"text": "post about pricing"}
+    assert failed.status == "failed" and failed.error == "generation failed"
+    assert stats["jobs"]["succeeded"] == 1 and stats["jobs"]["failed"] == 1
+
+def test_cancel_queued_job():
+    async def scenario():
+        runner = Runner()
+        queue = JobQueue(runner, workers=1, max_queue_size=2)
+        blocking = queue.submit("first")
+        await until(lambda: runner.started == ["first"])
+        queued = queue.submit("second")
+        queue.submit("third")
+        with pytest.raises(QueueFull):
+            queue.submit("fourth")
+        queue.cancel(queued.job_id)
+        # The cancelled job no longer counts against the queue size
+        queue.submit("fourth")
+        runner.release.set()
+        await queue.wait(blocking.job_id, timeout=2)
+        await until(lambda: len(runner.started) == 3)
+        await queue.stop()
+        return queued, runner.started
+
+    queued, started = asyncio.run(scenario())
+    assert queued.status == "cancelled"
+    assert started == ["first", "third", "fourth"]
+
+def test_cancel_running_job():
+    async def scenario():
+        runner = Runner()
+        queue = JobQueue(runner, workers=1)
+        running = queue.submit("first")
+        await until(lambda: queue.get(running.job_id).status == "running")
+        queue.cancel(running.job_id)
+        cancelled = await queue.wait(running.job_id, timeout=2)
+        # The worker is free for the next job
+        runner.release.set()
+        following = queue.submit("second")
+        await queue.wait(following.job_id, timeout=2)
+        await queue.stop()
+        return cancelled, following
+
+    cancelled, following = asyncio.run(scenario())
+    assert cancelled.status == "cancelled"
+    assert following.status == "succeeded"
+
+def test_submit_after_stop_raises():
+    async def scenario():
+        runner = Runner()
+        queue = JobQueue(runner, workers=1)
+        job = queue.submit("first")
+        await until(lambda: runner.started)
+        await queue.stop()
+        with pytest.raises(QueueStopped):
+            queue.submit("late")
+        # Restarting the queue accepts jobs again
+        queue.start()
+        runner.release.set()
+        again = queue.submit("again")
+        await queue.wait(again.job_id, timeout=2)
+        await queue.stop()
+        return job, again
+
+    job, again = asyncio.run(scenario())
+    assert job.status == "cancelled" and job.error == "Job queue stopped"
+    assert again.status == "succeeded"
@@ -0,0 +1,67 @@
+import json
+import pytest
+
+from src.json_repair import loads, repair_json
+
+@pytest.mark.parametrize("text, expected", [
+    # Code fences and surrounding prose
+    ('```json\n{"hook_text": "Hi"}\n```', {"hook_text": "Hi"}),
+    ('Here is the hook: {"hook_text": "Hi"} Hope it helps!', {"hook_text": "Hi"}),
+    # Single-quoted strings, including apostrophes and escaped quotes
+    ("{'hook_text': 'Hi'}", {"hook_text": "Hi"}),
+    ("{'hook_text': 'It's day one'}", {"hook_text": "It's day one"}),
+    ("{'a': 'it\\'s', 'b': True}", {"a": "it's", "b": True}),
+    # Unescaped quotes and raw newlines inside strings
+    ('{"hook_text": "The "one" rule"}', {"hook_text": 'The "one" rule'}),
+    ('{"hook_text": "Why "growth", really?"}', {"hook_text": 'Why "growth", really?'}),
+    ('{"items": ["Say "hi", then", "leave"]}', {"items": ['Say "hi", then', "leave"]}),
+    ('{"body_text": "Line one\nLine two\tend"}', {"body_text": "Line one\nLine two\tend"}),
+    # Python literals
+    ('{"a": True, "b": False, "c": None}', {"a": True, "b": False, "c": None}),
+    # Trailing commas
+    ('{"key_points": ["a", "b",], "tone": "direct",}', {"key_points": ["a", "b"], "tone": "direct"}),
+    # Truncated output: open strings and containers are closed, a dangling key or comma dropped
+    ('{"body_text": "Most founders wa', {"body_text": "Most founders wa"}),
+    ('{"items": [{"source": "a", "snippet": "b"}', {"items": [{"source": "a", "snippet": "b"}]}),
+    ('{"hook_text": "Hi", "tone"', {"hook_text": "Hi"}),
+    ('{"hook_text": "Hi", "tone":', {"hook_text": "Hi", "tone": None}),
+    ('{"hook_text": "Hi",', {"hook_text": "Hi"}),
+    # Text after the first complete top-level value
+    ('{"hook_text": "Hi"} {"hook_text": "Again"}', {"hook_text": "Hi"}),
+    # Numbers with exponents and signs stay one number
+    ('{"score": 1e3, "t": "abc', {"score": 1000.0, "t": "abc"}),
+    ('{"a": -2.5E-2, "b": +1, "c": .5, "d": 007,}', {"a": -0.025, "b": 1, "c": 0.5, "d": 7}),
+    # A number or literal cut off at the end is dropped like any truncated value
+    ('{"score": 8, "weight": 1e', {"score": 8, "weight": None}),
+    ('{"score": 8, "passed": tr', {"score": 8, "passed": None}),
+])
+def test_repairs(text, expected):
+    value, repaired = loads(text)
+    assert value == expected
+    assert repaired
+
+def test_valid_json_is_not_repaired():
+    assert loads('{"hook_text": "Hi"}') == ({"hook_text": "Hi"}, False)
+
+def test_repaired_text_is_valid_json():
+    json.loads(repair_json("{'a': 'it\\'s', 'b': [1, 2,], 'c': None"))
+
+def test_malformed_complete_output_raises():
+    # The quote after "growth" looks like the end of the string; the value must not be cut there
+    with pytest.raises(ValueError):
+        loads('{"hook_text": "Why "growth", "really"?"}')
+
+@pytest.mark.parametrize("text", [
+    '{"score": 8, "tone": direct}',
+    '{hook_text: "Hi"}',
+    '{"score": 1ex, "t": "abc"}',
+    '{"score": 1 e3}',
+])
+def test_unknown_bare_word_raises(text):
+    # Dropping the word would silently change the value, e.g. 1 e3 -> 13
+    with pytest.raises(ValueError):
+        loads(text)
+
+def test_no_json_raises():
+    with pytest.raises(ValueError):
+        loads("I could not write a hook for this topic.")
@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from pydantic import BaseModel
+
+from src import llm_cache
+from src.llm_cache import MemoryTier, ResponseCache, SqliteTier
+from src.structured_output import parse_output
+
+class Reply(BaseModel):
+    text: str
+
+@pytest.fixture(params=["memory", "disk"])
+def cache(request, tmp_path, monkeypatch):
+    disk = SqliteTier(str(tmp_path / "llm_responses.sqlite")) if request.param == "disk" else None
+    cache = ResponseCache(MemoryTier(), disk)
+    monkeypatch.setattr(llm_cache, "_response_cache", cache)
+    return cache
+
+def cached_model(cache, responses):
+    return FakeListChatModel(responses=responses).model_copy(update={"cache": cache.for_agent("topic_selector")})
+
+def ask(llm):
+    return parse_output(llm.invoke("Pick a topic"), Reply, "topic_selector")
+
+def test_repeated_prompt_is_answered_from_cache(cache):
+    llm = cached_model(cache, ['{"text": "first"}', '{"text": "second"}'])
+    assert ask(llm).text == "first"
+    assert ask(llm).text == "first"
+    assert cache.stats()["totals"]["misses"] == 1
+
+def test_unparseable_response_is_evicted(cache):
+    llm = cached_model(cache, ["Sorry, I can't help with that.", '{"text": "second"}'])
+    with pytest.raises(ValueError):
+        ask(llm)
+    # The broken reply is not served again; the model is asked instead
+    assert ask(llm).text == "second"
+    assert ask(llm).text == "second"
+    assert cache.stats()["totals"]["misses"] == 2
+
+def test_unparseable_response_is_evicted_async(cache):
+    llm = cached_model(cache, ["not json", '{"text": "second"}'])
+
+    async def ask_async():
+        return parse_output(await llm.ainvoke("Pick a topic"), Reply, "topic_selector")
+
+    with pytest.raises(ValueError):
+        asyncio.run(ask_async())
+    assert asyncio.run(ask_async()).text == "second"
+
+def test_discard_without_cache_is_a_no_op(monkeypatch):
+    monkeypatch.setattr(llm_cache, "_response_cache", None)
+    assert llm_cache.discard_cached_response("not json") is False
@@ -0,0 +1,186 @@
+import asyncio
+import os
+import pytest
+
+pytest.importorskip("httpx")
+
+from src import research_engine
+from src.research_engine import (
+    GoogleSearchProvider, HostRateLimiter, ResearchEngine, SearchHit, SearchProvider, SearxngSearchProvider, extract_snippet
+)
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "research_page.html")
+
+EXTRACTORS = [
+    ("selectolax", "selectolax.lexbor", research_engine._paragraphs_selectolax),
+    ("lxml", "lxml.html", research_engine._paragraphs_lxml),
+    ("bs4", "bs4", research_engine._paragraphs_bs4),
+]
+
+@pytest.fixture
+def page():
+    with open(FIXTURE, encoding="utf-8") as f:
+        return f.read()
+
+@pytest.fixture(params=EXTRACTORS, ids=[name for name, _, _ in EXTRACTORS])
+def extractor(request, monkeypatch):
+    name, module, extract = request.param
+    pytest.importorskip(module)
+    monkeypatch.setattr(research_engine, "_extractor", (name, extract))
+    return extract
+
+def test_extracts_main_text_only(extractor, page):
+    paragraphs = extractor(page)
+    text = " ".join(paragraphs)
+    assert "talk to ten customers every week" in text
+    assert "Pricing went up three times" in text
+    for boilerplate in ("analytics", "Blog navigation", "newsletter", "Copyright"):
+        assert boilerplate not in text
+
+def test_snippet_prefers_paragraphs_matching_the_query(extractor, page):
+    snippet = extract_snippet(page, "bootstrapping", max_chars=220)
+    assert len(snippet) <= 220
+    assert "bootstrapping with no outside funding" in snippet
+    assert "Hiring was the hardest part of bootstrapping" in snippet
+    # Paragraphs shorter than min_paragraph_chars are never used
+    assert "Short line" not in extract_snippet(page, "short line")
+
+def test_snippet_of_page_without_text(extractor):
+    assert extract_snippet("<html><body><nav><p>Only navigation links in this page body</p></nav></body></html>", "x") == ""
+
+def test_rate_limiter_bounds_concurrency_per_host():
+    async def scenario():
+        limiter = HostRateLimiter(max_concurrent=2, min_interval=0.0)
+        in_flight = {"a": 0, "b": 0}
+        peak = {"a": 0, "b": 0}
+
+        async def request(host):
+            in_flight[host] += 1
+            peak[host] = max(peak[host], in_flight[host])
+            await asyncio.sleep(0.01)
+            in_flight[host] -= 1
+
+        await asyncio.gather(*(limiter.run(host, lambda host=host: request(host)) for host in "ab" * 5))
+        return peak
+
+    assert asyncio.run(scenario()) == {"a": 2, "b": 2}
+
+def test_rate_limiter_forgets_idle_hosts():
+    async def scenario():
+        limiter = HostRateLimiter(max_concurrent=1, min_interval=0.0, max_hosts=3)
+        for i in range(10):
+            await limiter.run(f"host{i}", lambda: asyncio.sleep(0))
+        return list(limiter._hosts)
+
+    assert asyncio.run(scenario()) == ["host7", "host8", "host9"]
+
+@pytest.fixture
+def fixture_server():
+    fakes = pytest.importorskip("benchmarks.fakes")
+    with fakes.FixtureSearchServer(results=4, latency=0.0) as server:
+        yield server
+
+def test_research_against_fixture_server(fixture_server):
+    pytest.importorskip("selectolax.lexbor")
+    engine = ResearchEngine(SearxngSearchProvider(fixture_server.base_url), max_pages=3, per_host_interval=0.0)
+
+    async def scenario():
+        try:
+            return await engine.research("bootstrapping")
+        finally:
+            await engine.close()
+
+    items = asyncio.run(scenario())
+    assert [item["source"].split("/page/")[1].split("?")[0] for item in items] == ["0", "1", "2"]
+    assert all("bootstrapping" in item["snippet"] for item in items)
+    assert all("Related article" not in item["snippet"] for item in items)
+
+def test_page_reads_stop_at_the_byte_cap(fixture_server):
+    engine = ResearchEngine(SearxngSearchProvider(fixture_server.base_url), max_page_bytes=1000)
+
+    async def scenario():
+        client, _ = await engine._pool()
+        try:
+            return await engine._read_page(client, f"{fixture_server.base_url}/page/0")
+        finally:
+            await engine.close()
+
+    assert len(asyncio.run(scenario()).encode("utf-8")) <= 1000
+
+def test_new_event_loop_closes_the_previous_client(fixture_server):
+    engine = ResearchEngine(SearxngSearchProvider(fixture_server.base_url))
+
+    async def pool():
+        client, _ = await engine._pool()
+        return client
+
+    first = asyncio.run(pool())
+    second = asyncio.run(pool())
+    assert first is not second
+    assert first.is_closed
+    asyncio.run(engine.close())
+
+class StaticSearchProvider(SearchProvider):
+    """Provider returning fixed hits without a request."""
+
+    name = "static"
+
+    def __init__(self, hits):
+        self.hits = hits
+
+    async def search(self, client, query, limit):
+        return self.hits[:limit]
+
+def slow_engine(monkeypatch, **options):
+    """Engine whose page reads take a second; `unwound` collects the urls whose read has finished or been cancelled."""
+    hits = [SearchHit(url=f"http://site{i}.test/page", snippet=f"Search snippet {i}") for i in range(2)]
+    engine = ResearchEngine(StaticSearchProvider(hits), per_host_interval=0.0, **options)
+    engine.unwound = []
+
+    async def read_page(client, url):
+        try:
+            await asyncio.sleep(1.0)
+            return "<p>never</p>"
+        finally:
+            engine.unwound.append(url)
+
+    monkeypatch.setattr(engine, "_read_page", read_page)
+    return engine
+
+def run_research(engine):
+    async def scenario():
+        try:
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            items = await engine.research("bootstrapping")
+            engine.unwound_on_return = list(engine.unwound)
+            return items, loop.time() - start
+        finally:
+            await engine.close()
+
+    return asyncio.run(scenario())
+
+def test_slow_page_is_bounded_by_fetch_timeout(monkeypatch):
+    engine = slow_engine(monkeypatch, fetch_timeout=0.05, total_timeout=5.0)
+    items, elapsed = run_research(engine)
+    assert elapsed < 0.5
+    assert [item["snippet"] for item in items] == ["Search snippet 0", "Search snippet 1"]
+
+def test_total_timeout_awaits_cancelled_fetches(monkeypatch):
+    engine = slow_engine(monkeypatch, fetch_timeout=5.0, total_timeout=0.05)
+    items, elapsed = run_research(engine)
+    assert elapsed < 0.5
+    # Every fetch has unwound by the time research returns
+    assert len(engine.unwound_on_return) == 2
+    assert [item["snippet"] for item in items] == ["Search snippet 0", "Search snippet 1"]
+
+def test_google_provider_requires_its_own_key(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "gemini-key")
+    monkeypatch.setenv("GOOGLE_CSE_ID", "engine")
+    for name in ("GOOGLE_SEARCH_API_KEY", "SEARCH_PROVIDER", "SEARXNG_URL"):
+        monkeypatch.delenv(name, raising=False)
+    with pytest.raises(ValueError):
+        GoogleSearchProvider()
+    assert research_engine._provider_from_env() is None
+    monkeypatch.setenv("GOOGLE_SEARCH_API_KEY", "search-key")
+    assert GoogleSearchProvider().api_key == "search-key"
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import pytest
+
+from src import workflow_registry as registry_module
+from src.llm_factory import LLMConfig
+from src.workflow_registry import WorkflowConfig, WorkflowRegistry
+
+@pytest.fixture
+def built(monkeypatch):
+    monkeypatch.setattr(registry_module, "get_shared_llm", lambda config: f"llm:{config.model}")
+    calls = []
+
+    def factory(llm, mode, section_mode):
+        calls.append((llm, mode, section_mode))
+        return object()
+    return calls, factory
+
+@pytest.fixture
+def env_file(tmp_path, monkeypatch):
+    path = tmp_path / ".env"
+    monkeypatch.setattr(registry_module, "find_dotenv", lambda: str(path))
+    for name in registry_module.RELOADABLE_ENV_VARS:
+        monkeypatch.delenv(name, raising=False)
+    return path
+
+def test_mode_changes_trigger_a_rebuild(built):
+    calls, factory = built
+    registry = WorkflowRegistry(factory)
+
+    async def scenario():
+        await registry.reload(WorkflowConfig())
+        unchanged = await registry.reload(WorkflowConfig())
+        parallel = await registry.reload(WorkflowConfig(mode="parallel"))
+        fused = await registry.reload(WorkflowConfig(mode="parallel", section_mode="fused"))
+        return unchanged, parallel, fused
+
+    assert asyncio.run(scenario()) == (False, True, True)
+    assert calls[-1] == ("llm:gemini-2.0-flash-lite", "parallel", "fused")
+    assert registry.version == 3
+
+def test_reload_reads_only_workflow_settings_from_env(built, env_file, monkeypatch):
+    calls, factory = built
+    monkeypatch.setenv("GOOGLE_API_KEY", "startup-key")
+    registry = WorkflowRegistry(factory)
+    asyncio.run(registry.start())
+    env_file.write_text("WORKFLOW_MODE=parallel\nLLM_MODEL=gemini-other\nGOOGLE_API_KEY=replaced\n")
+    assert asyncio.run(registry.reload()) is True
+    assert registry.config == WorkflowConfig(llm=LLMConfig(model="gemini-other"), mode="parallel")
+    assert calls[-1] == ("llm:gemini-other", "parallel", "separate")
+    assert os.environ["GOOGLE_API_KEY"] == "startup-key"
+    assert asyncio.run(registry.reload()) is False
+
+@pytest.fixture
+def client(monkeypatch):
+    testclient = pytest.importorskip("fastapi.testclient")
+    from src import main
+
+    async def reload(force=False):
+        return True
+    monkeypatch.setattr(main.workflow_registry, "reload", reload)
+    monkeypatch.setattr(WorkflowRegistry, "config", property(lambda self: WorkflowConfig(mode="parallel")))
+    return testclient.TestClient(main.app)
+
+def test_reload_endpoint_requires_admin_token(client, monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.post("/admin/reload-workflow").status_code == 403
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    assert client.post("/admin/reload-workflow").status_code == 401
+    assert client.post("/admin/reload-workflow", headers={"X-Admin-Token": "wrong"}).status_code == 401
+    response = client.post("/admin/reload-workflow", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.json()["mode"] == "parallel"